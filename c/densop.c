@@ -19,7 +19,7 @@ static DensOp* _create_densop(int row, int col)
 
   for (int i=0; i<size; i++) densop->elm[i] = 0.0 + 0.0i;
 
-  if (!(gbank_init((void**)&(densop->gbank))))
+  if (!(gbank_get_shared((void**)&(densop->gbank))))
       ERR_RETURN(ERROR_GBANK_INIT,NULL);
 
   return densop;
@@ -60,22 +60,19 @@ bool densop_init(QState* qstate, double* prob, int num, void** densop_out)
   SUC_RETURN(true);
 }
 
-bool densop_init_with_matrix(double* real, double* imag, int row, int col,
-			     void** densop_out)
+bool densop_init_with_matrix(COMPLEX* matrix, int row, int col, void** densop_out)
 {
   DensOp*	densop = NULL;
   int		size   = row * col;
   
-  if ((real == NULL) || (imag == NULL) || (row != col) || (row < 1) ||
+  if ((matrix == NULL) || (row != col) || (row < 1) ||
       (fabs(log2(row)-(int)log2(row)) > MIN_DOUBLE))
     ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
 
   if(!(densop = _create_densop(row, col)))
     ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
 
-  for (int i=0; i<size; i++) {
-    densop->elm[i] = real[i] + 1.0i * imag[i];
-  }
+  memcpy(densop->elm, matrix, sizeof(COMPLEX)*size);
   
   *densop_out = densop;
 
@@ -153,7 +150,7 @@ bool densop_copy(DensOp* densop_in, void** densop_out)
 
   memcpy(densop->elm, densop_in->elm, sizeof(COMPLEX)*(densop->row)*(densop->col));
 
-  if (!(gbank_init((void**)&(densop->gbank))))
+  if (!(gbank_get_shared((void**)&(densop->gbank))))
       ERR_RETURN(ERROR_GBANK_INIT,NULL);
 
   *densop_out = densop;
@@ -163,20 +160,16 @@ bool densop_copy(DensOp* densop_in, void** densop_out)
 
 bool densop_get_elm(DensOp* densop, void** elm_out)
 {
-  double*	elm  = NULL;
-  int		size = densop->row * densop->col;
-  int		n    = 0;
+  COMPLEX*	elm  = NULL;
+  int		size = 0;
   
   if (densop == NULL) ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
 
-  if (!(elm = (double*)malloc(sizeof(double)*2*size)))
+  size = densop->row * densop->col;
+  if (!(elm = (COMPLEX*)malloc(sizeof(COMPLEX)*size)))
     ERR_RETURN(ERROR_CANT_ALLOC_MEMORY,false);
 
-  n = 0;
-  for (int i=0; i<size; i++) {
-    elm[n++] = creal(densop->elm[i]);
-    elm[n++] = cimag(densop->elm[i]);
-  }
+  memcpy(elm, densop->elm, sizeof(COMPLEX)*size);
 
   *elm_out = elm;
   
@@ -380,34 +373,26 @@ bool densop_patrace(DensOp* densop_in, int qubit_num, int qubit_id[MAX_QUBIT_NUM
   SUC_RETURN(true);
 }
 
-static bool _hermitian_conj(double* real_in, double* imag_in, int row, int col,
-			    void** real_out, void** imag_out)
+static bool _hermitian_conj(COMPLEX* matrix_in, int row, int col, void** matrix_out)
 {
-  int		size = row * col;
-  double*	real = NULL;
-  double*	imag = NULL;
+  COMPLEX*	matrix = NULL;
 
-  if (!(real = (double*)malloc(sizeof(double)*size)))
-    ERR_RETURN(ERROR_CANT_ALLOC_MEMORY,false);
-
-  if (!(imag = (double*)malloc(sizeof(double)*size)))
+  if (!(matrix = (COMPLEX*)malloc(sizeof(COMPLEX)*row*col)))
     ERR_RETURN(ERROR_CANT_ALLOC_MEMORY,false);
 
   for (int i=0; i<row; i++) {
     for (int j=0; j<col; j++) {
-      real[i*col+j] = real_in[j*col+i];
-      imag[i*col+j] = -imag_in[j*col+i];
+      matrix[i*col+j] = conj(matrix_in[j*col+i]);
     }
   }
 
-  *real_out = real;
-  *imag_out = imag;
-  
+  *matrix_out = matrix;
+
   SUC_RETURN(true);
 }
 
 static bool _densop_rapply_matrix(DensOp* densop, int qnum_part, int qid[MAX_QUBIT_NUM],
-				  double* real, double* imag, int row, int col)
+				  COMPLEX* matrix, int row, int col)
 /*
   densop' = densop * matrix
 */
@@ -421,7 +406,7 @@ static bool _densop_rapply_matrix(DensOp* densop, int qnum_part, int qid[MAX_QUB
   int           N	   = 0;
   int		ii,iii,jj,jjj,kk,kkk;
 
-  if ((densop == NULL) || (real == NULL) || (imag == NULL) ||
+  if ((densop == NULL) || (matrix == NULL) ||
       (densop->row < row) || (densop->col < col) || (row != col) ||
       (1<<qnum_part != row))
     ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
@@ -452,7 +437,7 @@ static bool _densop_rapply_matrix(DensOp* densop, int qnum_part, int qid[MAX_QUB
 	int k = inv_index[(l<<shift)+jjj];
 	kk = index[k]>>shift;
 	kkk = index[k]%(1<<shift);
-	coef = real[kk*col+jj]+1.0i*imag[kk*col+jj];
+	coef = matrix[kk*col+jj];
 	densop->elm[i*densop->col+j] += (densop_tmp->elm[i*densop->col+k] * coef);
       }
 
@@ -461,7 +446,7 @@ static bool _densop_rapply_matrix(DensOp* densop, int qnum_part, int qid[MAX_QUB
 	kk = index[k]>>shift;
 	kkk = index[k]%(1<<shift);
 	if (jjj == kkk) {
-	  coef = real[kk*col+jj]+1.0i*imag[kk*col+jj];
+	  coef = matrix[kk*col+jj];
 	  densop->elm[i*densop->col+j] += (densop_tmp->elm[i*densop->col+k] * coef);
 	}
       }
@@ -478,7 +463,7 @@ static bool _densop_rapply_matrix(DensOp* densop, int qnum_part, int qid[MAX_QUB
 }
 
 static bool _densop_lapply_matrix(DensOp* densop, int qnum_part, int qid[MAX_QUBIT_NUM],
-				  double* real, double* imag, int row, int col)
+				  COMPLEX* matrix, int row, int col)
 /*
   densop' = matrix * densop
 */
@@ -492,7 +477,7 @@ static bool _densop_lapply_matrix(DensOp* densop, int qnum_part, int qid[MAX_QUB
   int           N	   = 0;
   int		ii,iii,jj,jjj,kk,kkk;
   
-  if ((densop == NULL) || (real == NULL) || (imag == NULL) ||
+  if ((densop == NULL) || (matrix == NULL) ||
       (densop->row < row) || (densop->col < col) || (row != col) ||
       (1<<qnum_part != row))
     ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
@@ -523,7 +508,7 @@ static bool _densop_lapply_matrix(DensOp* densop, int qnum_part, int qid[MAX_QUB
 	int k = inv_index[(l<<shift)+iii];
 	kk = index[k]>>shift;
 	kkk = index[k]%(1<<shift);
-	coef = real[ii*col+kk]+1.0i*imag[ii*col+kk];
+	coef = matrix[ii*col+kk];
 	densop->elm[i*densop->col+j] += (coef * densop_tmp->elm[k*densop->col+j]);
       }
 
@@ -532,7 +517,7 @@ static bool _densop_lapply_matrix(DensOp* densop, int qnum_part, int qid[MAX_QUB
 	kk = index[k]>>shift;
 	kkk = index[k]%(1<<shift);
 	if (iii == kkk) {
-	  coef = real[ii*col+kk]+1.0i*imag[ii*col+kk];
+	  coef = matrix[ii*col+kk];
 	  densop->elm[i*densop->col+j] += (coef * densop_tmp->elm[k*densop->col+j]);
 	}
       }
@@ -549,41 +534,40 @@ static bool _densop_lapply_matrix(DensOp* densop, int qnum_part, int qid[MAX_QUB
 }
 
 static bool _densop_bapply_matrix(DensOp* densop, int qnum_part, int qid[MAX_QUBIT_NUM],
-				  double* real, double* imag, int row, int col)
+				  COMPLEX* matrix, int row, int col)
 /*
   densop' = matrix * densop * matrix^{dagger}
 */
 {
-  double*	real_hc = NULL;
-  double*	imag_hc = NULL;
+  COMPLEX*	matrix_hc = NULL;
 
-  if (!(_densop_lapply_matrix(densop, qnum_part, qid, real, imag, row, col)))
+  if (!(_densop_lapply_matrix(densop, qnum_part, qid, matrix, row, col)))
     ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
 
-  _hermitian_conj(real, imag, row, col, (void**)&real_hc, (void**)&imag_hc);
+  if (!(_hermitian_conj(matrix, row, col, (void**)&matrix_hc)))
+    ERR_RETURN(ERROR_CANT_ALLOC_MEMORY,false);
   
-  if (!(_densop_rapply_matrix(densop, qnum_part, qid, real_hc, imag_hc, row, col)))
+  if (!(_densop_rapply_matrix(densop, qnum_part, qid, matrix_hc, row, col)))
     ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
 
-  free(real_hc); real_hc = NULL;
-  free(imag_hc); imag_hc = NULL;
+  free(matrix_hc); matrix_hc = NULL;
 
   SUC_RETURN(true);
 }
 
 bool densop_apply_matrix(DensOp* densop, int qnum_part, int qid[MAX_QUBIT_NUM],
-			 ApplyDir adir, double* real, double* imag, int row, int col)
+			 ApplyDir adir, COMPLEX* matrix, int row, int col)
 {
   if (adir == LEFT) {
-    if (!(_densop_lapply_matrix(densop, qnum_part, qid, real, imag, row, col)))
+    if (!(_densop_lapply_matrix(densop, qnum_part, qid, matrix, row, col)))
       ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
   }
   else if (adir == RIGHT) {
-    if (!(_densop_rapply_matrix(densop, qnum_part, qid, real, imag, row, col)))
+    if (!(_densop_rapply_matrix(densop, qnum_part, qid, matrix, row, col)))
       ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
   }
   else if (adir == BOTH) {
-    if (!(_densop_bapply_matrix(densop, qnum_part, qid, real, imag, row, col)))
+    if (!(_densop_bapply_matrix(densop, qnum_part, qid, matrix, row, col)))
       ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
   }
   else {
@@ -594,7 +578,7 @@ bool densop_apply_matrix(DensOp* densop, int qnum_part, int qid[MAX_QUBIT_NUM],
 }
 
 static bool _densop_probability_kraus(DensOp* densop, int qnum_part, int qid[MAX_QUBIT_NUM],
-				      double* real, double* imag, int row, int col,
+				      COMPLEX* matrix, int row, int col,
 				      double* prob_out)
 {
   DensOp*	densop_tmp = NULL;
@@ -606,7 +590,7 @@ static bool _densop_probability_kraus(DensOp* densop, int qnum_part, int qid[MAX
   if (!(densop_copy(densop, (void**)&densop_tmp)))
     ERR_RETURN(ERROR_DENSOP_COPY,false);
 
-  if (!(_densop_bapply_matrix(densop_tmp, qnum_part, qid, real, imag, row, col)))
+  if (!(_densop_bapply_matrix(densop_tmp, qnum_part, qid, matrix, row, col)))
     ERR_RETURN(ERROR_DENSOP_APPLY_MATRIX,false);
   
   if (!(densop_trace(densop_tmp, &prob_real, &prob_imag)))
@@ -620,7 +604,7 @@ static bool _densop_probability_kraus(DensOp* densop, int qnum_part, int qid[MAX
 }
 
 static bool _densop_probability_povm(DensOp* densop, int qnum_part, int qid[MAX_QUBIT_NUM],
-				     double* real, double* imag, int row, int col,
+				     COMPLEX* matrix, int row, int col,
 				     double* prob_out)
 {
   DensOp*	densop_tmp = NULL;
@@ -632,7 +616,7 @@ static bool _densop_probability_povm(DensOp* densop, int qnum_part, int qid[MAX_
   if (!(densop_copy(densop, (void**)&densop_tmp)))
     ERR_RETURN(ERROR_DENSOP_COPY,false);
 
-  if (!(_densop_lapply_matrix(densop_tmp, qnum_part, qid, real, imag, row, col)))
+  if (!(_densop_lapply_matrix(densop_tmp, qnum_part, qid, matrix, row, col)))
     ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
   
   if (!(densop_trace(densop_tmp, &prob_real, &prob_imag)))
@@ -646,17 +630,17 @@ static bool _densop_probability_povm(DensOp* densop, int qnum_part, int qid[MAX_
 }
 
 bool densop_probability(DensOp* densop, int qnum_part, int qid[MAX_QUBIT_NUM],
-			MatrixType mtype, double* real, double* imag, int row, int col,
+			MatrixType mtype, COMPLEX* matrix, int row, int col,
 			double* prob_out)
 {
   if (densop == NULL) ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
 
   if (mtype == KRAUS) {
-    if (!(_densop_probability_kraus(densop, qnum_part, qid, real, imag, row, col, prob_out)))
+    if (!(_densop_probability_kraus(densop, qnum_part, qid, matrix, row, col, prob_out)))
       ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
   }
   else if (mtype == POVM) {
-    if (!(_densop_probability_povm(densop, qnum_part, qid, real, imag, row, col, prob_out)))
+    if (!(_densop_probability_povm(densop, qnum_part, qid, matrix, row, col, prob_out)))
       ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
   }
   else {
@@ -671,8 +655,6 @@ static bool _densop_operate_unitary(DensOp* densop, COMPLEX* U, int dim, int m,
   int		qnum_part;
   int		qid[MAX_QUBIT_NUM];
   ApplyDir	adir = BOTH;
-  double	real[16];
-  double	imag[16];
   int		row,col;
 
   if ((densop == NULL) || (densop->row != densop->col))
@@ -684,11 +666,7 @@ static bool _densop_operate_unitary(DensOp* densop, COMPLEX* U, int dim, int m,
     qnum_part = 1;
     row = col = 2;
     qid[0] = m;
-    for (int i=0; i<dim*dim; i++) {
-      real[i] = creal(U[i]);
-      imag[i] = cimag(U[i]);
-    }
-    if (!(densop_apply_matrix(densop, qnum_part, qid, adir, real, imag, row, col)))
+    if (!(densop_apply_matrix(densop, qnum_part, qid, adir, U, row, col)))
       ERR_RETURN(ERROR_DENSOP_APPLY_MATRIX,false);
   }
 
@@ -698,11 +676,7 @@ static bool _densop_operate_unitary(DensOp* densop, COMPLEX* U, int dim, int m,
     qnum_part = 2;
     row = col = 4;
     qid[0] = m; qid[1] = n;
-    for (int i=0; i<dim*dim; i++) {
-      real[i] = creal(U[i]);
-      imag[i] = cimag(U[i]);
-    }
-    if (!(densop_apply_matrix(densop, qnum_part, qid, adir, real, imag, row, col)))
+    if (!(densop_apply_matrix(densop, qnum_part, qid, adir, U, row, col)))
       ERR_RETURN(ERROR_DENSOP_APPLY_MATRIX,false);
   }
 
@@ -736,6 +710,66 @@ bool densop_operate_qgate(DensOp* densop, Kind kind, double alpha, double beta,
   }
 }
 
+bool densop_operate_mcu(DensOp* densop, int qnum, int qid[MAX_QUBIT_NUM], COMPLEX* U2)
+{
+  /*
+    multi-controlled 2x2 gate: rho -> U rho U+
+    - elm (row-major) is regarded as a vector of 2*qubit_num qubits:
+      row index = qubit 0..qubit_num-1, column index = qubit qubit_num..2*qubit_num-1
+    - U acts on the row qubits, conj(U) on the column qubits
+   */
+  int		qubit_num;
+  int		qid_col[MAX_QUBIT_NUM];
+  COMPLEX	U2_conj[4];
+
+  if ((densop == NULL) || (densop->row != densop->col) || (U2 == NULL) ||
+      (qnum < 1) || (qnum > MAX_QUBIT_NUM))
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+  qubit_num = (int)log2(densop->row);
+  if (2 * qubit_num > MAX_QUBIT_NUM) ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+  for (int k=0; k<qnum; k++) {
+    if ((qid[k] < 0) || (qid[k] >= qubit_num)) ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+    qid_col[k] = qid[k] + qubit_num;
+  }
+  for (int i=0; i<4; i++) U2_conj[i] = conj(U2[i]);
+
+  if (!(vector_operate_mcu(densop->elm, 2 * qubit_num, qnum, qid, U2)) ||
+      !(vector_operate_mcu(densop->elm, 2 * qubit_num, qnum, qid_col, U2_conj)))
+    ERR_RETURN(ERROR_DENSOP_OPERATE_QGATE,false);
+
+  SUC_RETURN(true);
+}
+
+bool densop_operate_qgate_batch(DensOp* densop, int gate_num, QGate* qgate)
+/*
+  operate the gate sequence qgate[0..gate_num-1] in order
+  - all gates are checked before operating, so the densop is not changed on error
+ */
+{
+  QGate*	g	  = NULL;
+  int		qubit_num = 0;
+
+  if ((densop == NULL) || (gate_num < 0) || ((gate_num > 0) && (qgate == NULL)))
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+  qubit_num = (int)log2(densop->row);
+  for (int i=0; i<gate_num; i++) {
+    if (!(qgate_check_unitary(&(qgate[i]), qubit_num)) || (qgate[i].ctrl >= 0))
+      ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+  }
+
+  for (int i=0; i<gate_num; i++) {
+    g = &(qgate[i]);
+    if (!(densop_operate_qgate(densop, g->kind, g->para.phase.alpha, g->para.phase.beta,
+			       g->para.phase.gamma, g->qubit_id)))
+      ERR_RETURN(ERROR_DENSOP_OPERATE_QGATE,false);
+  }
+
+  SUC_RETURN(true);
+}
+
 bool densop_tensor_product(DensOp* densop_0, DensOp* densop_1, void** densop_out)
 {
   int		row, row_0, row_1;
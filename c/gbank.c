@@ -253,6 +253,21 @@ bool gbank_init(void** gbank_out)
   SUC_RETURN(true);
 }
 
+bool gbank_get_shared(void** gbank_out)
+{
+  /* gate bank is constant, so one instance is shared by all qstates and densops */
+  static GBank* gbank = NULL;
+
+  if (gbank == NULL) {
+    if (!(gbank_init((void**)&gbank)))
+      ERR_RETURN(ERROR_GBANK_INIT,false);
+  }
+
+  *gbank_out = gbank;
+
+  SUC_RETURN(true);
+}
+
 static bool _gbank_get_rotation(Axis axis, double phase, double unit, void** matrix_out)
 {
   COMPLEX* matrix = NULL;
@@ -744,3 +759,96 @@ bool gbank_get_unitary(GBank* gbank, Kind kind, double phase, double phase1,
 
   SUC_RETURN(true);
 }
+
+bool gbank_get_unitary_deriv(GBank* gbank, Kind kind, double phase, double phase1,
+			     double phase2, int para_id, int* dim_out, void** matrix_out)
+/*
+  derivative of the unitary matrix with respect to the parameter (unit = PI)
+  - para_id: 0 = phase, 1 = phase1, 2 = phase2
+  - rotation angle (RX,RY,RZ,'phase2' of U3): dU/dphase = PI/2 * U(phase+1)
+  - phase factor exp(i PI phase) (P,U1,'phase' and 'phase1' of U2,U3):
+    dU/dphase = i PI * U on the elements including the factor, 0 elsewhere
+  - controlled gates: the block for control qubit = 0 is 0
+ */
+{
+  COMPLEX*	matrix = NULL;
+  int		dim    = 0;
+  int		ofs    = 0;
+  bool		mask[4];	/* elements (00,01,10,11) of 1-qubit block including the factor */
+  bool		shift  = false;
+
+  if (gbank == NULL)
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+  for (int i=0; i<4; i++) mask[i] = false;
+
+  switch (kind) {
+  case ROTATION_X:
+  case ROTATION_Y:
+  case ROTATION_Z:
+  case CONTROLLED_RX:
+  case CONTROLLED_RY:
+  case CONTROLLED_RZ:
+    if (para_id != 0) ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+    phase += 1.0;
+    shift = true;
+    break;
+  case PHASE_SHIFT:
+  case ROTATION_U1:
+  case CONTROLLED_P:
+  case CONTROLLED_U1:
+    if (para_id != 0) ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+    mask[IDX2(1,1)] = true;
+    break;
+  case ROTATION_U2:
+  case CONTROLLED_U2:
+  case ROTATION_U3:
+  case CONTROLLED_U3:
+    if (para_id == 0) {
+      mask[IDX2(0,1)] = true;
+      mask[IDX2(1,1)] = true;
+    }
+    else if (para_id == 1) {
+      mask[IDX2(1,0)] = true;
+      mask[IDX2(1,1)] = true;
+    }
+    else if ((para_id == 2) && ((kind == ROTATION_U3) || (kind == CONTROLLED_U3))) {
+      phase2 += 1.0;
+      shift = true;
+    }
+    else {
+      ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+    }
+    break;
+  default:
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+  }
+
+  if (!(gbank_get_unitary(gbank, kind, phase, phase1, phase2, &dim, (void**)&matrix)))
+    ERR_RETURN(ERROR_GBANK_GET_UNITARY,false);
+
+  /* 1-qubit block: whole matrix (dim = 2) or control qubit = 1 (dim = 4) */
+  if (dim == 4) {
+    ofs = 2;
+    for (int i=0; i<2; i++) {
+      for (int j=0; j<4; j++) {
+	matrix[IDX4(i,j)] = 0.0;
+	matrix[IDX4(j,i)] = 0.0;
+      }
+    }
+  }
+
+  for (int i=0; i<2; i++) {
+    for (int j=0; j<2; j++) {
+      int k = dim * (ofs + i) + ofs + j;
+      if (shift == true) matrix[k] *= M_PI / 2.0;
+      else if (mask[IDX2(i,j)] == true) matrix[k] *= 1.0i * M_PI;
+      else matrix[k] = 0.0;
+    }
+  }
+
+  *matrix_out = matrix;
+  *dim_out = dim;
+
+  SUC_RETURN(true);
+}
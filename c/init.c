@@ -10,3 +10,40 @@ void init_qlazy(unsigned int seed)
   g_Errno = SUCCESS;
   srand(seed);
 }
+
+static int _num_threads = 0;  /* 0: not set yet */
+
+bool qlazy_set_num_threads(int num)
+{
+  if (num < 1) ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+  _num_threads = num;
+
+  SUC_RETURN(true);
+}
+
+int qlazy_get_num_threads(void)
+{
+  /*
+    number of threads for the parallel kernels
+    - set by qlazy_set_num_threads, if called
+    - else, environment variable QLAZY_NUM_THREADS, if set
+    - else, maximum number of threads of OpenMP (1, if built without OpenMP)
+   */
+  char* env = NULL;
+
+  if (_num_threads < 1) {
+    if (((env = getenv(ENV_NUM_THREADS)) != NULL) && (atoi(env) > 0)) {
+      _num_threads = atoi(env);
+    }
+    else {
+#ifdef USE_OPENMP
+      _num_threads = omp_get_max_threads();
+#else
+      _num_threads = 1;
+#endif
+    }
+  }
+
+  return _num_threads;
+}
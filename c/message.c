@@ -97,12 +97,18 @@ void error_msg(ErrCode err)
   case ERROR_QSTATE_EVOLVE:
     fprintf(stderr, "ERROR: qstate evolve failure !\n");
     break;
+  case ERROR_QSTATE_GROUND_STATE:
+    fprintf(stderr, "ERROR: qstate ground state failure !\n");
+    break;
   case ERROR_QSTATE_INNER_PRODUCT:
     fprintf(stderr, "ERROR: inner product failure !\n");
     break;
   case ERROR_QSTATE_EXPECT_VALUE:
     fprintf(stderr, "ERROR: expect value failure !\n");
     break;
+  case ERROR_QSTATE_EXPECT_GRADIENT:
+    fprintf(stderr, "ERROR: expect gradient failure !\n");
+    break;
   case ERROR_QSTATE_APPLY_MATRIX:
     fprintf(stderr, "ERROR: apply matrix failure !\n");
     break;
@@ -174,6 +180,9 @@ void error_msg(ErrCode err)
   case ERROR_DENSOP_TENSOR_PRODUCT:
     fprintf(stderr, "ERROR: densop tensor product failure !\n");
     break;
+  case ERROR_DENSOP_OPERATE_QGATE:
+    fprintf(stderr, "ERROR: densop operate qgate failure !\n");
+    break;
   case ERROR_STABILIZER_INIT:
     fprintf(stderr, "ERROR: stabilizer init failure !\n");
     break;
@@ -262,3 +262,73 @@ bool is_power_of_2(int n)
   if (fabs(diff) < MIN_DOUBLE) return true;
   else return false;
 }
+
+bool tridiag_eigen(int n, double* diag, double* offd, double* eval, double* evec)
+/*
+  eigenvalues and eigenvectors of a real symmetric tridiagonal matrix
+  (implicit QL method)
+  - diag: diagonal elements (n)
+  - offd: off-diagonal elements (n-1)
+  - eval: eigenvalues (n) <- output
+  - evec: eigenvectors (n x n), evec[k*n+i] = k-th element of i-th vector <- output
+ */
+{
+  double	e[n];
+  double	b, c, f, g, p, r, s, dd;
+  int		m, iter;
+
+  if ((n < 1) || (diag == NULL) || (eval == NULL) || (evec == NULL))
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+  for (int i=0; i<n; i++) {
+    eval[i] = diag[i];
+    e[i] = (i < n - 1) ? offd[i] : 0.0;
+    for (int k=0; k<n; k++) evec[k*n+i] = (k == i) ? 1.0 : 0.0;
+  }
+
+  for (int l=0; l<n; l++) {
+    iter = 0;
+    do {
+      for (m=l; m<n-1; m++) {
+	dd = fabs(eval[m]) + fabs(eval[m+1]);
+	if (fabs(e[m]) + dd == dd) break;
+      }
+      if (m != l) {
+	if (iter++ == 64) ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+	g = (eval[l+1] - eval[l]) / (2.0 * e[l]);
+	r = hypot(g, 1.0);
+	g = eval[m] - eval[l] + e[l] / (g + (g >= 0.0 ? fabs(r) : -fabs(r)));
+	s = c = 1.0;
+	p = 0.0;
+	int i;
+	for (i=m-1; i>=l; i--) {
+	  f = s * e[i];
+	  b = c * e[i];
+	  e[i+1] = (r = hypot(f, g));
+	  if (r == 0.0) {
+	    eval[i+1] -= p;
+	    e[m] = 0.0;
+	    break;
+	  }
+	  s = f / r;
+	  c = g / r;
+	  g = eval[i+1] - p;
+	  r = (eval[i] - g) * s + 2.0 * c * b;
+	  eval[i+1] = g + (p = s * r);
+	  g = c * r - b;
+	  for (int k=0; k<n; k++) {
+	    f = evec[k*n+i+1];
+	    evec[k*n+i+1] = s * evec[k*n+i] + c * f;
+	    evec[k*n+i] = c * evec[k*n+i] - s * f;
+	  }
+	}
+	if ((r == 0.0) && (i >= l)) continue;
+	eval[l] -= p;
+	e[l] = g;
+	e[m] = 0.0;
+      }
+    } while (m != l);
+  }
+
+  SUC_RETURN(true);
+}
@@ -80,6 +80,50 @@ bool observable_init(char* str, void** observ_out)
   SUC_RETURN(true);
 }
 
+bool observable_apply(Observable* observ, int qubit_num, COMPLEX* camp_in,
+		      COMPLEX* camp_out)
+/*
+  camp_out = H camp_in (matrix-free, H = sum_k coef_k P_k)
+  - P|i> = i^ynum * (-1)^popcount(i & zmask) |i ^ xmask> (see spro_get_mask)
+  - camp_out[i] = sum_k coef_k i^ynum_k (-1)^popcount((i ^ xmask_k) & zmask_k)
+                        camp_in[i ^ xmask_k]
+ */
+{
+  COMPLEX	phase[4] = { 1.0, 1.0i, -1.0, -1.0i };
+  int		ynum;
+  COMPLEX	out;
+  int		j;
+
+  if ((observ == NULL) || (camp_in == NULL) || (camp_out == NULL))
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+  COMPLEX	fac[observ->array_num];
+  int		xmask[observ->array_num];
+  int		zmask[observ->array_num];
+
+  for (int k=0; k<observ->array_num; k++) {
+    if (!(spro_get_mask(observ->spro_array[k], qubit_num, &xmask[k], &zmask[k], &ynum)))
+      ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+    fac[k] = observ->spro_array[k]->coef * phase[ynum % 4];
+  }
+
+#ifdef USE_OPENMP
+#pragma omp parallel for private(j,out) if (qubit_num >= MIN_QUBIT_NUM_PARALLEL) \
+  num_threads(qlazy_get_num_threads())
+#endif
+  for (int i=0; i<(1 << qubit_num); i++) {
+    out = 0.0;
+    for (int k=0; k<observ->array_num; k++) {
+      j = i ^ xmask[k];
+      if (__builtin_parity(j & zmask[k])) out -= fac[k] * camp_in[j];
+      else out += fac[k] * camp_in[j];
+    }
+    camp_out[i] = out;
+  }
+
+  SUC_RETURN(true);
+}
+
 void observable_free(Observable* observ)
 {
   if (observ != NULL) {
@@ -105,6 +105,8 @@ bool qcirc_append_qgate(QCirc* qcirc, Kind kind, int terminal_num,
   qcirc->qgate[qcirc->step_num].kind = kind;
   qcirc->qgate[qcirc->step_num].terminal_num = terminal_num;
   memcpy(qcirc->qgate[qcirc->step_num].qubit_id, qubit_id, sizeof(int)*MAX_QUBIT_NUM);
+  qcirc->qgate[qcirc->step_num].ctrl = -1;
+  for (int i=0; i<MAX_QUBIT_NUM; i++) qcirc->qgate[qcirc->step_num].cmem_id[i] = -1;
 
   switch (kind) {
   case MEASURE:
@@ -269,3 +269,73 @@ bool qgate_get_kind(char* symbol, Kind* kind_out)
   
   SUC_RETURN(true);
 }
+
+static int _qgate_unitary_qubit_num(Kind kind)
+{
+  /* number of qubits of the unitary gate (0 if not a unitary gate) */
+  switch (kind) {
+  case PAULI_X:
+  case PAULI_Y:
+  case PAULI_Z:
+  case ROOT_PAULI_X:
+  case ROOT_PAULI_X_:
+  case HADAMARD:
+  case PHASE_SHIFT_S:
+  case PHASE_SHIFT_S_:
+  case PHASE_SHIFT_T:
+  case PHASE_SHIFT_T_:
+  case PHASE_SHIFT:
+  case ROTATION_X:
+  case ROTATION_Y:
+  case ROTATION_Z:
+  case ROTATION_U1:
+  case ROTATION_U2:
+  case ROTATION_U3:
+    return 1;
+  case CONTROLLED_X:
+  case CONTROLLED_Y:
+  case CONTROLLED_Z:
+  case CONTROLLED_XR:
+  case CONTROLLED_XR_:
+  case CONTROLLED_H:
+  case CONTROLLED_S:
+  case CONTROLLED_S_:
+  case CONTROLLED_T:
+  case CONTROLLED_T_:
+  case CONTROLLED_P:
+  case CONTROLLED_RX:
+  case CONTROLLED_RY:
+  case CONTROLLED_RZ:
+  case CONTROLLED_U1:
+  case CONTROLLED_U2:
+  case CONTROLLED_U3:
+  case SWAP:
+    return 2;
+  default:
+    return 0;
+  }
+}
+
+bool qgate_check_unitary(QGate* qgate, int qubit_num)
+/*
+  check that the gate is a unitary gate applicable to qubit_num qubits
+  (terminal number, range of qubit id and no duplicate qubit id)
+ */
+{
+  int	qnum;
+  
+  if (qgate == NULL) ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+  qnum = _qgate_unitary_qubit_num(qgate->kind);
+  if ((qnum == 0) || (qgate->terminal_num != qnum))
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+  for (int i=0; i<qnum; i++) {
+    if ((qgate->qubit_id[i] < 0) || (qgate->qubit_id[i] >= qubit_num))
+      ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+  }
+  if ((qnum == 2) && (qgate->qubit_id[0] == qgate->qubit_id[1]))
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+  SUC_RETURN(true);
+}
@@ -8,6 +8,7 @@
 #include <stdio.h>
 #include <stdlib.h>
 #include <stdbool.h>
+#include <stdint.h>
 #include <math.h>
 #include <time.h>
 #include <string.h>
@@ -17,8 +18,6 @@
 
 #define VERSION "0.1.2"
 
-//#define TEST_NEW_VERSION
-
 /*====================================================================*/
 /*  Definitions & Macros                                              */
 /*====================================================================*/
@@ -40,6 +39,11 @@
 #define MAX_QUBIT_NUM      30
 #define DEF_QLAZYINIT       "./.qlazyinit"
 
+#define MAX_EVOLVE_ITER    1048576  /* max iteration number of adaptive time evolution */
+#define MAX_KRYLOV_DIM     30       /* max dimension of krylov subspace */
+#define MAX_KRYLOV_RESTART 100      /* max restart number of lanczos method */
+#define MAX_DENSE_QUBIT_NUM 6        /* max qubit number of the in-place dense matrix kernel */
+
 #define DEF_SHOTS 100
 #define DEF_PHASE  0.0
 
@@ -55,6 +59,14 @@
 #define MAX(a, b) ((a) > (b) ? (a) : (b))
 #define MIN(a, b) ((a) < (b) ? (a) : (b))
 
+/* parallel execution of state vector kernels (build with -DUSE_OPENMP -fopenmp) */
+#ifdef USE_OPENMP
+#include <omp.h>
+#endif
+#define MIN_QUBIT_NUM_PARALLEL 14   /* kernels run serially below this qubit number */
+#define SAMPLE_BLOCK_NUM       256  /* number of blocks for the parallel probability scan */
+#define ENV_NUM_THREADS        "QLAZY_NUM_THREADS"
+
 #define IDX2(i,j) ((i<<1)+j)
 #define IDX4(i,j) ((i<<2)+j)
 
@@ -116,8 +128,10 @@ typedef enum _ErrCode {
   ERROR_QSTATE_MEASURE_BELL,
   ERROR_QSTATE_OPERATE_QGATE,
   ERROR_QSTATE_EVOLVE,
+  ERROR_QSTATE_GROUND_STATE,
   ERROR_QSTATE_INNER_PRODUCT,
   ERROR_QSTATE_EXPECT_VALUE,
+  ERROR_QSTATE_EXPECT_GRADIENT,
   ERROR_QSTATE_APPLY_MATRIX,
   ERROR_MDATA_INIT,
   ERROR_MDATA_PRINT,
@@ -140,6 +154,7 @@ typedef enum _ErrCode {
   ERROR_DENSOP_APPLY_MATRIX,
   ERROR_DENSOP_PROBABILITY,
   ERROR_DENSOP_TENSOR_PRODUCT,
+  ERROR_DENSOP_OPERATE_QGATE,
   ERROR_STABILIZER_INIT,
   ERROR_STABILIZER_COPY,
   ERROR_STABILIZER_SET_PAULI_OP,
@@ -267,6 +282,8 @@ typedef struct _QGate {
   Para          para;
   int		terminal_num;
   int		qubit_id[MAX_QUBIT_NUM];
+  int		ctrl;			/* classical memory id controlling the gate (-1: none) */
+  int		cmem_id[MAX_QUBIT_NUM];	/* classical memory id's to store measured values (-1: none) */
 } QGate;
 
 typedef struct _CImage {
@@ -306,11 +323,16 @@ typedef struct _QCirc {
   CImage*       cimage;
 } QCirc;
 
+typedef struct _RandState {
+  uint64_t	s[4];		/* state of xoshiro256** */
+} RandState;
+
 typedef struct _QState {
   int		qubit_num;	/* number of qubits */
   int		state_num;	/* number of quantum state (dim = 2^num) */
   COMPLEX*	camp;           /* complex amplitude of the quantum state */
   GBank*        gbank;
+  RandState	rand;		/* random number generator for measurement */
 } QState;
 
 typedef struct _MData {
@@ -364,6 +386,7 @@ typedef struct _Stabilizer {
   int		qubit_num;
   ComplexAxis*	pauli_factor;	/* number of array = gene_num */
   int*		check_matrix;	/* number of array = 2 * qubit_num * gene_num */
+  RandState	rand;		/* random number generator for measurement */
 } Stabilizer;
 
 /*====================================================================*/
@@ -405,9 +428,19 @@ bool	 binstr_from_decimal(char* binstr, int qubit_num, int decimal, int zflag);
 int      bit_permutation(int bits_in, int qnum, int qnum_part, int qid[MAX_QUBIT_NUM]);
 int*     bit_permutation_array(int length, int qnum, int qnum_part, int qid[MAX_QUBIT_NUM]);
 bool     is_power_of_2(int n);
+bool     tridiag_eigen(int n, double* diag, double* offd, double* eval, double* evec);
 
 /* init.c */
 void	 init_qlazy(unsigned int seed);
+bool	 qlazy_set_num_threads(int num);
+int	 qlazy_get_num_threads(void);
+
+/* rand.c */
+void	 randstate_init(RandState* rs, uint64_t seed);
+uint64_t randstate_next(RandState* rs);
+double	 randstate_double(RandState* rs);
+void	 randstate_jump(RandState* rs);
+void	 randstate_split(RandState* rs, RandState* rs_out);
 
 /* message.c */
 void	 error_msg(ErrCode err);
@@ -418,6 +451,7 @@ bool	 help_print(char* item);
 /* qgate.c */
 bool	 qgate_get_symbol(Kind kind, char* symbol_out);
 bool	 qgate_get_kind(char* symbol, Kind* kind_out);
+bool	 qgate_check_unitary(QGate* qgate, int qubit_num);
 
 /* qcirc.c */
 bool	 qcirc_init(int qubit_num, int buf_length, void** qcirc_out);
@@ -432,12 +466,16 @@ void	 qcirc_free(QCirc* qcirc);
 
 /* gbank.c */
 bool	 gbank_init(void** gbank_out);
+bool	 gbank_get_shared(void** gbank_out);
 bool     gbank_get_unitary(GBank* gbank, Kind kind, double phase, double phase1,
 			   double phase2, int* dim_out, void** matrix_out);
+bool     gbank_get_unitary_deriv(GBank* gbank, Kind kind, double phase, double phase1,
+				 double phase2, int para_id, int* dim_out, void** matrix_out);
 
 /* qstate.c */
 bool	 qstate_init(int qubit_num, void** qstate_out);
-bool	 qstate_init_with_vector(double* real, double* imag, int dim, void** qstate_out);
+bool	 qstate_set_seed(QState* qstate, unsigned int seed);
+bool	 qstate_init_with_vector(COMPLEX* vector, int dim, void** qstate_out);
 bool	 qstate_reset(QState* qstate, int qubit_num, int qubit_id[MAX_QUBIT_NUM]);
 bool	 qstate_copy(QState* qstate, void** qstate_out);
 bool     qstate_get_camp(QState* qstate, int qubit_num, int qubit_id[MAX_QUBIT_NUM],
@@ -451,13 +489,31 @@ bool     qstate_measure_bell(QState* qstate, int shot_num, int qubit_num,
 			     int qubit_id[MAX_QUBIT_NUM], void** mdata_out);
 bool	 qstate_operate_qgate(QState* qstate, Kind kind, double alpha, double beta,
 			      double gamma, int qubit_id[MAX_QUBIT_NUM]);
-bool     qstate_evolve(QState* qstate, Observable* observ, double time, int iter);
+bool     qstate_evolve(QState* qstate, Observable* observ, double time, int iter, int order);
+bool     qstate_evolve_tolerance(QState* qstate, Observable* observ, double time, int order,
+				 double tol, int* iter_inout);
+bool     qstate_evolve_krylov(QState* qstate, Observable* observ, double time, double tol);
+bool     qstate_ground_state(QState* qstate, Observable* observ, double tol, double* energy);
 bool     qstate_inner_product(QState* qstate_0, QState* qstate_1, double* real,
 			      double* imag);
 bool     qstate_tensor_product(QState* qstate_0, QState* qstate_1, void** qstate_out);
 bool     qstate_expect_value(QState* qstate, Observable* observ, double* value);
+bool     qstate_expect_gradient(QState* qstate, Observable* observ, int gate_num,
+				QGate* qgate, double* value, double* grad, int* grad_num);
+bool     vector_operate_mcu(COMPLEX* camp, int qubit_num, int qnum, int qid[MAX_QUBIT_NUM],
+			    COMPLEX* U2);
+bool     qstate_operate_mcu(QState* qstate, int qnum, int qid[MAX_QUBIT_NUM], COMPLEX* U2);
+bool     qstate_qft(QState* qstate, int qnum, int qid[MAX_QUBIT_NUM], bool inverse);
+bool     qstate_apply_permutation(QState* qstate, int qnum_in, int qid_in[MAX_QUBIT_NUM],
+				  int qnum_out, int qid_out[MAX_QUBIT_NUM], int* table);
+bool     qstate_phase_oracle(QState* qstate, int qnum, int qid[MAX_QUBIT_NUM], int* mask);
+bool     qstate_diffuse(QState* qstate, int qnum, int qid[MAX_QUBIT_NUM]);
+bool     qstate_operate_qgate_batch(QState* qstate, int gate_num, QGate* qgate);
+bool     qstate_operate_qgate_fused(QState* qstate, int gate_num, QGate* qgate);
+bool     qstate_operate_qcirc(QState* qstate, int gate_num, QGate* qgate, int cmem_num,
+			      int* cmem, int shots, int workers, int* mval_out);
 bool     qstate_apply_matrix(QState* qstate, int qnum, int qid[MAX_QUBIT_NUM],
-			     double* real, double *imag, int row, int col);
+			     COMPLEX* matrix, int row, int col);
 void	 qstate_free(QState* qstate);
 
 /* mdata.c */
@@ -476,15 +532,19 @@ void	 qsystem_free(QSystem* qsystem);
 
 /* spro.c */
 bool     spro_init(char* str, void** spro_out);
+bool     spro_get_mask(SPro* spro, int qubit_num, int* xmask_out, int* zmask_out,
+		       int* ynum_out);
 void     spro_free(SPro* spro);
 
 /* observable.c */
 bool     observable_init(char* str, void** observ_out);
+bool     observable_apply(Observable* observ, int qubit_num, COMPLEX* camp_in,
+			  COMPLEX* camp_out);
 void     observable_free(Observable* observ);
 
 /* densop.c */
 bool     densop_init(QState* qstate, double* prob, int num, void** densop_out);
-bool     densop_init_with_matrix(double* real, double* imag, int row, int col,
+bool     densop_init_with_matrix(COMPLEX* matrix, int row, int col,
 				 void** densop_out);
 bool	 densop_reset(DensOp* densop, int qubit_num, int qubit_id[MAX_QUBIT_NUM]);
 bool	 densop_copy(DensOp* densop_in, void** densop_out);
@@ -497,12 +557,14 @@ bool     densop_sqtrace(DensOp* densop, double* real, double* imag);
 bool     densop_patrace(DensOp* densop_in, int qubit_num, int qubit_id[MAX_QUBIT_NUM],
 			void** densop_out);
 bool     densop_apply_matrix(DensOp* densop, int qnum_part, int qid[MAX_QUBIT_NUM],
-			     ApplyDir adir, double* real, double* imag, int row, int col);
+			     ApplyDir adir, COMPLEX* matrix, int row, int col);
 bool     densop_probability(DensOp* densop, int qnum_part, int qid[MAX_QUBIT_NUM],
-			    MatrixType mtype, double* real, double* imag, int row, int col,
+			    MatrixType mtype, COMPLEX* matrix, int row, int col,
 			    double* prob_out);
 bool     densop_operate_qgate(DensOp* densop, Kind kind, double alpha, double beta,
 			      double gamma, int qubit_id[MAX_QUBIT_NUM]);
+bool     densop_operate_mcu(DensOp* densop, int qnum, int qid[MAX_QUBIT_NUM], COMPLEX* U2);
+bool     densop_operate_qgate_batch(DensOp* densop, int gate_num, QGate* qgate);
 bool     densop_tensor_product(DensOp* densop_0, DensOp* densop_1, void** densop_out);
 void     densop_free(DensOp* densop);
 
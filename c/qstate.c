@@ -55,6 +55,10 @@ static bool _qstate_normalize(QState* qstate)
   
   if (qstate == NULL) ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
 
+#ifdef USE_OPENMP
+#pragma omp parallel for reduction(+:norm) \
+  if (qstate->qubit_num >= MIN_QUBIT_NUM_PARALLEL) num_threads(qlazy_get_num_threads())
+#endif
   for (int i=0; i<qstate->state_num; i++) {
     norm += pow(cabs(qstate->camp[i]),2.0);
   }
@@ -70,6 +74,10 @@ static bool _qstate_normalize(QState* qstate)
 
   /* normalization */
   if (norm != 0.0) {
+#ifdef USE_OPENMP
+#pragma omp parallel for if (qstate->qubit_num >= MIN_QUBIT_NUM_PARALLEL) \
+  num_threads(qlazy_get_num_threads())
+#endif
     for (int i=0; i<qstate->state_num; i++) {
       qstate->camp[i] = qstate->camp[i] / norm;
     }
@@ -255,31 +263,41 @@ bool qstate_init(int qubit_num, void** qstate_out)
   if (!(qstate->camp = (COMPLEX*)malloc(sizeof(COMPLEX)*state_num)))
     ERR_RETURN(ERROR_CANT_ALLOC_MEMORY,false);
 
-  if (!(gbank_init((void**)&(qstate->gbank))))
+  if (!(gbank_get_shared((void**)&(qstate->gbank))))
       ERR_RETURN(ERROR_GBANK_INIT,false);
 
   _qstate_set_0(qstate);
 
+  /* default seed of the random number generator (set by qstate_set_seed) */
+  randstate_init(&(qstate->rand), (uint64_t)rand());
+
   *qstate_out = qstate;
   
   SUC_RETURN(true);
 }
 
-bool qstate_init_with_vector(double* real, double* imag, int dim, void** qstate_out)
+bool qstate_set_seed(QState* qstate, unsigned int seed)
+{
+  if (qstate == NULL) ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+  randstate_init(&(qstate->rand), (uint64_t)seed);
+
+  SUC_RETURN(true);
+}
+
+bool qstate_init_with_vector(COMPLEX* vector, int dim, void** qstate_out)
 {
   QState	*qstate = NULL;
-  int            state_num = dim;
   int		 qubit_num;
 
-  if ((real == NULL) || (imag == NULL) || (dim <= 0) || (!(is_power_of_2(dim))))
+  if ((vector == NULL) || (dim <= 0) || (!(is_power_of_2(dim))))
     ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
 
   qubit_num = log2(dim);
   if (!(qstate_init(qubit_num, (void**)&qstate)))
     ERR_RETURN(ERROR_QSTATE_INIT,false);
 
-  for (int i=0; i<state_num; i++)
-    qstate->camp[i] = real[i] + 1.0i * imag[i];
+  memcpy(qstate->camp, vector, sizeof(COMPLEX)*dim);
 
   *qstate_out = qstate;
   
@@ -340,6 +358,7 @@ bool qstate_copy(QState* qstate_in, void** qstate_out)
     ERR_RETURN(ERROR_QSTATE_INIT,false);
 
   memcpy(qstate->camp, qstate_in->camp, sizeof(COMPLEX)*qstate_in->state_num);
+  randstate_split(&(qstate_in->rand), &(qstate->rand));
 
   *qstate_out = qstate;
 
@@ -477,620 +496,1488 @@ bool qstate_print_bloch(QState* qstate, int qid)
   SUC_RETURN(true);
 }
 
-static bool _qstate_operate_unitary2(COMPLEX* camp_out, COMPLEX* camp_in, COMPLEX* U2,
-				     int qubit_num, int state_num, int n)
+static int _cmp_int(const void* p, const void* q)
 {
-  int nn = qubit_num - n - 1;
-  
-  for (int i=0; i<state_num; i++) {
-    if ((i >> nn) %2 == 0) {
-      camp_out[i]
-	= U2[IDX2(0,0)] * camp_in[i]
-	+ U2[IDX2(0,1)] * camp_in[i + (1 << nn)];
-    }
-    else {
-      camp_out[i]
-	= U2[IDX2(1,0)] * camp_in[i - (1 << nn)]
-	+ U2[IDX2(1,1)] * camp_in[i];
-    }
-  }
-  
-  SUC_RETURN(true);
+  return *(const int*)p - *(const int*)q;
 }
 
-static bool _qstate_operate_unitary4(COMPLEX* camp_out, COMPLEX* camp_in, COMPLEX* U4,
-				     int qubit_num, int state_num, int m, int n)
+static int _insert_zero_bit(int k, int pos)
 {
-  int mm = qubit_num - m - 1;
-  int nn = qubit_num - n - 1;
+  /* insert '0' at the 'pos'-th bit of 'k' (ex: k=0b111,pos=1 -> 0b1101) */
+  return ((k >> pos) << (pos + 1)) | (k & ((1 << pos) - 1));
+}
 
-  for (int i=0; i<state_num; i++) {
-    if (((i >> mm) % 2 == 0) && ((i >> nn) % 2 == 0)) {
-      camp_out[i]
-	= U4[IDX4(0,0)] * camp_in[i]
-	+ U4[IDX4(0,1)] * camp_in[i + (1 << nn)]
-	+ U4[IDX4(0,2)] * camp_in[i + (1 << mm)]
-	+ U4[IDX4(0,3)] * camp_in[i + (1 << nn) + (1 << mm)];
-    }
-    else if (((i >> mm) % 2 == 0) && ((i >> nn) % 2 == 1)) {
-      camp_out[i]
-	= U4[IDX4(1,0)] * camp_in[i - (1 << nn)]
-	+ U4[IDX4(1,1)] * camp_in[i]
-	+ U4[IDX4(1,2)] * camp_in[i - (1 << nn) + (1 << mm)]
-	+ U4[IDX4(1,3)] * camp_in[i + (1 << mm)];
-    }
-    else if (((i >> mm) % 2 == 1) && ((i >> nn) % 2 == 0)) {
-      camp_out[i]
-	= U4[IDX4(2,0)] * camp_in[i - (1 << mm)]
-	+ U4[IDX4(2,1)] * camp_in[i + (1 << nn) - (1 << mm)]
-	+ U4[IDX4(2,2)] * camp_in[i]
-	+ U4[IDX4(2,3)] * camp_in[i + (1 << nn)];
-    }
-    else {
-      camp_out[i]
-	= U4[IDX4(3,0)] * camp_in[i - (1 << nn) - (1 << mm)]
-	+ U4[IDX4(3,1)] * camp_in[i - (1 << mm)]
-	+ U4[IDX4(3,2)] * camp_in[i - (1 << nn)]
-	+ U4[IDX4(3,3)] * camp_in[i];
+static void _bit_gather_table(int table[4][256], int num, int pos[MAX_QUBIT_NUM])
+{
+  /*
+    lookup table to gather the bits at 'pos' from a state index i:
+    (table[0][i & 0xff] | table[1][(i >> 8) & 0xff] | ...) has the 'pos[j]'-th bit
+    of i at its (num-1-j)-th bit
+  */
+  memset(table, 0, sizeof(int) * 4 * 256);
+  for (int j=0; j<num; j++) {
+    for (int b=0; b<256; b++) {
+      if ((b >> (pos[j] % 8)) & 1) table[pos[j] / 8][b] |= (1 << (num - 1 - j));
     }
   }
-  
-  SUC_RETURN(true);
 }
 
-#ifdef TEST_NEW_VERSION
+static inline int _bit_gather(int table[4][256], int i)
+{
+  return (table[0][i & 0xff] | table[1][(i >> 8) & 0xff] |
+	  table[2][(i >> 16) & 0xff] | table[3][(i >> 24) & 0xff]);
+}
 
-static bool _qstate_operate_unitary_new(QState* qstate, COMPLEX* U, int dim, int m, int n)
+static bool _qstate_operate_unitary2(COMPLEX* camp, COMPLEX* U2, int qubit_num, int n)
 {
-  int		qnum_part;
-  int		qid[MAX_QUBIT_NUM];
-  double	real[16];
-  double	imag[16];
-  int		row,col;
+  int		nn   = qubit_num - n - 1;
+  int		half = (1 << (qubit_num - 1));
+  int		i0, i1;
+  COMPLEX	c0, c1;
 
-  if ((qstate == NULL) || (dim < 0))
+  if ((camp == NULL) || (U2 == NULL) || (n < 0) || (n >= qubit_num))
     ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
-  if ((m < 0) || (m >= qstate->state_num))
-    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
-  
-  if (dim == 2) {
-    qnum_part = 1;
-    row = col = 2;
-    qid[0] = m;
-    for (int i=0; i<dim*dim; i++) {
-      real[i] = creal(U[i]);
-      imag[i] = cimag(U[i]);
-    }
-    if (!(qstate_apply_matrix(qstate, qnum_part, qid, real, imag, row, col)))
-      ERR_RETURN(ERROR_QSTATE_APPLY_MATRIX,false);
-  }
 
-  else if (dim == 4) {
-    if ((n < 0) || (n >= qstate->state_num) || (m == n))
-      ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
-    qnum_part = 2;
-    row = col = 4;
-    qid[0] = m; qid[1] = n;
-    for (int i=0; i<dim*dim; i++) {
-      real[i] = creal(U[i]);
-      imag[i] = cimag(U[i]);
-    }
-    if (!(qstate_apply_matrix(qstate, qnum_part, qid, real, imag, row, col)))
-      ERR_RETURN(ERROR_QSTATE_APPLY_MATRIX,false);
+  /* update the amplitude pairs {|..0..>,|..1..>} in place */
+#ifdef USE_OPENMP
+#pragma omp parallel for private(i0,i1,c0,c1) if (qubit_num >= MIN_QUBIT_NUM_PARALLEL) \
+  num_threads(qlazy_get_num_threads())
+#endif
+  for (int k=0; k<half; k++) {
+    i0 = _insert_zero_bit(k, nn);
+    i1 = i0 | (1 << nn);
+    c0 = camp[i0];
+    c1 = camp[i1];
+    camp[i0] = U2[IDX2(0,0)] * c0 + U2[IDX2(0,1)] * c1;
+    camp[i1] = U2[IDX2(1,0)] * c0 + U2[IDX2(1,1)] * c1;
   }
+  
+  SUC_RETURN(true);
+}
 
-  else {
+static bool _qstate_operate_unitary4(COMPLEX* camp, COMPLEX* U4, int qubit_num, int m, int n)
+{
+  int		mm      = qubit_num - m - 1;
+  int		nn      = qubit_num - n - 1;
+  int		lo      = (mm < nn) ? mm : nn;
+  int		hi      = (mm < nn) ? nn : mm;
+  int		quarter = (1 << (qubit_num - 2));
+  int		i00, i01, i10, i11;
+  COMPLEX	c00, c01, c10, c11;
+
+  if ((camp == NULL) || (U4 == NULL) || (m < 0) || (m >= qubit_num) ||
+      (n < 0) || (n >= qubit_num) || (m == n))
     ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+  /* update the amplitude quads {|..0..0..>,..,|..1..1..>} in place */
+#ifdef USE_OPENMP
+#pragma omp parallel for private(i00,i01,i10,i11,c00,c01,c10,c11) if (qubit_num >= MIN_QUBIT_NUM_PARALLEL) \
+  num_threads(qlazy_get_num_threads())
+#endif
+  for (int k=0; k<quarter; k++) {
+    i00 = _insert_zero_bit(_insert_zero_bit(k, lo), hi);
+    i01 = i00 | (1 << nn);
+    i10 = i00 | (1 << mm);
+    i11 = i01 | (1 << mm);
+    c00 = camp[i00];
+    c01 = camp[i01];
+    c10 = camp[i10];
+    c11 = camp[i11];
+    camp[i00] = U4[IDX4(0,0)] * c00 + U4[IDX4(0,1)] * c01
+              + U4[IDX4(0,2)] * c10 + U4[IDX4(0,3)] * c11;
+    camp[i01] = U4[IDX4(1,0)] * c00 + U4[IDX4(1,1)] * c01
+              + U4[IDX4(1,2)] * c10 + U4[IDX4(1,3)] * c11;
+    camp[i10] = U4[IDX4(2,0)] * c00 + U4[IDX4(2,1)] * c01
+              + U4[IDX4(2,2)] * c10 + U4[IDX4(2,3)] * c11;
+    camp[i11] = U4[IDX4(3,0)] * c00 + U4[IDX4(3,1)] * c01
+              + U4[IDX4(3,2)] * c10 + U4[IDX4(3,3)] * c11;
   }
   
   SUC_RETURN(true);
 }
 
-#else
-
 static bool _qstate_operate_unitary(QState* qstate, COMPLEX* U, int dim, int m, int n)
 {
-  QState* qstate_tmp = NULL;
-
   if ((qstate == NULL) || (dim < 0))
     ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
 
-  if (!(qstate_init(qstate->qubit_num, (void**)&qstate_tmp)))
-    ERR_RETURN(ERROR_QSTATE_INIT,false);
-  
   if (dim == 2) {
-    if (!(_qstate_operate_unitary2(qstate_tmp->camp, qstate->camp, U,
-				   qstate->qubit_num, qstate->state_num, m)))
+    if (!(_qstate_operate_unitary2(qstate->camp, U, qstate->qubit_num, m)))
       ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
   }
   else if (dim == 4) {
-    if (!(_qstate_operate_unitary4(qstate_tmp->camp, qstate->camp, U,
-				   qstate->qubit_num, qstate->state_num, m, n)))
+    if (!(_qstate_operate_unitary4(qstate->camp, U, qstate->qubit_num, m, n)))
       ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
   }
   else {
     ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
   }
 
-  memcpy(qstate->camp, qstate_tmp->camp, sizeof(COMPLEX)*qstate->state_num);
-  qstate_free(qstate_tmp); qstate_tmp = NULL;
-
-  SUC_RETURN(true);
-}
-
-#endif
-
-static bool _qstate_transform_basis(QState* qstate, double angle, double phase, int n)
-{
-  /*
-     This function operate U+ to the qstate
-     - |p> = U |0> = cos(theta/2) |0> + exp(i phi) sin(theta/2) |1>
-     - U = Rz(PI/2 + phi) H Rz(theta) H
-     - U+ = H Rz(-theta) H Rz(-PI/2 - phi)
-   */
-  double	phs = -0.5 - phase;
-  double	ang = -angle;
-  int		qubit_id[MAX_QUBIT_NUM];
-
-  if (qstate == NULL) ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
-  
-  qubit_id[0] = n;
-  if (!(qstate_operate_qgate(qstate, ROTATION_Z, phs, 0.0, 0.0, qubit_id)))
-    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
-  if (!(qstate_operate_qgate(qstate, HADAMARD, 0.0, 0.0, 0.0, qubit_id)))
-    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
-  if (!(qstate_operate_qgate(qstate, ROTATION_Z, ang, 0.0, 0.0, qubit_id)))
-    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
-  if (!(qstate_operate_qgate(qstate, HADAMARD, 0.0, 0.0, 0.0, qubit_id)))
-    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
-
   SUC_RETURN(true);
 }
 
-static bool _qstate_transform_basis_inv(QState* qstate, double angle, double phase, int n)
+static bool _qstate_operate_diagonal2(COMPLEX* camp, COMPLEX d0, COMPLEX d1,
+				      int qubit_num, int n)
 {
-  /* 
-     This function operate U to the qstate
-     - |p> = U |0> = cos(theta/2) |0> + exp(i phi) sin(theta/2) |1>
-     - U = Rz(PI/2 + phi) H Rz(theta) H
-     - U+ = H Rz(-theta) H Rz(-PI/2 - phi)
-   */
-  double	phs = 0.5 + phase;
-  double	ang = angle;
-  int		qubit_id[MAX_QUBIT_NUM];
+  /* diagonal 1-qubit gate: diag(d0,d1) */
+  int	nn   = qubit_num - n - 1;
+  int	half = (1 << (qubit_num - 1));
+  int	i0;
 
-  if (qstate == NULL) ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
-  
-  qubit_id[0] = n;
-  if (!(qstate_operate_qgate(qstate, HADAMARD, 0.0, 0.0, 0.0, qubit_id)))
-    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
-  if (!(qstate_operate_qgate(qstate, ROTATION_Z, ang, 0.0, 0.0, qubit_id)))
-    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
-  if (!(qstate_operate_qgate(qstate, HADAMARD, 0.0, 0.0, 0.0, qubit_id)))
-    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
-  if (!(qstate_operate_qgate(qstate, ROTATION_Z, phs, 0.0, 0.0, qubit_id)))
+  if ((camp == NULL) || (n < 0) || (n >= qubit_num))
     ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
 
-  SUC_RETURN(true);
-}
-
-static int _qstate_measure_one_time_without_change_state(QState* qstate_in, double angle,
-							 double phase, int qubit_num,
-							 int qubit_id[MAX_QUBIT_NUM])
-{
-  double	r      = rand()/(double)RAND_MAX;
-  double	prob_s = 0.0;
-  double	prob_e = 0.0;
-  int		value  = qstate_in->state_num - 1;
-  QState*	qstate = NULL;
-
-  if (qstate_in == NULL) ERR_RETURN(ERROR_INVALID_ARGUMENT,-1);
-  
-  /* copy qstate for measurement */
-  if (!(qstate_copy(qstate_in, (void**)&qstate)))
-    ERR_RETURN(ERROR_QSTATE_COPY,-1);
-
-  /* unitary transform, if measuremment base is not {|0><0|,|1><1|} */
-  if ((angle != 0.0) || (phase != 0.0)) {
-    for (int i=0; i<qubit_num; i++) {
-      if (!(_qstate_transform_basis(qstate, angle, phase, qubit_id[i])))
-	ERR_RETURN(ERROR_INVALID_ARGUMENT,-1);
+  if (d0 == 1.0) {  /* Z,S,T,P,U1: phase only on |..1..> */
+#ifdef USE_OPENMP
+#pragma omp parallel for private(i0) if (qubit_num >= MIN_QUBIT_NUM_PARALLEL) \
+  num_threads(qlazy_get_num_threads())
+#endif
+    for (int k=0; k<half; k++) {
+      i0 = _insert_zero_bit(k, nn);
+      camp[i0 | (1 << nn)] *= d1;
     }
   }
-
-  for (int i=0; i<qstate->state_num; i++) {
-    prob_s = prob_e;
-    prob_e += pow(cabs(qstate->camp[i]),2.0);
-    if (r >= prob_s && r < prob_e) value = i;
+  else {
+#ifdef USE_OPENMP
+#pragma omp parallel for private(i0) if (qubit_num >= MIN_QUBIT_NUM_PARALLEL) \
+  num_threads(qlazy_get_num_threads())
+#endif
+    for (int k=0; k<half; k++) {
+      i0 = _insert_zero_bit(k, nn);
+      camp[i0] *= d0;
+      camp[i0 | (1 << nn)] *= d1;
+    }
   }
 
-  qstate_free(qstate);
-
-  SUC_RETURN(value);
+  SUC_RETURN(true);
 }
 
-static int _qstate_measure_one_time(QState* qstate, double angle, double phase,
-				    int qubit_num, int qubit_id[MAX_QUBIT_NUM])
+static bool _qstate_operate_ctr_diagonal4(COMPLEX* camp, COMPLEX d0, COMPLEX d1,
+					  int qubit_num, int m, int n)
 {
-  double	r      = rand()/(double)RAND_MAX;
-  double	prob_s = 0.0;
-  double	prob_e = 0.0;
-  int		value  = qstate->state_num - 1;
-  int mes_id,x;
-
-  if (qstate == NULL) ERR_RETURN(ERROR_INVALID_ARGUMENT,-1);
+  /* controlled diagonal gate: diag(1,1,d0,d1), m = control, n = target */
+  int	mm      = qubit_num - m - 1;
+  int	nn      = qubit_num - n - 1;
+  int	lo      = (mm < nn) ? mm : nn;
+  int	hi      = (mm < nn) ? nn : mm;
+  int	quarter = (1 << (qubit_num - 2));
+  int	i10;
+
+  if ((camp == NULL) || (m < 0) || (m >= qubit_num) ||
+      (n < 0) || (n >= qubit_num) || (m == n))
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
 
-  /* change basis, if measurement axis isn't Z */
-  if ((angle != 0.0) || (phase != 0.0)) {
-    for (int i=0; i<qubit_num; i++) {
-      if (!(_qstate_transform_basis(qstate, angle, phase, qubit_id[i])))
-	ERR_RETURN(ERROR_INVALID_ARGUMENT,-1);
+  if (d0 == 1.0) {  /* CZ,CS,CT,CP,CU1: phase only on |..1..1..> */
+#ifdef USE_OPENMP
+#pragma omp parallel for private(i10) if (qubit_num >= MIN_QUBIT_NUM_PARALLEL) \
+  num_threads(qlazy_get_num_threads())
+#endif
+    for (int k=0; k<quarter; k++) {
+      i10 = _insert_zero_bit(_insert_zero_bit(k, lo), hi) | (1 << mm);
+      camp[i10 | (1 << nn)] *= d1;
     }
   }
-
-  for (int i=0; i<qstate->state_num; i++) {
-    prob_s = prob_e;
-    prob_e += pow(cabs(qstate->camp[i]),2.0);
-    if (r >= prob_s && r < prob_e) value = i;
-  }
-
-  /* update quantum state by measurement (projection,normalize and change basis) */
-
-  /* projection*/
-  if (!(_select_bits(&mes_id, value, qubit_num, qstate->qubit_num, qubit_id)))
-    ERR_RETURN(ERROR_INVALID_ARGUMENT,-1);
-  for (int i=0; i<qstate->state_num; i++) {
-    if (!(_select_bits(&x, i, qubit_num, qstate->qubit_num, qubit_id)))
-      ERR_RETURN(ERROR_INVALID_ARGUMENT,-1);
-    if (x != mes_id) qstate->camp[i] = 0.0;
-  }
-  /* normalize */
-  if (!(_qstate_normalize(qstate))) ERR_RETURN(ERROR_INVALID_ARGUMENT,-1);
-  /* change basis (inverse), if measurement axis isn't Z */
-  if ((angle != 0.0) || (phase != 0.0)) {
-    for (int i=0; i<qubit_num; i++) {
-      if (!(_qstate_transform_basis_inv(qstate, angle, phase, qubit_id[i])))
-	ERR_RETURN(ERROR_INVALID_ARGUMENT,-1);
+  else {
+#ifdef USE_OPENMP
+#pragma omp parallel for private(i10) if (qubit_num >= MIN_QUBIT_NUM_PARALLEL) \
+  num_threads(qlazy_get_num_threads())
+#endif
+    for (int k=0; k<quarter; k++) {
+      i10 = _insert_zero_bit(_insert_zero_bit(k, lo), hi) | (1 << mm);
+      camp[i10] *= d0;
+      camp[i10 | (1 << nn)] *= d1;
     }
   }
-  
-  SUC_RETURN(value);
+
+  SUC_RETURN(true);
 }
 
-bool qstate_measure(QState* qstate, int shot_num, double angle, double phase,
-		    int qubit_num, int qubit_id[MAX_QUBIT_NUM], void** mdata_out)
+static bool _qstate_operate_swap_bits(COMPLEX* camp, int qubit_num, int m, int n, int kind)
 {
-  int		state_id;
-  int		mes_id;
-  int		mes_num = (1<<qubit_num);
-  MData*	mdata	= NULL;
+  /*
+    permutation gate (swap amplitudes only)
+    - PAULI_X:      |..0..> <-> |..1..> (n is ignored)
+    - CONTROLLED_X: |..1..0..> <-> |..1..1..> (m = control, n = target)
+    - SWAP:         |..0..1..> <-> |..1..0..>
+   */
+  int		mm = qubit_num - m - 1;
+  int		nn = qubit_num - n - 1;
+  int		lo, hi, i0, i1;
+  COMPLEX	c;
 
-  if ((qstate == NULL) ||
-      (shot_num < 1) || (qubit_num < 0) ||
-      (qubit_num > qstate->qubit_num))
+  if ((camp == NULL) || (m < 0) || (m >= qubit_num))
     ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
 
-  /* measure all bits, if no parameter set */
-  if (qubit_num == 0) {
-    qubit_num = qstate->qubit_num;
-    mes_num = (1<<qubit_num);
-    for (int i=0; i<qstate->qubit_num; i++) {
-      qubit_id[i] = i;
+  if (kind == PAULI_X) {
+#ifdef USE_OPENMP
+#pragma omp parallel for private(i0,i1,c) if (qubit_num >= MIN_QUBIT_NUM_PARALLEL) \
+  num_threads(qlazy_get_num_threads())
+#endif
+    for (int k=0; k<(1 << (qubit_num - 1)); k++) {
+      i0 = _insert_zero_bit(k, mm);
+      i1 = i0 | (1 << mm);
+      c = camp[i0]; camp[i0] = camp[i1]; camp[i1] = c;
     }
+    SUC_RETURN(true);
   }
 
-  /* initialize mdata */
-  if (!(mdata_init(qubit_num, mes_num, shot_num, angle, phase, qubit_id,
-		   (void**)&mdata))) ERR_RETURN(ERROR_MDATA_INIT,false);
+  if ((n < 0) || (n >= qubit_num) || (m == n))
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
 
-  /* execute mesurement */
-  for (int i=0; i<shot_num; i++) {
-    if (i == shot_num - 1) {  /* if last measurement -> change state */
-      state_id = _qstate_measure_one_time(qstate, angle, phase, qubit_num, qubit_id);
+  lo = (mm < nn) ? mm : nn;
+  hi = (mm < nn) ? nn : mm;
+#ifdef USE_OPENMP
+#pragma omp parallel for private(i0,i1,c) if (qubit_num >= MIN_QUBIT_NUM_PARALLEL) \
+  num_threads(qlazy_get_num_threads())
+#endif
+  for (int k=0; k<(1 << (qubit_num - 2)); k++) {
+    i0 = _insert_zero_bit(_insert_zero_bit(k, lo), hi);
+    if (kind == CONTROLLED_X) {
+      i0 = i0 | (1 << mm);
+      i1 = i0 | (1 << nn);
     }
-    else {  /* if not last measurement -> not change state */
-      state_id = _qstate_measure_one_time_without_change_state(qstate, angle, phase,
-							       qubit_num, qubit_id);
+    else {  /* SWAP */
+      i1 = i0 | (1 << mm);
+      i0 = i0 | (1 << nn);
     }
-    if (!(_select_bits(&mes_id, state_id, qubit_num, qstate->qubit_num, qubit_id)))
-      ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
-    mdata->freq[mes_id]++;
+    c = camp[i0]; camp[i0] = camp[i1]; camp[i1] = c;
   }
-  mdata->last = mes_id;
 
-  *mdata_out = mdata;
   SUC_RETURN(true);
 }
 
-bool qstate_measure_bell(QState* qstate, int shot_num, int qubit_num,
-			 int qubit_id[MAX_QUBIT_NUM], void** mdata_out)
+bool vector_operate_mcu(COMPLEX* camp, int qubit_num, int qnum, int qid[MAX_QUBIT_NUM],
+			COMPLEX* U2)
+/*
+  multi-controlled 2x2 gate on the state vector camp (2^qubit_num amplitudes)
+  - qid[0..qnum-2] = control qubits, qid[qnum-1] = target qubit
+  - only the amplitude pairs whose control bits are all 1 are touched
+  - X (swap), diagonal (Z, phase) and general 2x2 are handled separately
+ */
 {
-  MData*	mdata  = NULL;
-  
-  if ((qstate == NULL) || (shot_num < 1) || (qubit_num != 2))
+  int		pos[MAX_QUBIT_NUM];	/* bit positions (ascending) */
+  int		cmask = 0;		/* control bits */
+  int		tbit  = 0;		/* target bit */
+  int		num;
+  int		i0, i1;
+  COMPLEX	c0, c1;
+  bool		is_x, is_diag;
+
+  if ((camp == NULL) || (U2 == NULL) || (qnum < 1) || (qnum > qubit_num))
     ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
 
-  /* equivalent transform to bell-basis */
-  /* CX 0 1 */
-  if (!(qstate_operate_qgate(qstate, CONTROLLED_X, 0.0, 0.0, 0.0, qubit_id)))
-    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
-  /* H 0 */
-  if (!(qstate_operate_qgate(qstate, HADAMARD, 0.0, 0.0, 0.0, qubit_id)))
-    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
-  /* CX 0 1 */
-  if (!(qstate_operate_qgate(qstate, CONTROLLED_X, 0.0, 0.0, 0.0, qubit_id)))
-    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+  for (int k=0; k<qnum; k++) {
+    if ((qid[k] < 0) || (qid[k] >= qubit_num)) ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+    pos[k] = qubit_num - qid[k] - 1;
+    if (((cmask | tbit) >> pos[k]) & 1) ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+    if (k < qnum - 1) cmask |= (1 << pos[k]);
+    else tbit = (1 << pos[k]);
+  }
+  qsort(pos, qnum, sizeof(int), _cmp_int);
 
-  /* execute Bell-mesurement */
-  if (!(qstate_measure(qstate, shot_num, 0.0, 0.0, qubit_num, qubit_id, (void**)&mdata)))
-    ERR_RETURN(ERROR_QSTATE_MEASURE,false);
+  num = (1 << (qubit_num - qnum));
+  is_x = ((U2[IDX2(0,0)] == 0.0) && (U2[IDX2(1,1)] == 0.0) &&
+	  (U2[IDX2(0,1)] == 1.0) && (U2[IDX2(1,0)] == 1.0));
+  is_diag = ((U2[IDX2(0,1)] == 0.0) && (U2[IDX2(1,0)] == 0.0));
 
-  /* equivalent transform to bell-basis (inverse) */
-  /* CX 0 1 */
-  if (!(qstate_operate_qgate(qstate, CONTROLLED_X, 0.0, 0.0, 0.0, qubit_id)))
-    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
-  /* H 0 */
-  if (!(qstate_operate_qgate(qstate, HADAMARD, 0.0, 0.0, 0.0, qubit_id)))
-    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
-  /* CX 0 1 */
-  if (!(qstate_operate_qgate(qstate, CONTROLLED_X, 0.0, 0.0, 0.0, qubit_id)))
-    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+#ifdef USE_OPENMP
+#pragma omp parallel for private(i0,i1,c0,c1) if (qubit_num >= MIN_QUBIT_NUM_PARALLEL) \
+  num_threads(qlazy_get_num_threads())
+#endif
+  for (int k=0; k<num; k++) {
+    i0 = k;
+    for (int l=0; l<qnum; l++) i0 = _insert_zero_bit(i0, pos[l]);
+    i0 |= cmask;
+    i1 = i0 | tbit;
+    if (is_x) {
+      c0 = camp[i0]; camp[i0] = camp[i1]; camp[i1] = c0;
+    }
+    else if (is_diag) {
+      if (U2[IDX2(0,0)] != 1.0) camp[i0] *= U2[IDX2(0,0)];
+      camp[i1] *= U2[IDX2(1,1)];
+    }
+    else {
+      c0 = camp[i0];
+      c1 = camp[i1];
+      camp[i0] = U2[IDX2(0,0)] * c0 + U2[IDX2(0,1)] * c1;
+      camp[i1] = U2[IDX2(1,0)] * c0 + U2[IDX2(1,1)] * c1;
+    }
+  }
 
-  *mdata_out = mdata;
   SUC_RETURN(true);
 }
 
-bool qstate_operate_qgate(QState* qstate, Kind kind, double alpha, double beta,
-			  double gamma, int qubit_id[MAX_QUBIT_NUM])
+bool qstate_operate_mcu(QState* qstate, int qnum, int qid[MAX_QUBIT_NUM], COMPLEX* U2)
 {
-  int		q0  = qubit_id[0];
-  int		q1  = qubit_id[1];
-  int		dim = 0;
-  COMPLEX*	U   = NULL;
-
   if (qstate == NULL) ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
 
-  if ((kind == INIT) || (kind ==MEASURE) || (kind ==MEASURE_X) ||
-      (kind == MEASURE_Y) || (kind == MEASURE_Z) || (kind == MEASURE_BELL))
-    SUC_RETURN(true);
-  else {
-    if (!(gbank_get_unitary(qstate->gbank, kind, alpha, beta, gamma, &dim, (void**)&U)))
-      ERR_RETURN(ERROR_GBANK_GET_UNITARY,false);
-#ifdef TEST_NEW_VERSION
-    if (!(_qstate_operate_unitary_new(qstate, U, dim, q0, q1)))
-      ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
-#else
-    if (!(_qstate_operate_unitary(qstate, U, dim, q0, q1)))
-      ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
-#endif
-    free(U); U = NULL;
-    SUC_RETURN(true);
-  }
+  if (!(vector_operate_mcu(qstate->camp, qstate->qubit_num, qnum, qid, U2)))
+    ERR_RETURN(ERROR_QSTATE_OPERATE_QGATE,false);
+
+  SUC_RETURN(true);
 }
 
-static bool _qstate_evolve_spro(QState* qstate, SPro* spro, double time)
+bool qstate_qft(QState* qstate, int qnum, int qid[MAX_QUBIT_NUM], bool inverse)
+/*
+  quantum fourier transform on the register qid (qid[0] = most significant bit)
+  - |x> -> 1/sqrt(N) sum_y exp(+-2*PI*i*x*y/N) |y>  (N = 2^qnum, '-' if inverse)
+  - radix-2 decimation-in-frequency FFT along the register axis of the state:
+    qnum butterfly passes (scaled by 1/sqrt(2) each) and qnum/2 swap passes
+    for the bit-reversed output, i.e. O(qnum * 2^qubit_num)
+ */
 {
-  int	pre,now;
-  int	qubit_id[MAX_QUBIT_NUM];
-  
-  if ((qstate == NULL) || (spro == NULL))
+  COMPLEX*	camp;
+  COMPLEX*	twiddle = NULL;	/* exp(+-2*PI*i*t/N) (t = 0,...,N/2-1) */
+  int		pos[MAX_QUBIT_NUM];	/* bit positions of qid */
+  int		used = 0;
+  int		qubit_num, half;
+  int		wt[4][256];	/* twiddle index of each byte of the state index */
+  int		i0, i1, j;
+  double	sign  = (inverse == true) ? -1.0 : 1.0;
+  double	scale = 1.0 / sqrt(2.0);
+  COMPLEX	u, v;
+
+  if ((qstate == NULL) || (qnum < 1) || (qnum > qstate->qubit_num))
     ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
 
-  pre = -1; now = 0;
-  while (now < spro->spin_num) {
-    /* operate nothing */
-    if (spro->spin_type[now] == NONE) {
-      now++;
-      continue;
-    }
-    /* operate G: G=H (if PauliX), G=Rx(-0.5) (if PauliY), G=I (if PauliZ) */
-    if (spro->spin_type[now] == SIGMA_X) {
-      qubit_id[0] = now;
-      if (!(qstate_operate_qgate(qstate, HADAMARD, 0.0, 0.0, 0.0, qubit_id)))
-	ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
-    }
-    else if (spro->spin_type[now] == SIGMA_Y) {
-      qubit_id[0] = now;
-      if (!(qstate_operate_qgate(qstate, ROTATION_X, -0.5, 0.0, 0.0, qubit_id)))
-	ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
-    }
-    else if (spro->spin_type[now] == SIGMA_Z) {
-      ;
-    }
-    else {
+  camp = qstate->camp;
+  qubit_num = qstate->qubit_num;
+  for (int t=0; t<qnum; t++) {
+    if ((qid[t] < 0) || (qid[t] >= qubit_num) || ((used >> qid[t]) & 1))
       ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
-    }
-    /* operate CX */
-    if (pre >= 0) {
-      if ((spro->spin_type[pre] != NONE) && (spro->spin_type[now] != NONE)) {
-	qubit_id[0] = pre;
-	qubit_id[1] = now;
-	if (!(qstate_operate_qgate(qstate, CONTROLLED_X, 0.0, 0.0, 0.0, qubit_id)))
-	  ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
-      }
-    }
-    pre = now; now++;
+    used |= (1 << qid[t]);
+    pos[t] = qubit_num - qid[t] - 1;
   }
-  
-  /* operate Rz(-2.0*t) */
-  now = spro->spin_num-1;
-  qubit_id[0] = now;
-  if (!(qstate_operate_qgate(qstate, ROTATION_Z, -2.0*time, 0.0, 0.0, qubit_id)))
-    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
 
-  pre = now; now--;
-  while (pre >= 0) {
-    /* operate nothing */
-    if ((now >= 0) && (spro->spin_type[now] == NONE)) {
-      now--;
-      if (now >= 0) continue;
-    }
-    /* operate CX */
-    if (now >= 0) {
-      if ((spro->spin_type[pre] != NONE) && (spro->spin_type[now] != NONE)) {
-	qubit_id[0] = now;
-	qubit_id[1] = pre;
-	if (!(qstate_operate_qgate(qstate, CONTROLLED_X, 0.0, 0.0, 0.0, qubit_id)))
-	  ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+  half = (1 << (qnum - 1));
+  if (!(twiddle = (COMPLEX*)malloc(sizeof(COMPLEX) * half)))
+    ERR_RETURN(ERROR_CANT_ALLOC_MEMORY,false);
+  for (int t=0; t<half; t++) twiddle[t] = cexp(sign * M_PI * t / half * 1.0i);
+
+  for (int s=0; s<qnum; s++) {
+
+    /* butterfly on the bit of qid[s], twiddle from the lower register bits */
+    memset(wt, 0, sizeof(wt));
+    for (int t=s+1; t<qnum; t++) {
+      for (int b=0; b<256; b++) {
+	if ((b >> (pos[t] % 8)) & 1) wt[pos[t] / 8][b] += (1 << (qnum - 1 - t + s));
       }
     }
-    /* operate G+: G+=H (if PauliX), G+=Rx(+0.5) (if PauliY), G+=I (if PauliZ) */
-    if (spro->spin_type[pre] == SIGMA_X) {
-      qubit_id[0] = pre;
-      if (!(qstate_operate_qgate(qstate, HADAMARD, 0.0, 0.0, 0.0, qubit_id)))
-	ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
-    }
-    else if (spro->spin_type[pre] == SIGMA_Y) {
-      qubit_id[0] = pre;
-      if (!(qstate_operate_qgate(qstate, ROTATION_X, 0.5, 0.0, 0.0, qubit_id)))
-	ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
-    }
-    else if (spro->spin_type[pre] == SIGMA_Z) {
-      ;
-    }
-    else if (spro->spin_type[pre] == NONE) {
-      ;
-    }
-    else {
-      ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+#ifdef USE_OPENMP
+#pragma omp parallel for private(i0,i1,j,u,v) if (qubit_num >= MIN_QUBIT_NUM_PARALLEL) \
+  num_threads(qlazy_get_num_threads())
+#endif
+    for (int k=0; k<(1 << (qubit_num - 1)); k++) {
+      i0 = _insert_zero_bit(k, pos[s]);
+      i1 = i0 | (1 << pos[s]);
+      j = (wt[0][i0 & 0xff] + wt[1][(i0 >> 8) & 0xff] +
+	   wt[2][(i0 >> 16) & 0xff] + wt[3][(i0 >> 24) & 0xff]);
+      u = camp[i0];
+      v = camp[i1];
+      camp[i0] = scale * (u + v);
+      camp[i1] = scale * (u - v) * twiddle[j];
     }
-    pre = now; now--;
   }
-  
-  SUC_RETURN(true);
-}
-
-bool qstate_evolve(QState* qstate, Observable* observ, double time, int iter)
-{
-  double t = time / iter;
-  
-  if ((qstate == NULL) || (observ == NULL) || (iter < 1))
-    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+  free(twiddle);
 
-  for (int i=0; i<iter; i++) {
-    for (int j=0; j<observ->array_num; j++) {
-      if (!(_qstate_evolve_spro(qstate, observ->spro_array[j], t)))
-	ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
-    }
+  /* bit reversal of the register */
+  for (int t=0; t<qnum-1-t; t++) {
+    if (!(_qstate_operate_swap_bits(camp, qubit_num, qid[t], qid[qnum-1-t], SWAP)))
+      ERR_RETURN(ERROR_QSTATE_OPERATE_QGATE,false);
   }
 
   SUC_RETURN(true);
 }
 
-static bool _qstate_add(QState* qstate, QState* qstate_add)
+bool qstate_apply_permutation(QState* qstate, int qnum_in, int qid_in[MAX_QUBIT_NUM],
+			      int qnum_out, int qid_out[MAX_QUBIT_NUM], int* table)
+/*
+  classical reversible function on the basis states (amplitudes are only moved)
+  - qnum_out == 0: |x> -> |table[x]> on the register qid_in (table must be a permutation)
+  - qnum_out > 0:  |x>|y> -> |x>|y XOR table[x]> (x on qid_in, y on qid_out)
+  - qid[0] is the most significant bit of each register
+ */
 {
-  if ((qstate == NULL) || (qstate_add == NULL))
-    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
-
-  if (qstate->state_num != qstate_add->state_num)
+  COMPLEX*	camp;
+  int		qubit_num;
+  int		dim = (1 << qnum_in);
+  int		pos[MAX_QUBIT_NUM];	/* bit positions of qid_in */
+  int		used = 0;
+  int*		offset = NULL;		/* state index bits of each register value */
+  char*		visited = NULL;		/* flags of the register values already in a cycle */
+  int*		cycle	= NULL;		/* cycles of the permutation (concatenated) */
+  int*		start	= NULL;		/* start of each cycle in 'cycle' */
+  int		cnum	= 0;
+  int		ext[4][256];		/* register value of each byte of the state index */
+  int		base, src, dst, len;
+  COMPLEX	c;
+
+  if ((qstate == NULL) || (table == NULL) || (qnum_in < 1) || (qnum_out < 0) ||
+      (qnum_in + qnum_out > qstate->qubit_num))
     ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
 
-  for (int i=0; i<qstate->state_num; i++) {
-    qstate->camp[i] = qstate->camp[i] + qstate_add->camp[i];
+  camp = qstate->camp;
+  qubit_num = qstate->qubit_num;
+  for (int j=0; j<qnum_in+qnum_out; j++) {
+    int q = (j < qnum_in) ? qid_in[j] : qid_out[j-qnum_in];
+    if ((q < 0) || (q >= qubit_num) || ((used >> q) & 1))
+      ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+    used |= (1 << q);
+  }
+  for (int x=0; x<dim; x++) {
+    if ((table[x] < 0) || (table[x] >= (1 << (qnum_out > 0 ? qnum_out : qnum_in))))
+      ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
   }
 
+  /* offset[x] = x (or table[x] for XOR) spread over the qubit positions */
+  if (!(offset = (int*)malloc(sizeof(int) * dim)))
+    ERR_RETURN(ERROR_CANT_ALLOC_MEMORY,false);
+  for (int x=0; x<dim; x++) {
+    offset[x] = 0;
+    if (qnum_out > 0) {
+      for (int j=0; j<qnum_out; j++) {
+	if ((table[x] >> (qnum_out - 1 - j)) & 1) offset[x] |= (1 << (qubit_num - qid_out[j] - 1));
+      }
+    }
+    else {
+      for (int j=0; j<qnum_in; j++) {
+	if ((x >> (qnum_in - 1 - j)) & 1) offset[x] |= (1 << (qubit_num - qid_in[j] - 1));
+      }
+    }
+  }
+
+  if (qnum_out > 0) {
+
+    /* XOR: i <-> i ^ offset[x(i)] is an involution, swap each pair once */
+    for (int j=0; j<qnum_in; j++) pos[j] = qubit_num - qid_in[j] - 1;
+    _bit_gather_table(ext, qnum_in, pos);
+
+#ifdef USE_OPENMP
+#pragma omp parallel for private(src,dst,c) if (qubit_num >= MIN_QUBIT_NUM_PARALLEL) \
+  num_threads(qlazy_get_num_threads())
+#endif
+    for (int i=0; i<qstate->state_num; i++) {
+      src = _bit_gather(ext, i);
+      dst = i ^ offset[src];
+      if (dst > i) {
+	c = camp[i]; camp[i] = camp[dst]; camp[dst] = c;
+      }
+    }
+    free(offset);
+    SUC_RETURN(true);
+  }
+
+  /* permutation: decompose into cycles, then rotate each cycle for every outer index */
+  if (!(visited = (char*)calloc(dim, sizeof(char))) ||
+      !(cycle = (int*)malloc(sizeof(int) * dim)) ||
+      !(start = (int*)malloc(sizeof(int) * (dim + 1)))) {
+    free(offset); free(visited); free(cycle);
+    ERR_RETURN(ERROR_CANT_ALLOC_MEMORY,false);
+  }
+  len = 0;
+  for (int x=0; x<dim; x++) {
+    if (visited[x] == 1) continue;
+    visited[x] = 1;
+    if (table[x] == x) continue;
+    start[cnum++] = len;
+    cycle[len++] = x;
+    for (int y=table[x]; y!=x; y=table[y]) {
+      if (visited[y] == 1) {	/* table is not a permutation */
+	free(offset); free(visited); free(cycle); free(start);
+	ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+      }
+      visited[y] = 1;
+      cycle[len++] = y;
+    }
+  }
+  start[cnum] = len;
+
+  for (int j=0; j<qnum_in; j++) pos[j] = qubit_num - qid_in[j] - 1;
+  qsort(pos, qnum_in, sizeof(int), _cmp_int);
+
+#ifdef USE_OPENMP
+#pragma omp parallel for private(base,len,c) if (qubit_num >= MIN_QUBIT_NUM_PARALLEL) \
+  num_threads(qlazy_get_num_threads())
+#endif
+  for (int k=0; k<(1 << (qubit_num - qnum_in)); k++) {
+    base = k;
+    for (int j=0; j<qnum_in; j++) base = _insert_zero_bit(base, pos[j]);
+    for (int n=0; n<cnum; n++) {
+      int* cyc = &cycle[start[n]];
+      len = start[n+1] - start[n];
+      c = camp[base | offset[cyc[len-1]]];
+      for (int l=len-1; l>0; l--) camp[base | offset[cyc[l]]] = camp[base | offset[cyc[l-1]]];
+      camp[base | offset[cyc[0]]] = c;
+    }
+  }
+
+  free(offset); free(visited); free(cycle); free(start);
+  SUC_RETURN(true);
+}
+
+bool qstate_phase_oracle(QState* qstate, int qnum, int qid[MAX_QUBIT_NUM], int* mask)
+/*
+  phase oracle: |x> -> -|x> if mask[x] != 0 (x on the register qid, qid[0] = MSB)
+ */
+{
+  int		pos[MAX_QUBIT_NUM];	/* bit positions of qid */
+  int		used = 0;
+  int		ext[4][256];		/* register value of each byte of the state index */
+
+  if ((qstate == NULL) || (mask == NULL) || (qnum < 1) || (qnum > qstate->qubit_num))
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+  for (int j=0; j<qnum; j++) {
+    if ((qid[j] < 0) || (qid[j] >= qstate->qubit_num) || ((used >> qid[j]) & 1))
+      ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+    used |= (1 << qid[j]);
+    pos[j] = qstate->qubit_num - qid[j] - 1;
+  }
+  _bit_gather_table(ext, qnum, pos);
+
+#ifdef USE_OPENMP
+#pragma omp parallel for if (qstate->qubit_num >= MIN_QUBIT_NUM_PARALLEL) \
+  num_threads(qlazy_get_num_threads())
+#endif
+  for (int i=0; i<qstate->state_num; i++) {
+    if (mask[_bit_gather(ext, i)] != 0) qstate->camp[i] = -qstate->camp[i];
+  }
+
+  SUC_RETURN(true);
+}
+
+bool qstate_diffuse(QState* qstate, int qnum, int qid[MAX_QUBIT_NUM])
+/*
+  grover diffusion (inversion about the mean) on the register qid:
+  a_x -> 2 * mean - a_x, where the mean is taken over the register values x
+  for each value of the other qubits (= H^n (2|0><0| - I) H^n on the register)
+  - 1st pass: sum of the amplitudes for each outer index (reduction)
+  - 2nd pass: update of all amplitudes
+ */
+{
+  int		qubit_num;
+  int		dim;
+  int		outer_num;
+  int		pos[MAX_QUBIT_NUM];	/* bit positions of qid (ascending) */
+  int		opos[MAX_QUBIT_NUM];	/* bit positions of the other qubits (descending) */
+  int		onum = 0;
+  int		used = 0;
+  int		ext[4][256];		/* outer index of each byte of the state index */
+  int*		offset = NULL;		/* state index bits of each register value */
+  COMPLEX*	mean   = NULL;		/* mean of the register amplitudes for each outer index */
+  int		base;
+  COMPLEX	sum;
+
+  if ((qstate == NULL) || (qnum < 1) || (qnum > qstate->qubit_num))
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+  qubit_num = qstate->qubit_num;
+  for (int j=0; j<qnum; j++) {
+    if ((qid[j] < 0) || (qid[j] >= qubit_num) || ((used >> qid[j]) & 1))
+      ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+    used |= (1 << qid[j]);
+  }
+  for (int q=0; q<qubit_num; q++) {
+    if (((used >> q) & 1) == 0) opos[onum++] = qubit_num - q - 1;
+  }
+  dim = (1 << qnum);
+  outer_num = (1 << onum);
+
+  if (!(offset = (int*)malloc(sizeof(int) * dim)) ||
+      !(mean = (COMPLEX*)malloc(sizeof(COMPLEX) * outer_num))) {
+    free(offset);
+    ERR_RETURN(ERROR_CANT_ALLOC_MEMORY,false);
+  }
+  offset[0] = 0;
+  for (int j=qnum-1; j>=0; j--) {	/* from the least significant bit of the register */
+    int	b = (1 << (qnum - 1 - j));
+    for (int x=b; x<2*b; x++) offset[x] = offset[x-b] | (1 << (qubit_num - qid[j] - 1));
+  }
+  for (int j=0; j<qnum; j++) pos[j] = qubit_num - qid[j] - 1;
+  qsort(pos, qnum, sizeof(int), _cmp_int);
+  _bit_gather_table(ext, onum, opos);
+
+#ifdef USE_OPENMP
+#pragma omp parallel for private(base,sum) if (qubit_num >= MIN_QUBIT_NUM_PARALLEL) \
+  num_threads(qlazy_get_num_threads())
+#endif
+  for (int k=0; k<outer_num; k++) {
+    base = k;
+    for (int j=0; j<qnum; j++) base = _insert_zero_bit(base, pos[j]);
+    sum = 0.0;
+    for (int x=0; x<dim; x++) sum += qstate->camp[base | offset[x]];
+    mean[k] = sum / dim;
+  }
+
+#ifdef USE_OPENMP
+#pragma omp parallel for if (qubit_num >= MIN_QUBIT_NUM_PARALLEL) \
+  num_threads(qlazy_get_num_threads())
+#endif
+  for (int i=0; i<qstate->state_num; i++) {
+    qstate->camp[i] = 2.0 * mean[_bit_gather(ext, i)] - qstate->camp[i];
+  }
+
+  free(offset);
+  free(mean);
+  SUC_RETURN(true);
+}
+
+static bool _qstate_transform_basis(QState* qstate, double angle, double phase,
+				    int qubit_num, int qubit_id[MAX_QUBIT_NUM], bool inverse)
+{
+  /*
+     This function operate U+ (or U, if inverse) to the measured qubits
+     - |p> = U |0> = cos(theta/2) |0> + exp(i phi) sin(theta/2) |1>
+     - U = Rz(PI/2 + phi) H Rz(theta) H
+     - U+ = H Rz(-theta) H Rz(-PI/2 - phi) = Rx(-theta) Rz(-PI/2 - phi)
+     (the gates are fused into one 2x2 matrix and applied once for each qubit)
+   */
+  COMPLEX*	Rx = NULL;
+  COMPLEX*	Rz = NULL;
+  COMPLEX	U[4];
+  COMPLEX	V[4];
+  int		dim;
+
+  if (qstate == NULL) ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+  if (!(gbank_get_unitary(qstate->gbank, ROTATION_X, -angle, 0.0, 0.0, &dim, (void**)&Rx)))
+    ERR_RETURN(ERROR_GBANK_GET_UNITARY,false);
+  if (!(gbank_get_unitary(qstate->gbank, ROTATION_Z, -0.5 - phase, 0.0, 0.0, &dim, (void**)&Rz))) {
+    free(Rx); Rx = NULL;
+    ERR_RETURN(ERROR_GBANK_GET_UNITARY,false);
+  }
+
+  /* U+ = Rx Rz */
+  for (int i=0; i<2; i++) {
+    for (int j=0; j<2; j++) {
+      U[IDX2(i,j)] = Rx[IDX2(i,0)] * Rz[IDX2(0,j)] + Rx[IDX2(i,1)] * Rz[IDX2(1,j)];
+    }
+  }
+  free(Rx); Rx = NULL;
+  free(Rz); Rz = NULL;
+
+  /* U = (U+)+ */
+  if (inverse == true) {
+    for (int i=0; i<2; i++) {
+      for (int j=0; j<2; j++) {
+	V[IDX2(i,j)] = conj(U[IDX2(j,i)]);
+      }
+    }
+    memcpy(U, V, sizeof(COMPLEX)*4);
+  }
+
+  for (int i=0; i<qubit_num; i++) {
+    if (!(_qstate_operate_unitary2(qstate->camp, U, qstate->qubit_num, qubit_id[i])))
+      ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+  }
+
+  SUC_RETURN(true);
+}
+
+static int _qstate_mes_id(int state_id, int qubit_num, int shift[MAX_QUBIT_NUM])
+{
+  /* measured value of the qubits (shift[k]: bit position of k-th measured qubit) */
+  int mes_id = 0;
+
+  for (int k=0; k<qubit_num; k++) {
+    mes_id = (mes_id << 1) | ((state_id >> shift[k]) & 1);
+  }
+  return mes_id;
+}
+
+static bool _qstate_marginal_prob(QState* qstate, int qubit_num, int shift[MAX_QUBIT_NUM],
+				  double* prob)
+{
+  /*
+    probability of each measured value of the qubits (= marginal distribution)
+    - all qubits: the measured value is a permutation of the state id (no reduction)
+    - part of qubits: per-thread histograms if they are small compared with the
+      state vector (<= state_num / 8 in total), otherwise atomic accumulation
+   */
+  COMPLEX	c;
+  bool		whole	 = (qubit_num == qstate->qubit_num);
+  int		mes_num	 = (1 << qubit_num);
+  int		thr_num	 = 1;
+
+  if (whole) {  /* measured value = state id with permuted bits */
+#ifdef USE_OPENMP
+#pragma omp parallel for private(c) if (qstate->qubit_num >= MIN_QUBIT_NUM_PARALLEL) \
+  num_threads(qlazy_get_num_threads())
+#endif
+    for (int i=0; i<qstate->state_num; i++) {
+      c = qstate->camp[i];
+      prob[_qstate_mes_id(i, qubit_num, shift)] = creal(c) * creal(c) + cimag(c) * cimag(c);
+    }
+    SUC_RETURN(true);
+  }
+
+  for (int x=0; x<mes_num; x++) prob[x] = 0.0;
+
+#ifdef USE_OPENMP
+  if (qstate->qubit_num >= MIN_QUBIT_NUM_PARALLEL) thr_num = qlazy_get_num_threads();
+#endif
+  if (thr_num == 1) {
+    for (int i=0; i<qstate->state_num; i++) {
+      c = qstate->camp[i];
+      prob[_qstate_mes_id(i, qubit_num, shift)] += creal(c) * creal(c) + cimag(c) * cimag(c);
+    }
+    SUC_RETURN(true);
+  }
+
+#ifdef USE_OPENMP
+  if ((long)thr_num * mes_num > qstate->state_num / 8) {
+#pragma omp parallel for private(c) num_threads(thr_num)
+    for (int i=0; i<qstate->state_num; i++) {
+      c = qstate->camp[i];
+#pragma omp atomic
+      prob[_qstate_mes_id(i, qubit_num, shift)] += creal(c) * creal(c) + cimag(c) * cimag(c);
+    }
+    SUC_RETURN(true);
+  }
+
+  double* hist = NULL;	/* histogram of each thread */
+  if (!(hist = (double*)calloc(thr_num * mes_num, sizeof(double))))
+    ERR_RETURN(ERROR_CANT_ALLOC_MEMORY,false);
+
+#pragma omp parallel private(c) num_threads(thr_num)
+  {
+    double* h = hist + omp_get_thread_num() * mes_num;
+#pragma omp for
+    for (int i=0; i<qstate->state_num; i++) {
+      c = qstate->camp[i];
+      h[_qstate_mes_id(i, qubit_num, shift)] += creal(c) * creal(c) + cimag(c) * cimag(c);
+    }
+  }
+
+  /* merge the histograms */
+#pragma omp parallel for num_threads(thr_num)
+  for (int x=0; x<mes_num; x++) {
+    for (int t=0; t<thr_num; t++) prob[x] += hist[t * mes_num + x];
+  }
+  free(hist);
+#endif
+
+  SUC_RETURN(true);
+}
+
+static int _sample_from_cdf(double* cdf, double* prob, int num, double r)
+{
+  /* binary search of the first value 'x' which satisfies 'r < cdf[x]' */
+  int lo = 0;
+  int hi = num - 1;
+  int mid;
+
+  r = r * cdf[num-1];
+  while (lo < hi) {
+    mid = (lo + hi) / 2;
+    if (r < cdf[mid]) hi = mid;
+    else lo = mid + 1;
+  }
+  /* in the case of r = 1.0, skip values with zero probability */
+  while ((lo > 0) && (prob[lo] == 0.0)) lo--;
+
+  return lo;
+}
+
+static bool _qstate_collapse(QState* qstate, int qubit_num, int shift[MAX_QUBIT_NUM],
+			     int mes_id, double prob)
+{
+  /* projection to the measured value 'mes_id' and normalization */
+  double norm;
+
+  if (prob <= 0.0) ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+  norm = 1.0 / sqrt(prob);
+
+#ifdef USE_OPENMP
+#pragma omp parallel for if (qstate->qubit_num >= MIN_QUBIT_NUM_PARALLEL) \
+  num_threads(qlazy_get_num_threads())
+#endif
+  for (int i=0; i<qstate->state_num; i++) {
+    if (_qstate_mes_id(i, qubit_num, shift) == mes_id) qstate->camp[i] *= norm;
+    else qstate->camp[i] = 0.0;
+  }
+
+  SUC_RETURN(true);
+}
+
+static bool _qstate_measure_sampling(QState* qstate, int shot_num, int qubit_num,
+				     int qubit_id[MAX_QUBIT_NUM], MData* mdata)
+{
+  /*
+    sample all shots from the distribution calculated only once,
+    and change the state according to the last shot
+   */
+  int		mes_num = (1 << qubit_num);
+  int		mes_id	= 0;
+  int		shift[MAX_QUBIT_NUM];
+  double*	prob	= NULL;
+  double*	cdf	= NULL;
+
+  if (!(prob = (double*)calloc(mes_num, sizeof(double))))
+    ERR_RETURN(ERROR_CANT_ALLOC_MEMORY,false);
+  if (!(cdf = (double*)malloc(sizeof(double)*mes_num))) {
+    free(prob); prob = NULL;
+    ERR_RETURN(ERROR_CANT_ALLOC_MEMORY,false);
+  }
+
+  for (int k=0; k<qubit_num; k++) {
+    if ((qubit_id[k] < 0) || (qubit_id[k] >= qstate->qubit_num)) {
+      free(prob); free(cdf);
+      ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+    }
+    shift[k] = qstate->qubit_num - qubit_id[k] - 1;
+  }
+
+  /* cumulative distribution */
+  if (!(_qstate_marginal_prob(qstate, qubit_num, shift, prob))) {
+    free(prob); free(cdf);
+    ERR_RETURN(ERROR_CANT_ALLOC_MEMORY,false);
+  }
+  cdf[0] = prob[0];
+  for (int x=1; x<mes_num; x++) cdf[x] = cdf[x-1] + prob[x];
+
+  /* sampling */
+  for (int i=0; i<shot_num; i++) {
+    mes_id = _sample_from_cdf(cdf, prob, mes_num, randstate_double(&(qstate->rand)));
+    mdata->freq[mes_id]++;
+  }
+  mdata->last = mes_id;
+
+  /* wave function collapse by the last shot */
+  if (!(_qstate_collapse(qstate, qubit_num, shift, mes_id, prob[mes_id]))) {
+    free(prob); free(cdf);
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+  }
+
+  free(prob); prob = NULL;
+  free(cdf); cdf = NULL;
+
+  SUC_RETURN(true);
+}
+
+bool qstate_measure(QState* qstate, int shot_num, double angle, double phase,
+		    int qubit_num, int qubit_id[MAX_QUBIT_NUM], void** mdata_out)
+{
+  int		mes_num = (1<<qubit_num);
+  MData*	mdata	= NULL;
+
+  if ((qstate == NULL) ||
+      (shot_num < 1) || (qubit_num < 0) ||
+      (qubit_num > qstate->qubit_num))
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+  /* measure all bits, if no parameter set */
+  if (qubit_num == 0) {
+    qubit_num = qstate->qubit_num;
+    mes_num = (1<<qubit_num);
+    for (int i=0; i<qstate->qubit_num; i++) {
+      qubit_id[i] = i;
+    }
+  }
+
+  /* initialize mdata */
+  if (!(mdata_init(qubit_num, mes_num, shot_num, angle, phase, qubit_id,
+		   (void**)&mdata))) ERR_RETURN(ERROR_MDATA_INIT,false);
+
+  /* change basis, if measurement axis isn't Z */
+  if ((angle != 0.0) || (phase != 0.0)) {
+    if (!(_qstate_transform_basis(qstate, angle, phase, qubit_num, qubit_id, false))) {
+      mdata_free(mdata); mdata = NULL;
+      ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+    }
+  }
+
+  /* execute mesurement */
+  if (!(_qstate_measure_sampling(qstate, shot_num, qubit_num, qubit_id, mdata))) {
+    mdata_free(mdata); mdata = NULL;
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+  }
+
+  /* change basis (inverse), if measurement axis isn't Z */
+  if ((angle != 0.0) || (phase != 0.0)) {
+    if (!(_qstate_transform_basis(qstate, angle, phase, qubit_num, qubit_id, true))) {
+      mdata_free(mdata); mdata = NULL;
+      ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+    }
+  }
+
+  *mdata_out = mdata;
+  SUC_RETURN(true);
+}
+
+bool qstate_measure_bell(QState* qstate, int shot_num, int qubit_num,
+			 int qubit_id[MAX_QUBIT_NUM], void** mdata_out)
+{
+  MData*	mdata  = NULL;
+  
+  if ((qstate == NULL) || (shot_num < 1) || (qubit_num != 2))
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+  /* equivalent transform to bell-basis */
+  /* CX 0 1 */
+  if (!(qstate_operate_qgate(qstate, CONTROLLED_X, 0.0, 0.0, 0.0, qubit_id)))
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+  /* H 0 */
+  if (!(qstate_operate_qgate(qstate, HADAMARD, 0.0, 0.0, 0.0, qubit_id)))
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+  /* CX 0 1 */
+  if (!(qstate_operate_qgate(qstate, CONTROLLED_X, 0.0, 0.0, 0.0, qubit_id)))
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+  /* execute Bell-mesurement */
+  if (!(qstate_measure(qstate, shot_num, 0.0, 0.0, qubit_num, qubit_id, (void**)&mdata)))
+    ERR_RETURN(ERROR_QSTATE_MEASURE,false);
+
+  /* equivalent transform to bell-basis (inverse) */
+  /* CX 0 1 */
+  if (!(qstate_operate_qgate(qstate, CONTROLLED_X, 0.0, 0.0, 0.0, qubit_id)))
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+  /* H 0 */
+  if (!(qstate_operate_qgate(qstate, HADAMARD, 0.0, 0.0, 0.0, qubit_id)))
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+  /* CX 0 1 */
+  if (!(qstate_operate_qgate(qstate, CONTROLLED_X, 0.0, 0.0, 0.0, qubit_id)))
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+  *mdata_out = mdata;
+  SUC_RETURN(true);
+}
+
+static bool _qstate_operate_qgate(QState* qstate, Kind kind, double alpha, double beta,
+				  double gamma, int qubit_id[MAX_QUBIT_NUM], bool dagger)
+{
+  /* operate the gate (dagger = false) or its hermitian conjugate (dagger = true) */
+  int		q0  = qubit_id[0];
+  int		q1  = qubit_id[1];
+  int		dim = 0;
+  COMPLEX*	U   = NULL;
+  bool		ret = false;
+
+  if (qstate == NULL) ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+  switch (kind) {
+  case INIT:
+  case MEASURE:
+  case MEASURE_X:
+  case MEASURE_Y:
+  case MEASURE_Z:
+  case MEASURE_BELL:
+    SUC_RETURN(true);
+
+    /* permutation gates: swap amplitudes only (self-inverse) */
+  case PAULI_X:
+  case CONTROLLED_X:
+  case SWAP:
+    if (!(_qstate_operate_swap_bits(qstate->camp, qstate->qubit_num, q0, q1, kind)))
+      ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+    SUC_RETURN(true);
+
+  default:
+    break;
+  }
+
+  if (!(gbank_get_unitary(qstate->gbank, kind, alpha, beta, gamma, &dim, (void**)&U)))
+    ERR_RETURN(ERROR_GBANK_GET_UNITARY,false);
+
+  if (dagger == true) {
+    COMPLEX u;
+    for (int i=0; i<dim; i++) {
+      U[dim*i+i] = conj(U[dim*i+i]);
+      for (int j=i+1; j<dim; j++) {
+	u = U[dim*i+j];
+	U[dim*i+j] = conj(U[dim*j+i]);
+	U[dim*j+i] = conj(u);
+      }
+    }
+  }
+
+  switch (kind) {
+    /* diagonal gates: multiply phase factors only */
+  case PAULI_Z:
+  case PHASE_SHIFT_S:
+  case PHASE_SHIFT_S_:
+  case PHASE_SHIFT_T:
+  case PHASE_SHIFT_T_:
+  case PHASE_SHIFT:
+  case ROTATION_Z:
+  case ROTATION_U1:
+    ret = _qstate_operate_diagonal2(qstate->camp, U[IDX2(0,0)], U[IDX2(1,1)],
+				    qstate->qubit_num, q0);
+    break;
+  case CONTROLLED_Z:
+  case CONTROLLED_S:
+  case CONTROLLED_S_:
+  case CONTROLLED_T:
+  case CONTROLLED_T_:
+  case CONTROLLED_P:
+  case CONTROLLED_RZ:
+  case CONTROLLED_U1:
+    ret = _qstate_operate_ctr_diagonal4(qstate->camp, U[IDX4(2,2)], U[IDX4(3,3)],
+					qstate->qubit_num, q0, q1);
+    break;
+    /* general gates */
+  default:
+    ret = _qstate_operate_unitary(qstate, U, dim, q0, q1);
+    break;
+  }
+  free(U); U = NULL;
+
+  if (ret == false) ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+  SUC_RETURN(true);
+}
+
+bool qstate_operate_qgate(QState* qstate, Kind kind, double alpha, double beta,
+			  double gamma, int qubit_id[MAX_QUBIT_NUM])
+{
+  if (!(_qstate_operate_qgate(qstate, kind, alpha, beta, gamma, qubit_id, false)))
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+  SUC_RETURN(true);
+}
+
+static bool _qstate_operate_pauli_rotation(COMPLEX* camp, int qubit_num, int xmask,
+					   int zmask, int ynum, double theta)
+{
+  /*
+    exp(-i theta P) = cos(theta) I - i sin(theta) P,
+    where P|i> = i^ynum * (-1)^popcount(i & zmask) |i ^ xmask>
+   */
+  COMPLEX	phase[4] = { 1.0, 1.0i, -1.0, -1.0i };
+  COMPLEX	ph	 = phase[ynum % 4];
+  COMPLEX	cos_t	 = cos(theta);
+  COMPLEX	isin_t	 = 1.0i * sin(theta);
+  COMPLEX	ph_i, ph_j, c_i, c_j;
+  int		top, i, j;
+
+  if (camp == NULL) ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+  if (xmask == 0) {  /* diagonal */
+#ifdef USE_OPENMP
+#pragma omp parallel for private(ph_i) if (qubit_num >= MIN_QUBIT_NUM_PARALLEL) \
+  num_threads(qlazy_get_num_threads())
+#endif
+    for (int k=0; k<(1 << qubit_num); k++) {
+      ph_i = __builtin_parity(k & zmask) ? -ph : ph;
+      camp[k] *= (cos_t - isin_t * ph_i);
+    }
+    SUC_RETURN(true);
+  }
+
+  /* pairs {|i>,|i^xmask>}, where top bit of xmask is 0 for i */
+  top = 0;
+  while ((xmask >> (top + 1)) != 0) top++;
+
+#ifdef USE_OPENMP
+#pragma omp parallel for private(i,j,ph_i,ph_j,c_i,c_j) \
+  if (qubit_num >= MIN_QUBIT_NUM_PARALLEL) num_threads(qlazy_get_num_threads())
+#endif
+  for (int k=0; k<(1 << (qubit_num - 1)); k++) {
+    i = _insert_zero_bit(k, top);
+    j = i ^ xmask;
+    ph_i = __builtin_parity(i & zmask) ? -ph : ph;
+    ph_j = __builtin_parity(j & zmask) ? -ph : ph;
+    c_i = camp[i];
+    c_j = camp[j];
+    camp[i] = cos_t * c_i - isin_t * ph_j * c_j;
+    camp[j] = cos_t * c_j - isin_t * ph_i * c_i;
+  }
+
+  SUC_RETURN(true);
+}
+
+static bool _qstate_evolve_spro(QState* qstate, SPro* spro, double time)
+{
+  /* exp(i PI coef t P) (time unit = PI) in one pass over the state */
+  int xmask, zmask, ynum;
+
+  if ((qstate == NULL) || (spro == NULL))
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+  if (!(spro_get_mask(spro, qstate->qubit_num, &xmask, &zmask, &ynum)))
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+  if (!(_qstate_operate_pauli_rotation(qstate->camp, qstate->qubit_num, xmask, zmask,
+				       ynum, -M_PI * spro->coef * time)))
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+  SUC_RETURN(true);
+}
+
+static bool _qstate_evolve_step2(QState* qstate, Observable* observ, double t)
+{
+  /* 2nd-order symmetric step: S2(t) = e^{A1 t/2}..e^{AM-1 t/2} e^{AM t} e^{AM-1 t/2}..e^{A1 t/2} */
+  int num = observ->array_num;
+
+  for (int j=0; j<num-1; j++) {
+    if (!(_qstate_evolve_spro(qstate, observ->spro_array[j], t/2.0)))
+      ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+  }
+  if (!(_qstate_evolve_spro(qstate, observ->spro_array[num-1], t)))
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+  for (int j=num-2; j>=0; j--) {
+    if (!(_qstate_evolve_spro(qstate, observ->spro_array[j], t/2.0)))
+      ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+  }
+
+  SUC_RETURN(true);
+}
+
+static bool _qstate_evolve_step(QState* qstate, Observable* observ, double t, int order)
+{
+  /*
+    one step of Trotter-Suzuki decomposition
+    - order 1: S1(t) = e^{A1 t}..e^{AM t}
+    - order 2: S2(t) (symmetric)
+    - order 4: S4(t) = S2(p t)^2 S2((1-4p) t) S2(p t)^2, p = 1/(4-4^{1/3}) (Suzuki)
+   */
+  double p = 1.0 / (4.0 - pow(4.0, 1.0/3.0));
+  double coef[5] = { p, p, 1.0 - 4.0 * p, p, p };
+
+  switch (order) {
+  case 1:
+    for (int j=0; j<observ->array_num; j++) {
+      if (!(_qstate_evolve_spro(qstate, observ->spro_array[j], t)))
+	ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+    }
+    break;
+  case 2:
+    if (!(_qstate_evolve_step2(qstate, observ, t)))
+      ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+    break;
+  case 4:
+    for (int k=0; k<5; k++) {
+      if (!(_qstate_evolve_step2(qstate, observ, coef[k] * t)))
+	ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+    }
+    break;
+  default:
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+  }
+
+  SUC_RETURN(true);
+}
+
+bool qstate_evolve(QState* qstate, Observable* observ, double time, int iter, int order)
+{
+  double t = time / iter;
+  
+  if ((qstate == NULL) || (observ == NULL) || (iter < 1) ||
+      ((order != 1) && (order != 2) && (order != 4)))
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+  if (observ->array_num < 1) SUC_RETURN(true);
+
+  for (int i=0; i<iter; i++) {
+    if (!(_qstate_evolve_step(qstate, observ, t, order)))
+      ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+  }
+
+  SUC_RETURN(true);
+}
+
+bool qstate_evolve_tolerance(QState* qstate, Observable* observ, double time, int order,
+			     double tol, int* iter_inout)
+{
+  /*
+    choose the iteration number automatically, doubling it until the
+    estimated error is less than 'tol'.
+    - error of the result with 2N steps is estimated by the richardson formula,
+      err(2N) = |psi(N) - psi(2N)| / (2^order - 1)
+    - 'iter_inout' is the initial iteration number (input) and
+      the chosen iteration number (output)
+   */
+  QState*	qstate_pre = NULL;
+  QState*	qstate_now = NULL;
+  int		iter	   = *iter_inout;
+  double	real, imag, err;
+
+  if ((qstate == NULL) || (observ == NULL) || (tol <= 0.0))
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+  if (iter < 1) iter = 1;
+
+  if (!(qstate_copy(qstate, (void**)&qstate_pre)))
+    ERR_RETURN(ERROR_QSTATE_COPY,false);
+  if (!(qstate_evolve(qstate_pre, observ, time, iter, order))) {
+    qstate_free(qstate_pre); qstate_pre = NULL;
+    ERR_RETURN(ERROR_QSTATE_EVOLVE,false);
+  }
+
+  while (1) {
+    iter *= 2;
+    if (iter > MAX_EVOLVE_ITER) {
+      qstate_free(qstate_pre); qstate_pre = NULL;
+      ERR_RETURN(ERROR_QSTATE_EVOLVE,false);
+    }
+    if (!(qstate_copy(qstate, (void**)&qstate_now)) ||
+	!(qstate_evolve(qstate_now, observ, time, iter, order)) ||
+	!(qstate_inner_product(qstate_pre, qstate_now, &real, &imag))) {
+      qstate_free(qstate_pre); qstate_pre = NULL;
+      qstate_free(qstate_now); qstate_now = NULL;
+      ERR_RETURN(ERROR_QSTATE_EVOLVE,false);
+    }
+    /* |psi(N) - psi(2N)| = sqrt(2 - 2 Re<psi(N)|psi(2N)>) */
+    err = sqrt(MAX(0.0, 2.0 - 2.0 * real)) / ((1 << order) - 1);
+    qstate_free(qstate_pre);
+    qstate_pre = qstate_now;
+    qstate_now = NULL;
+    if (err < tol) break;
+  }
+
+  memcpy(qstate->camp, qstate_pre->camp, sizeof(COMPLEX)*qstate->state_num);
+  qstate_free(qstate_pre); qstate_pre = NULL;
+
+  *iter_inout = iter;
+
   SUC_RETURN(true);
 }
 
-static bool _qstate_mul(QState* qstate, double mul)
+static void _krylov_free(COMPLEX** q, int num)
 {
-  if (qstate == NULL) ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+  for (int k=0; k<num; k++) {
+    if (q[k] != NULL) {
+      free(q[k]); q[k] = NULL;
+    }
+  }
+}
 
-  for (int i=0; i<qstate->state_num; i++) {
-    qstate->camp[i] = mul * qstate->camp[i];
+static bool _krylov_expand(Observable* observ, int qubit_num, COMPLEX** q, int j,
+			   double* alpha, double* beta)
+{
+  /*
+    one lanczos step: q[j+1] beta[j] = H q[j] - alpha[j] q[j] - beta[j-1] q[j-1],
+    q[j+1] is orthogonalized against all q[0..j] again (full reorthogonalization)
+   */
+  int		state_num = 1 << qubit_num;
+  COMPLEX*	w	  = NULL;
+  double	ovl_real, ovl_imag, norm;
+  COMPLEX	ovl;
+
+  if (!(w = (COMPLEX*)malloc(sizeof(COMPLEX)*state_num)))
+    ERR_RETURN(ERROR_CANT_ALLOC_MEMORY,false);
+  q[j+1] = w;
+
+  if (!(observable_apply(observ, qubit_num, q[j], w)))
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+  for (int k=j; k>=0; k--) {
+    ovl_real = 0.0;
+    ovl_imag = 0.0;
+#ifdef USE_OPENMP
+#pragma omp parallel for private(ovl) reduction(+:ovl_real,ovl_imag) \
+  if (qubit_num >= MIN_QUBIT_NUM_PARALLEL) num_threads(qlazy_get_num_threads())
+#endif
+    for (int i=0; i<state_num; i++) {
+      ovl = conj(q[k][i]) * w[i];
+      ovl_real += creal(ovl);
+      ovl_imag += cimag(ovl);
+    }
+    if (k == j) alpha[j] = ovl_real;
+    ovl = ovl_real + 1.0i * ovl_imag;
+    for (int i=0; i<state_num; i++) w[i] -= ovl * q[k][i];
+  }
+
+  norm = 0.0;
+#ifdef USE_OPENMP
+#pragma omp parallel for reduction(+:norm) \
+  if (qubit_num >= MIN_QUBIT_NUM_PARALLEL) num_threads(qlazy_get_num_threads())
+#endif
+  for (int i=0; i<state_num; i++) norm += creal(conj(w[i]) * w[i]);
+  beta[j] = sqrt(norm);
+
+  if (beta[j] > MIN_DOUBLE * MIN_DOUBLE) {
+    for (int i=0; i<state_num; i++) w[i] /= beta[j];
   }
 
   SUC_RETURN(true);
 }
 
-static QState* _qstate_apply_spro(QState* qstate, SPro* spro)
+static bool _krylov_exp(int m, double* alpha, double* beta, double time, COMPLEX* y)
 {
-  QState*	qstate_ob = NULL;
-  int		qubit_id[MAX_QUBIT_NUM];
+  /* y = exp(i PI t T) e1, T = tridiagonal matrix of alpha[0..m-1], beta[0..m-2] */
+  double	eval[m];
+  double	evec[m*m];
 
-  if ((qstate == NULL) || (spro == NULL))
+  if (!(tridiag_eigen(m, alpha, beta, eval, evec)))
     ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
 
-  if (!(qstate_copy(qstate, (void**)&qstate_ob)))
-    ERR_RETURN(ERROR_QSTATE_COPY,NULL);
+  for (int k=0; k<m; k++) {
+    y[k] = 0.0;
+    for (int i=0; i<m; i++)
+      y[k] += evec[k*m+i] * cexp(1.0i * M_PI * time * eval[i]) * evec[i];
+  }
 
-  for (int i=0; i<spro->spin_num; i++) {
-    qubit_id[0] = i;
-    if (spro->spin_type[i] == NONE) {
-      ;
-    }
-    else if (spro->spin_type[i] == SIGMA_X) {
-      if (!(qstate_operate_qgate(qstate_ob, PAULI_X, 0.0, 0.0, 0.0, qubit_id))) {
-	qstate_free(qstate_ob); qstate_ob = NULL;
-	ERR_RETURN(ERROR_INVALID_ARGUMENT,NULL);
+  SUC_RETURN(true);
+}
+
+bool qstate_evolve_krylov(QState* qstate, Observable* observ, double time, double tol)
+{
+  /*
+    exp(i PI t H)|psi> by the lanczos method (time unit = PI, same as qstate_evolve)
+    - H is applied matrix-free (observable_apply)
+    - the krylov dimension m is increased until the estimated error of the step,
+      beta[m-1] * |[exp(i PI dt T) e1]_m|, is less than tol * dt / time
+    - if it is not reached with MAX_KRYLOV_DIM, the time step dt is halved
+   */
+  COMPLEX*	q[MAX_KRYLOV_DIM+1];
+  double	alpha[MAX_KRYLOV_DIM];
+  double	beta[MAX_KRYLOV_DIM];
+  COMPLEX	y[MAX_KRYLOV_DIM];
+  double	rest = time;
+  double	dt   = time;
+  double	norm = 0.0;
+  double	err;
+  int		m;
+
+  if ((qstate == NULL) || (observ == NULL) || (tol <= 0.0))
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+  for (int k=0; k<=MAX_KRYLOV_DIM; k++) q[k] = NULL;
+
+  for (int i=0; i<qstate->state_num; i++) norm += creal(conj(qstate->camp[i]) * qstate->camp[i]);
+  norm = sqrt(norm);
+  if (norm < MIN_DOUBLE) ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+  while (fabs(rest) > 0.0) {
+    if (fabs(dt) > fabs(rest)) dt = rest;
+
+    if (!(q[0] = (COMPLEX*)malloc(sizeof(COMPLEX)*qstate->state_num)))
+      ERR_RETURN(ERROR_CANT_ALLOC_MEMORY,false);
+    for (int i=0; i<qstate->state_num; i++) q[0][i] = qstate->camp[i] / norm;
+
+    /* expand krylov subspace adaptively */
+    m = 0;
+    err = 0.0;
+    while (m < MIN(MAX_KRYLOV_DIM, qstate->state_num)) {
+      if (!(_krylov_expand(observ, qstate->qubit_num, q, m, alpha, beta))) {
+	_krylov_free(q, m + 2);
+	ERR_RETURN(ERROR_QSTATE_EVOLVE,false);
       }
-    }
-    else if (spro->spin_type[i] == SIGMA_Y) {
-      if (!(qstate_operate_qgate(qstate_ob, PAULI_Y, 0.0, 0.0, 0.0, qubit_id))) {
-	qstate_free(qstate_ob); qstate_ob = NULL;
-	ERR_RETURN(ERROR_INVALID_ARGUMENT,NULL);
+      m++;
+      if (!(_krylov_exp(m, alpha, beta, dt, y))) {
+	_krylov_free(q, m + 1);
+	ERR_RETURN(ERROR_QSTATE_EVOLVE,false);
       }
+      if (beta[m-1] <= MIN_DOUBLE * MIN_DOUBLE) { err = 0.0; break; } /* invariant subspace */
+      err = beta[m-1] * cabs(y[m-1]);
+      if (err < tol * fabs(dt / time)) break;
     }
-    else if (spro->spin_type[i] == SIGMA_Z) {
-      if (!(qstate_operate_qgate(qstate_ob, PAULI_Z, 0.0, 0.0, 0.0, qubit_id))) {
-	qstate_free(qstate_ob); qstate_ob = NULL;
-	ERR_RETURN(ERROR_INVALID_ARGUMENT,NULL);
+
+    /* shorten the time step if not converged */
+    while (err >= tol * fabs(dt / time)) {
+      dt /= 2.0;
+      if (fabs(dt) < fabs(time) / MAX_EVOLVE_ITER) {
+	_krylov_free(q, m + 1);
+	ERR_RETURN(ERROR_QSTATE_EVOLVE,false);
       }
+      if (!(_krylov_exp(m, alpha, beta, dt, y))) {
+	_krylov_free(q, m + 1);
+	ERR_RETURN(ERROR_QSTATE_EVOLVE,false);
+      }
+      err = beta[m-1] * cabs(y[m-1]);
     }
-    else {
-      qstate_free(qstate_ob); qstate_ob = NULL;
-      ERR_RETURN(ERROR_INVALID_ARGUMENT,NULL);
+
+    for (int i=0; i<qstate->state_num; i++) {
+      qstate->camp[i] = 0.0;
+      for (int k=0; k<m; k++) qstate->camp[i] += norm * y[k] * q[k][i];
     }
-  }
+    _krylov_free(q, m + 1);
 
-  if (!(_qstate_mul(qstate_ob, spro->coef))) {
-    qstate_free(qstate_ob); qstate_ob = NULL;
-    ERR_RETURN(ERROR_INVALID_ARGUMENT,NULL);
+    rest -= dt;
   }
-  
-  SUC_RETURN(qstate_ob);
+
+  SUC_RETURN(true);
 }
 
-static QState* _qstate_apply_observable(QState* qstate, Observable* observ)
+bool qstate_ground_state(QState* qstate, Observable* observ, double tol, double* energy)
 {
-  QState* qstate_ob = NULL;
-  QState* qstate_tmp = NULL;
+  /*
+    ground state (lowest eigenvector) of H by the restarted lanczos method
+    - qstate is set to a random vector and replaced by the ground state
+    - converged if the residual |H psi - E psi| = beta[m-1] * |s[m-1]| is less than tol,
+      where s is the lowest eigenvector of the tridiagonal matrix T
+   */
+  COMPLEX*	q[MAX_KRYLOV_DIM+1];
+  double	alpha[MAX_KRYLOV_DIM];
+  double	beta[MAX_KRYLOV_DIM];
+  double	eval[MAX_KRYLOV_DIM];
+  double	evec[MAX_KRYLOV_DIM*MAX_KRYLOV_DIM];
+  double	res  = 0.0;
+  int		low  = 0;
+  int		m;
+
+  if ((qstate == NULL) || (observ == NULL) || (tol <= 0.0))
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
 
-  if (qstate == NULL) ERR_RETURN(ERROR_INVALID_ARGUMENT,NULL);
-  
-  for (int i=0; i<observ->array_num; i++) {
-    if (!(qstate_tmp = _qstate_apply_spro(qstate, observ->spro_array[i])))
-      ERR_RETURN(ERROR_INVALID_ARGUMENT,NULL);
-    if (qstate_ob == NULL) {
-      if (!(qstate_init(qstate_tmp->qubit_num, (void**)&qstate_ob)))
-	ERR_RETURN(ERROR_QSTATE_INIT,NULL);
-      _qstate_set_none(qstate_ob);
+  for (int k=0; k<=MAX_KRYLOV_DIM; k++) q[k] = NULL;
+
+  /* random initial vector (not orthogonal to the ground state almost surely) */
+  for (int i=0; i<qstate->state_num; i++)
+    qstate->camp[i] = (randstate_double(&(qstate->rand)) - 0.5) +
+      1.0i * (randstate_double(&(qstate->rand)) - 0.5);
+  if (!(_qstate_normalize(qstate))) ERR_RETURN(ERROR_QSTATE_GROUND_STATE,false);
+
+  for (int r=0; r<MAX_KRYLOV_RESTART; r++) {
+    if (!(q[0] = (COMPLEX*)malloc(sizeof(COMPLEX)*qstate->state_num)))
+      ERR_RETURN(ERROR_CANT_ALLOC_MEMORY,false);
+    memcpy(q[0], qstate->camp, sizeof(COMPLEX)*qstate->state_num);
+
+    m = 0;
+    while (m < MIN(MAX_KRYLOV_DIM, qstate->state_num)) {
+      if (!(_krylov_expand(observ, qstate->qubit_num, q, m, alpha, beta))) {
+	_krylov_free(q, m + 2);
+	ERR_RETURN(ERROR_QSTATE_GROUND_STATE,false);
+      }
+      m++;
+      if (!(tridiag_eigen(m, alpha, beta, eval, evec))) {
+	_krylov_free(q, m + 1);
+	ERR_RETURN(ERROR_QSTATE_GROUND_STATE,false);
+      }
+      low = 0;
+      for (int i=1; i<m; i++) if (eval[i] < eval[low]) low = i;
+      res = beta[m-1] * fabs(evec[(m-1)*m+low]);
+      if ((res < tol) || (beta[m-1] <= MIN_DOUBLE * MIN_DOUBLE)) break;
     }
-    if (!(_qstate_add(qstate_ob, qstate_tmp)))
-      ERR_RETURN(ERROR_INVALID_ARGUMENT,NULL);
 
-    qstate_free(qstate_tmp);
-    qstate_tmp = NULL;
+    for (int i=0; i<qstate->state_num; i++) {
+      qstate->camp[i] = 0.0;
+      for (int k=0; k<m; k++) qstate->camp[i] += evec[k*m+low] * q[k][i];
+    }
+    _krylov_free(q, m + 1);
+    if (!(_qstate_normalize(qstate))) ERR_RETURN(ERROR_QSTATE_GROUND_STATE,false);
+
+    if ((res < tol) || (beta[m-1] <= MIN_DOUBLE * MIN_DOUBLE)) {
+      *energy = eval[low];
+      SUC_RETURN(true);
+    }
   }
 
-  SUC_RETURN(qstate_ob);
+  ERR_RETURN(ERROR_QSTATE_GROUND_STATE,false);
 }
 
 bool qstate_inner_product(QState* qstate_0, QState* qstate_1,
 			  double* real, double* imag)
 {
-  COMPLEX out = 0.0 + 0.0i;
+  COMPLEX	out;
+  double	out_real = 0.0;
+  double	out_imag = 0.0;
 
   if ((qstate_0 == NULL) || (qstate_1 == NULL) ||
       (qstate_0->qubit_num != qstate_1->qubit_num) ||
       (qstate_0->state_num != qstate_1->state_num))
     ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
   
+#ifdef USE_OPENMP
+#pragma omp parallel for private(out) reduction(+:out_real,out_imag) \
+  if (qstate_0->qubit_num >= MIN_QUBIT_NUM_PARALLEL) num_threads(qlazy_get_num_threads())
+#endif
   for (int i=0; i<qstate_0->state_num; i++) {
-    out = out + conj(qstate_0->camp[i]) * qstate_1->camp[i];
+    out = conj(qstate_0->camp[i]) * qstate_1->camp[i];
+    out_real += creal(out);
+    out_imag += cimag(out);
   }
-  *real = creal(out);
-  *imag = cimag(out);
+  *real = out_real;
+  *imag = out_imag;
 
   SUC_RETURN(true);
 }
@@ -1106,6 +1993,7 @@ bool qstate_tensor_product(QState* qstate_0, QState* qstate_1, void** qstate_out
   qubit_num = qstate_0->qubit_num + qstate_1->qubit_num;
   if (!(qstate_init(qubit_num, (void**)&qstate)))
     ERR_RETURN(ERROR_QSTATE_INIT,false);
+  randstate_split(&(qstate_0->rand), &(qstate->rand));
 
   int cnt = 0;
   for (int i=0; i<qstate_0->state_num; i++) {
@@ -1119,33 +2007,579 @@ bool qstate_tensor_product(QState* qstate_0, QState* qstate_1, void** qstate_out
   SUC_RETURN(true);
 }
 
+static bool _qstate_expect_spro(QState* qstate, SPro* spro, COMPLEX* value)
+{
+  /*
+    <psi|P|psi> = sum_i conj(c[i^xmask]) * i^ynum * (-1)^popcount(i & zmask) * c[i]
+    (read-only pass, no allocation)
+   */
+  COMPLEX	phase[4] = { 1.0, 1.0i, -1.0, -1.0i };
+  COMPLEX	out;
+  double	out_real = 0.0;
+  double	out_imag = 0.0;
+  int		xmask, zmask, ynum;
+
+  if ((qstate == NULL) || (spro == NULL))
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+  if (!(spro_get_mask(spro, qstate->qubit_num, &xmask, &zmask, &ynum)))
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+#ifdef USE_OPENMP
+#pragma omp parallel for private(out) reduction(+:out_real,out_imag) \
+  if (qstate->qubit_num >= MIN_QUBIT_NUM_PARALLEL) num_threads(qlazy_get_num_threads())
+#endif
+  for (int i=0; i<qstate->state_num; i++) {
+    out = conj(qstate->camp[i ^ xmask]) * qstate->camp[i];
+    if (__builtin_parity(i & zmask)) out = -out;
+    out_real += creal(out);
+    out_imag += cimag(out);
+  }
+
+  *value = phase[ynum % 4] * (out_real + 1.0i * out_imag);
+
+  SUC_RETURN(true);
+}
+
 bool qstate_expect_value(QState* qstate, Observable* observ, double* value)
 {
-  QState*	qstate_ob = NULL;
-  double	real	  = 0.0;
-  double	imag	  = 0.0;
+  COMPLEX	out = 0.0 + 0.0i;
+  COMPLEX	val;
 
   if ((qstate == NULL) || (observ == NULL))
     ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
   
-  if (!(qstate_ob = _qstate_apply_observable(qstate, observ)))
-    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
-      
-  if (!(qstate_inner_product(qstate, qstate_ob, &real, &imag)))
-    ERR_RETURN(ERROR_QSTATE_INNER_PRODUCT,false);
+  for (int i=0; i<observ->array_num; i++) {
+    if (!(_qstate_expect_spro(qstate, observ->spro_array[i], &val)))
+      ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+    out += observ->spro_array[i]->coef * val;
+  }
   
-  if (fabs(imag) > MIN_DOUBLE) ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+  if (fabs(cimag(out)) > MIN_DOUBLE) ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+  *value = creal(out);
+
+  SUC_RETURN(true);
+}
+
+static int _qgate_para_num(Kind kind)
+{
+  switch (kind) {
+  case ROTATION_X:
+  case ROTATION_Y:
+  case ROTATION_Z:
+  case PHASE_SHIFT:
+  case ROTATION_U1:
+  case CONTROLLED_RX:
+  case CONTROLLED_RY:
+  case CONTROLLED_RZ:
+  case CONTROLLED_P:
+  case CONTROLLED_U1:
+    return 1;
+  case ROTATION_U2:
+  case CONTROLLED_U2:
+    return 2;
+  case ROTATION_U3:
+  case CONTROLLED_U3:
+    return 3;
+  default:
+    return 0;
+  }
+}
+
+static bool _qstate_expect_gradient_backward(QState* psi, QState* lambda, QState* mu,
+					     int gate_num, QGate* qgate, int grad_num,
+					     double* grad)
+{
+  /*
+    for i = N..1 : psi <- U_i^dagger psi,
+                   grad_i = 2 Re <lambda| dU_i |psi>,
+                   lambda <- U_i^dagger lambda
+   */
+  QGate*	g  = NULL;
+  COMPLEX*	dU = NULL;
+  double	real, imag;
+  int		dim;
+  int		n = grad_num;	/* index of the first parameter of the gate */
+  bool		ret;
+
+  for (int i=gate_num-1; i>=0; i--) {
+    g = &(qgate[i]);
+    n -= _qgate_para_num(g->kind);
+
+    if (!(_qstate_operate_qgate(psi, g->kind, g->para.phase.alpha, g->para.phase.beta,
+				g->para.phase.gamma, g->qubit_id, true)))
+      ERR_RETURN(ERROR_QSTATE_OPERATE_QGATE,false);
+
+    for (int k=0; k<_qgate_para_num(g->kind); k++) {
+      memcpy(mu->camp, psi->camp, sizeof(COMPLEX)*psi->state_num);
+      if (!(gbank_get_unitary_deriv(psi->gbank, g->kind, g->para.phase.alpha,
+				    g->para.phase.beta, g->para.phase.gamma, k, &dim,
+				    (void**)&dU)))
+	ERR_RETURN(ERROR_GBANK_GET_UNITARY,false);
+      ret = _qstate_operate_unitary(mu, dU, dim, g->qubit_id[0], g->qubit_id[1]);
+      free(dU); dU = NULL;
+      if (ret == false) ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+      if (!(qstate_inner_product(lambda, mu, &real, &imag)))
+	ERR_RETURN(ERROR_QSTATE_INNER_PRODUCT,false);
+      grad[n+k] = 2.0 * real;
+    }
+
+    if (!(_qstate_operate_qgate(lambda, g->kind, g->para.phase.alpha, g->para.phase.beta,
+				g->para.phase.gamma, g->qubit_id, true)))
+      ERR_RETURN(ERROR_QSTATE_OPERATE_QGATE,false);
+  }
+
+  SUC_RETURN(true);
+}
+
+bool qstate_expect_gradient(QState* qstate, Observable* observ, int gate_num, QGate* qgate,
+			    double* value, double* grad, int* grad_num)
+/*
+  expectation value <psi|H|psi> and its gradient with respect to the gate parameters
+  by the adjoint method, where |psi> = U_N..U_1 |qstate>
+  - qstate: initial state (input) and |psi> (output)
+  - grad: derivatives with respect to the parameters (phase,phase1,phase2) of the
+    parametric gates in the gate order (unit = PI), grad_num values in total
+    (grad must have room for 3*gate_num values)
+  - cost: N gates forward, 2N gates and one derivative per parameter backward
+ */
+{
+  QState*	psi	= NULL;
+  QState*	lambda	= NULL;
+  QState*	mu	= NULL;
+  QGate*	g	= NULL;
+  bool		ret	= false;
+
+  if ((qstate == NULL) || (observ == NULL) || (gate_num < 0) ||
+      ((gate_num > 0) && (qgate == NULL)) || (value == NULL) || (grad == NULL) ||
+      (grad_num == NULL))
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+  /* forward */
+  *grad_num = 0;
+  for (int i=0; i<gate_num; i++) {
+    g = &(qgate[i]);
+    *grad_num += _qgate_para_num(g->kind);
+    if (!(qstate_operate_qgate(qstate, g->kind, g->para.phase.alpha, g->para.phase.beta,
+			       g->para.phase.gamma, g->qubit_id)))
+      ERR_RETURN(ERROR_QSTATE_OPERATE_QGATE,false);
+  }
+
+  if (!(qstate_expect_value(qstate, observ, value)))
+    ERR_RETURN(ERROR_QSTATE_EXPECT_VALUE,false);
+
+  /* backward, lambda = H |psi> */
+  if (qstate_copy(qstate, (void**)&psi) &&
+      qstate_copy(qstate, (void**)&lambda) &&
+      qstate_copy(qstate, (void**)&mu) &&
+      observable_apply(observ, qstate->qubit_num, qstate->camp, lambda->camp))
+    ret = _qstate_expect_gradient_backward(psi, lambda, mu, gate_num, qgate, *grad_num,
+					   grad);
+
+  qstate_free(psi); psi = NULL;
+  qstate_free(lambda); lambda = NULL;
+  qstate_free(mu); mu = NULL;
+
+  if (ret == false) ERR_RETURN(ERROR_QSTATE_EXPECT_GRADIENT,false);
+
+  SUC_RETURN(true);
+}
 
-  qstate_free(qstate_ob);
-  qstate_ob = NULL;
+bool qstate_operate_qgate_batch(QState* qstate, int gate_num, QGate* qgate)
+/*
+  operate the gate sequence qgate[0..gate_num-1] in order
+  - all gates are checked before operating, so the state is not changed on error
+ */
+{
+  QGate*	g = NULL;
+
+  if ((qstate == NULL) || (gate_num < 0) || ((gate_num > 0) && (qgate == NULL)))
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+  for (int i=0; i<gate_num; i++) {
+    if (!(qgate_check_unitary(&(qgate[i]), qstate->qubit_num)) || (qgate[i].ctrl >= 0))
+      ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+  }
+
+  for (int i=0; i<gate_num; i++) {
+    g = &(qgate[i]);
+    if (!(_qstate_operate_qgate(qstate, g->kind, g->para.phase.alpha, g->para.phase.beta,
+				g->para.phase.gamma, g->qubit_id, false)))
+      ERR_RETURN(ERROR_QSTATE_OPERATE_QGATE,false);
+  }
+
+  SUC_RETURN(true);
+}
+
+static void _fused_block_expand(COMPLEX* B, int* bnum, int bq[2], int q)
+{
+  /* add qubit q to the block as the lower bit: B <- B (x) I */
+  COMPLEX	B2[4];
+
+  if (*bnum == 0) {
+    B[IDX2(0,0)] = 1.0; B[IDX2(0,1)] = 0.0;
+    B[IDX2(1,0)] = 0.0; B[IDX2(1,1)] = 1.0;
+    bq[0] = q;
+    *bnum = 1;
+    return;
+  }
+
+  memcpy(B2, B, sizeof(COMPLEX)*4);
+  for (int i=0; i<4; i++) {
+    for (int j=0; j<4; j++) {
+      B[IDX4(i,j)] = ((i & 1) == (j & 1)) ? B2[IDX2((i>>1),(j>>1))] : 0.0;
+    }
+  }
+  bq[1] = q;
+  *bnum = 2;
+}
+
+static void _fused_block_multiply(COMPLEX* B, int bnum, int bq[2], COMPLEX* U, QGate* g)
+{
+  /* B <- V * B, where V is the gate matrix U embedded in the block */
+  int		dim = 1 << bnum;
+  COMPLEX	V[16];
+  COMPLEX	B2[16];
+  int		ii, jj;
+
+  if (bnum == 1) {
+    memcpy(V, U, sizeof(COMPLEX)*4);
+  }
+  else {
+    for (int i=0; i<4; i++) {
+      for (int j=0; j<4; j++) {
+	if (g->terminal_num == 1 && g->qubit_id[0] == bq[0])
+	  V[IDX4(i,j)] = ((i & 1) == (j & 1)) ? U[IDX2((i>>1),(j>>1))] : 0.0;
+	else if (g->terminal_num == 1)
+	  V[IDX4(i,j)] = ((i >> 1) == (j >> 1)) ? U[IDX2((i&1),(j&1))] : 0.0;
+	else if (g->qubit_id[0] == bq[0])
+	  V[IDX4(i,j)] = U[IDX4(i,j)];
+	else {
+	  ii = ((i & 1) << 1) | (i >> 1);
+	  jj = ((j & 1) << 1) | (j >> 1);
+	  V[IDX4(i,j)] = U[IDX4(ii,jj)];
+	}
+      }
+    }
+  }
+
+  memcpy(B2, B, sizeof(COMPLEX)*dim*dim);
+  for (int i=0; i<dim; i++) {
+    for (int j=0; j<dim; j++) {
+      B[i*dim+j] = 0.0;
+      for (int k=0; k<dim; k++) B[i*dim+j] += V[i*dim+k] * B2[k*dim+j];
+    }
+  }
+}
+
+static bool _qstate_operate_fused_block(QState* qstate, COMPLEX* B, int bnum, int bq[2],
+					int gnum, QGate* g)
+{
+  /* a block of one gate is operated as it is (specialized kernels) */
+  if (gnum == 0) SUC_RETURN(true);
+  if (gnum == 1) {
+    if (!(_qstate_operate_qgate(qstate, g->kind, g->para.phase.alpha, g->para.phase.beta,
+				g->para.phase.gamma, g->qubit_id, false)))
+      ERR_RETURN(ERROR_QSTATE_OPERATE_QGATE,false);
+    SUC_RETURN(true);
+  }
+  if (!(_qstate_operate_unitary(qstate, B, 1 << bnum, bq[0], bq[1])))
+    ERR_RETURN(ERROR_QSTATE_OPERATE_QGATE,false);
+  SUC_RETURN(true);
+}
+
+bool qstate_operate_qgate_fused(QState* qstate, int gate_num, QGate* qgate)
+/*
+  operate the gate sequence qgate[0..gate_num-1] with gate fusion
+  - consecutive gates acting within the same (at most) 2 qubits are multiplied
+    into one 2x2 or 4x4 matrix, and the state vector is swept once per block
+  - all gates are checked before operating, so the state is not changed on error
+ */
+{
+  COMPLEX	B[16];		/* matrix of the current block */
+  int		bq[2]	= {0, 0};	/* qubits of the current block */
+  int		bnum	= 0;	/* number of qubits of the current block */
+  int		gnum	= 0;	/* number of gates of the current block */
+  int		first	= 0;	/* first gate of the current block */
+  int		dim	= 0;
+  int		qnew[2];
+  int		nnew;
+  COMPLEX*	U	= NULL;
+  QGate*	g	= NULL;
+
+  if ((qstate == NULL) || (gate_num < 0) || ((gate_num > 0) && (qgate == NULL)))
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+  for (int i=0; i<gate_num; i++) {
+    if (!(qgate_check_unitary(&(qgate[i]), qstate->qubit_num)) || (qgate[i].ctrl >= 0))
+      ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+  }
+
+  for (int i=0; i<gate_num; i++) {
+    g = &(qgate[i]);
+
+    /* qubits of the gate not included in the current block */
+    nnew = 0;
+    for (int k=0; k<g->terminal_num; k++) {
+      if ((bnum < 1 || g->qubit_id[k] != bq[0]) && (bnum < 2 || g->qubit_id[k] != bq[1]))
+	qnew[nnew++] = g->qubit_id[k];
+    }
+
+    if (bnum + nnew > 2) {
+      if (!(_qstate_operate_fused_block(qstate, B, bnum, bq, gnum, &(qgate[first]))))
+	ERR_RETURN(ERROR_QSTATE_OPERATE_QGATE,false);
+      bnum = gnum = nnew = 0;
+      for (int k=0; k<g->terminal_num; k++) qnew[nnew++] = g->qubit_id[k];
+    }
+    if (gnum == 0) first = i;
+    for (int k=0; k<nnew; k++) _fused_block_expand(B, &bnum, bq, qnew[k]);
+
+    if (!(gbank_get_unitary(qstate->gbank, g->kind, g->para.phase.alpha, g->para.phase.beta,
+			    g->para.phase.gamma, &dim, (void**)&U)))
+      ERR_RETURN(ERROR_GBANK_GET_UNITARY,false);
+    _fused_block_multiply(B, bnum, bq, U, g);
+    free(U); U = NULL;
+    gnum++;
+  }
+
+  if (!(_qstate_operate_fused_block(qstate, B, bnum, bq, gnum, &(qgate[first]))))
+    ERR_RETURN(ERROR_QSTATE_OPERATE_QGATE,false);
+
+  SUC_RETURN(true);
+}
+
+static bool _qcirc_check_measure(QGate* qgate, int qubit_num, int cmem_num)
+{
+  if ((qgate->terminal_num < 1) || (qgate->terminal_num > qubit_num)) return false;
+  for (int k=0; k<qgate->terminal_num; k++) {
+    if ((qgate->qubit_id[k] < 0) || (qgate->qubit_id[k] >= qubit_num)) return false;
+    if (qgate->cmem_id[k] >= cmem_num) return false;
+    for (int l=0; l<k; l++) {
+      if (qgate->qubit_id[l] == qgate->qubit_id[k]) return false;
+    }
+  }
+  return true;
+}
+
+static bool _qstate_operate_qcirc_gates(QState* qstate, int from, int to, QGate* qgate,
+					int* cmem)
+{
+  /* operate non-measurement gates qgate[from..to-1] (controlled by cmem) */
+  QGate*	g = NULL;
+
+  for (int i=from; i<to; i++) {
+    g = &(qgate[i]);
+    if ((g->ctrl >= 0) && (cmem[g->ctrl] != 1)) continue;
+    if (!(_qstate_operate_qgate(qstate, g->kind, g->para.phase.alpha, g->para.phase.beta,
+				g->para.phase.gamma, g->qubit_id, false)))
+      return false;
+  }
+  return true;
+}
+
+static bool _qstate_run_qcirc(QState* qstate, int gate_num, QGate* qgate, int prefix,
+			      int last, int cmem_num, int* cmem, int shot_from, int shot_to,
+			      int* mval_out)
+{
+  /* run shots [shot_from, shot_to) of the (checked) quantum circuit */
+  MData*	mdata	 = NULL;
+  QGate*	g	 = NULL;
+  COMPLEX*	snapshot = NULL; /* state after the prefix (starting from |0...0>) */
+  int		start	 = 0;
+  bool		ret	 = true;
+
+  for (int s=shot_from; (s<shot_to) && ret; s++) {
+
+    /* reset classical memory and qubits, if not the first shot */
+    start = 0;
+    if (s > 0) {
+      for (int i=0; i<cmem_num; i++) cmem[i] = 0;
+      if (snapshot == NULL) {
+	for (int i=0; i<qstate->state_num; i++) qstate->camp[i] = 0.0;
+	qstate->camp[0] = 1.0;
+	if (!(ret = _qstate_operate_qcirc_gates(qstate, 0, prefix, qgate, cmem))) break;
+	if (!(ret = ((snapshot = (COMPLEX*)malloc(sizeof(COMPLEX)*qstate->state_num)) != NULL)))
+	  break;
+	memcpy(snapshot, qstate->camp, sizeof(COMPLEX)*qstate->state_num);
+      }
+      else {
+	memcpy(qstate->camp, snapshot, sizeof(COMPLEX)*qstate->state_num);
+      }
+      start = prefix;
+    }
+
+    for (int i=start; (i<gate_num) && ret; i++) {
+      g = &(qgate[i]);
+      if (g->kind == MEASURE) {
+	if (!(ret = mdata_init(g->terminal_num, (1<<g->terminal_num), 1, 0.0, 0.0,
+			       g->qubit_id, (void**)&mdata))) break;
+	if ((ret = _qstate_measure_sampling(qstate, 1, g->terminal_num, g->qubit_id, mdata))) {
+	  for (int k=0; k<g->terminal_num; k++) {
+	    if (g->cmem_id[k] >= 0)
+	      cmem[g->cmem_id[k]] = (mdata->last >> (g->terminal_num - 1 - k)) & 1;
+	  }
+	  if ((i == last) && (mval_out != NULL)) mval_out[s] = mdata->last;
+	}
+	mdata_free(mdata); mdata = NULL;
+      }
+      else {
+	ret = _qstate_operate_qcirc_gates(qstate, i, i+1, qgate, cmem);
+      }
+    }
+  }
+
+  free(snapshot); snapshot = NULL;
+
+  return ret;
+}
+
+bool qstate_operate_qcirc(QState* qstate, int gate_num, QGate* qgate, int cmem_num,
+			  int* cmem, int shots, int workers, int* mval_out)
+/*
+  run the quantum circuit qgate[0..gate_num-1] 'shots' times
+  - MEASURE gates store measured values to cmem[cmem_id[k]] (if cmem_id[k] >= 0)
+  - other gates are operated only if ctrl < 0 or cmem[ctrl] == 1
+  - mval_out[shot] is the measured value of the last MEASURE gate (if mval_out != NULL)
+  - cmem and the state are reset between shots; the state after the last shot remains
+  - the gates before the first measurement (prefix) are operated only once for shots
+    after the first one; the state is restored from the snapshot
+  - if workers > 1, the shots are divided into 'workers' blocks, each of which runs
+    on its own copy of the state with its own random number stream (jumped from the
+    generator of the state), in parallel threads if built with USE_OPENMP
+ */
+{
+  QState**	qs    = NULL;
+  int*		cm    = NULL;
+  bool*		ok    = NULL;
+  int		last  = -1; /* index of the last measurement */
+  int		prefix = -1; /* index of the first measurement */
+  bool		ret   = true;
+  int		w;
+
+  if ((qstate == NULL) || (gate_num < 0) || ((gate_num > 0) && (qgate == NULL)) ||
+      (cmem_num < 0) || ((cmem_num > 0) && (cmem == NULL)) || (shots < 1) || (workers < 1))
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+  for (int i=0; i<gate_num; i++) {
+    if (qgate[i].kind == MEASURE) {
+      if (!(_qcirc_check_measure(&(qgate[i]), qstate->qubit_num, cmem_num)))
+	ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+      if (prefix < 0) prefix = i;
+      last = i;
+    }
+    else if (!(qgate_check_unitary(&(qgate[i]), qstate->qubit_num)) ||
+	     (qgate[i].ctrl >= cmem_num))
+      ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+  }
+
+  if (prefix < 0) prefix = gate_num;
+  if (workers > shots) workers = shots;
+
+  if (workers == 1) {
+    if (!(_qstate_run_qcirc(qstate, gate_num, qgate, prefix, last, cmem_num, cmem,
+			    0, shots, mval_out)))
+      ERR_RETURN(ERROR_QSTATE_OPERATE_QGATE,false);
+    SUC_RETURN(true);
+  }
+
+  /* state, classical memory and random number stream of each worker */
+  if (!(qs = (QState**)calloc(workers, sizeof(QState*))) ||
+      !(cm = (int*)calloc(workers * (cmem_num + 1), sizeof(int))) ||
+      !(ok = (bool*)malloc(sizeof(bool)*workers))) {
+    free(qs); free(cm); free(ok);
+    ERR_RETURN(ERROR_CANT_ALLOC_MEMORY,false);
+  }
+  for (w=0; w<workers; w++) {
+    if (!(ret = qstate_copy(qstate, (void**)&(qs[w])))) break;
+    qs[w]->rand = (w == 0 ? qstate->rand : qs[w-1]->rand);
+    randstate_jump(&(qs[w]->rand));
+  }
+  if (cmem_num > 0) memcpy(cm, cmem, sizeof(int)*cmem_num);
+
+  if (ret == true) {
+#ifdef USE_OPENMP
+#pragma omp parallel for schedule(static,1) num_threads(workers)
+#endif
+    for (w=0; w<workers; w++) {
+      ok[w] = _qstate_run_qcirc(qs[w], gate_num, qgate, prefix, last, cmem_num,
+				&(cm[w * (cmem_num + 1)]),
+				(int)((long)shots * w / workers),
+				(int)((long)shots * (w + 1) / workers), mval_out);
+    }
+    for (w=0; w<workers; w++) ret = ret && ok[w];
+  }
+
+  /* the state, classical memory and random number stream after the last shot */
+  if (ret == true) {
+    memcpy(qstate->camp, qs[workers-1]->camp, sizeof(COMPLEX)*qstate->state_num);
+    qstate->rand = qs[workers-1]->rand;
+    if (cmem_num > 0) memcpy(cmem, &(cm[(workers-1) * (cmem_num + 1)]), sizeof(int)*cmem_num);
+  }
+
+  for (w=0; w<workers; w++) qstate_free(qs[w]);
+  free(qs); free(cm); free(ok);
+
+  if (ret == false) ERR_RETURN(ERROR_QSTATE_OPERATE_QGATE,false);
+
+  SUC_RETURN(true);
+}
+
+static bool _qstate_apply_matrix_dense(COMPLEX* camp, int qubit_num, int qnum_part,
+				       int qid[MAX_QUBIT_NUM], COMPLEX* matrix)
+{
+  /*
+    dense 2^k x 2^k matrix on k (<= MAX_DENSE_QUBIT_NUM) qubits, in place
+    - the bit of qid[j] is the (k-1-j)-th bit of the matrix index
+    - loop over 2^(n-k) outer indices (zero bits inserted at the qubit positions),
+      gather 2^k amplitudes to the stack, multiply, and scatter back
+   */
+  int	dim = (1 << qnum_part);
+  int	pos[MAX_DENSE_QUBIT_NUM];	/* bit positions (ascending) */
+  int	offset[1 << MAX_DENSE_QUBIT_NUM];	/* offsets of the 2^k amplitudes */
+  int	used = 0;
+  int	base;
+
+  if ((camp == NULL) || (matrix == NULL) || (qnum_part < 1) ||
+      (qnum_part > MAX_DENSE_QUBIT_NUM) || (qnum_part > qubit_num))
+    ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+  for (int j=0; j<qnum_part; j++) {
+    if ((qid[j] < 0) || (qid[j] >= qubit_num) || ((used >> qid[j]) & 1))
+      ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+    used |= (1 << qid[j]);
+    pos[j] = qubit_num - qid[j] - 1;
+  }
+  for (int s=0; s<dim; s++) {
+    offset[s] = 0;
+    for (int j=0; j<qnum_part; j++) {
+      if ((s >> (qnum_part - 1 - j)) & 1) offset[s] |= (1 << pos[j]);
+    }
+  }
+  qsort(pos, qnum_part, sizeof(int), _cmp_int);
 
-  *value = real;
+#ifdef USE_OPENMP
+#pragma omp parallel for private(base) if (qubit_num >= MIN_QUBIT_NUM_PARALLEL) \
+  num_threads(qlazy_get_num_threads())
+#endif
+  for (int k=0; k<(1 << (qubit_num - qnum_part)); k++) {
+    COMPLEX	v[1 << MAX_DENSE_QUBIT_NUM];
+    COMPLEX	w;
+    base = k;
+    for (int j=0; j<qnum_part; j++) base = _insert_zero_bit(base, pos[j]);
+    for (int s=0; s<dim; s++) v[s] = camp[base | offset[s]];
+    for (int r=0; r<dim; r++) {
+      w = 0.0;
+      for (int s=0; s<dim; s++) w += matrix[r*dim+s] * v[s];
+      camp[base | offset[r]] = w;
+    }
+  }
 
   SUC_RETURN(true);
 }
 
 bool qstate_apply_matrix(QState* qstate, int qnum_part, int qid[MAX_QUBIT_NUM],
-			 double* real, double *imag, int row, int col)
+			 COMPLEX* matrix, int row, int col)
 {
   QState*	qstate_tmp = NULL;
   int*		index	   = NULL;
@@ -1155,10 +2589,17 @@ bool qstate_apply_matrix(QState* qstate, int qnum_part, int qid[MAX_QUBIT_NUM],
   int           N	   = 0;
   int		ii,iii,jj,jjj;
 
-  if ((qstate == NULL) || (real == NULL) || (imag == NULL) ||
+  if ((qstate == NULL) || (matrix == NULL) ||
       (qstate->state_num < row) || (1<<qnum_part != row) || (row != col))
     ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
 
+  /* in place kernel (no copy of the state, no permutation arrays) */
+  if (qnum_part <= MAX_DENSE_QUBIT_NUM) {
+    if (!(_qstate_apply_matrix_dense(qstate->camp, qstate->qubit_num, qnum_part, qid, matrix)))
+      ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+    SUC_RETURN(true);
+  }
+
   if (!(qstate_copy(qstate, (void**)&qstate_tmp)))
     ERR_RETURN(ERROR_QSTATE_COPY,false);
 
@@ -1171,6 +2612,10 @@ bool qstate_apply_matrix(QState* qstate, int qnum_part, int qid[MAX_QUBIT_NUM],
   shift = qstate->qubit_num-qnum_part;
   N = 1<<(qstate->qubit_num-shift);
   
+#ifdef USE_OPENMP
+#pragma omp parallel for private(ii,iii,jj,jjj,coef) \
+  if (qstate->qubit_num >= MIN_QUBIT_NUM_PARALLEL) num_threads(qlazy_get_num_threads())
+#endif
   for (int i=0; i<qstate->state_num; i++) {
     qstate->camp[i] = 0.0 + 0.0i;
     ii = index[i]>>shift;
@@ -1180,7 +2625,7 @@ bool qstate_apply_matrix(QState* qstate, int qnum_part, int qid[MAX_QUBIT_NUM],
       int j = inv_index[(k<<shift)+iii];
       jj = index[j]>>shift;
       jjj = index[j]%(1<<shift);
-      coef = real[ii*col+jj] + 1.0i * imag[ii*col+jj];
+      coef = matrix[ii*col+jj];
       qstate->camp[i] += (coef * qstate_tmp->camp[j]);
     }
 
@@ -1189,7 +2634,7 @@ bool qstate_apply_matrix(QState* qstate, int qnum_part, int qid[MAX_QUBIT_NUM],
       jj = index[j]>>shift;
       jjj = index[j]%(1<<shift);
       if (iii == jjj) {
-	coef = real[ii*col+jj] + 1.0i * imag[ii*col+jj];
+	coef = matrix[ii*col+jj];
 	qstate->camp[i] += (coef * qstate_tmp->camp[j]);
       }
     }
@@ -1210,8 +2655,6 @@ void qstate_free(QState* qstate)
   if (qstate->camp != NULL) {
     free(qstate->camp); qstate->camp = NULL;
   }
-  if (qstate->gbank != NULL) {
-    free(qstate->gbank); qstate->gbank = NULL;
-  }
+  qstate->gbank = NULL; /* shared gate bank, not owned by qstate */
   free(qstate);
 }
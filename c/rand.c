@@ -0,0 +1,74 @@
+/*
+ *  rand.c
+ */
+
+#include "qlazy.h"
+
+/*
+  pseudo random number generator (xoshiro256**) owned by each object
+  - the 256-bit state is initialized from a seed with splitmix64
+  - randstate_jump advances the state by 2^128 steps (non-overlapping streams)
+ */
+
+static uint64_t _splitmix64(uint64_t* x)
+{
+  uint64_t z = (*x += 0x9e3779b97f4a7c15ULL);
+  z = (z ^ (z >> 30)) * 0xbf58476d1ce4e5b9ULL;
+  z = (z ^ (z >> 27)) * 0x94d049bb133111ebULL;
+  return z ^ (z >> 31);
+}
+
+static inline uint64_t _rotl(const uint64_t x, int k)
+{
+  return (x << k) | (x >> (64 - k));
+}
+
+void randstate_init(RandState* rs, uint64_t seed)
+{
+  for (int i=0; i<4; i++) rs->s[i] = _splitmix64(&seed);
+}
+
+uint64_t randstate_next(RandState* rs)
+{
+  uint64_t* s	   = rs->s;
+  uint64_t  result = _rotl(s[1] * 5, 7) * 9;
+  uint64_t  t	   = s[1] << 17;
+
+  s[2] ^= s[0];
+  s[3] ^= s[1];
+  s[1] ^= s[2];
+  s[0] ^= s[3];
+  s[2] ^= t;
+  s[3] = _rotl(s[3], 45);
+
+  return result;
+}
+
+double randstate_double(RandState* rs)
+{
+  /* uniform in [0,1) with 53-bit resolution */
+  return (randstate_next(rs) >> 11) * 0x1.0p-53;
+}
+
+void randstate_jump(RandState* rs)
+{
+  static const uint64_t JUMP[] = { 0x180ec6d33cfd0abaULL, 0xd5a61266f0c9392cULL,
+				   0xa9582618e03fc9aaULL, 0x39abdc4529b1661cULL };
+  uint64_t s[4] = { 0, 0, 0, 0 };
+
+  for (int i=0; i<4; i++) {
+    for (int b=0; b<64; b++) {
+      if (JUMP[i] & (1ULL << b)) {
+	for (int k=0; k<4; k++) s[k] ^= rs->s[k];
+      }
+      randstate_next(rs);
+    }
+  }
+  memcpy(rs->s, s, sizeof(s));
+}
+
+void randstate_split(RandState* rs, RandState* rs_out)
+{
+  /* new generator seeded by the next output of rs (used for copied objects) */
+  randstate_init(rs_out, randstate_next(rs));
+}
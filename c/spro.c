@@ -110,6 +110,51 @@ bool spro_init(char* str, void** spro_out)
   SUC_RETURN(true);
 }
 
+bool spro_get_mask(SPro* spro, int qubit_num, int* xmask_out, int* zmask_out,
+		   int* ynum_out)
+/*
+  [bit masks of the pauli product for the qstate index (qubit 0 = MSB)]
+  - xmask: bits flipped by X or Y
+  - zmask: bits with sign (-1)^bit by Z or Y
+  - ynum:  number of Y (phase factor = i^ynum)
+  then, P|i> = i^ynum * (-1)^popcount(i & zmask) |i ^ xmask>
+ */
+{
+  int xmask = 0;
+  int zmask = 0;
+  int ynum  = 0;
+  int bit;
+
+  if (spro == NULL) ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+
+  for (int i=0; i<spro->spin_num; i++) {
+    if (spro->spin_type[i] == NONE) continue;
+    if (i >= qubit_num) ERR_RETURN(ERROR_OUT_OF_BOUND,false);
+    bit = 1 << (qubit_num - i - 1);
+    switch (spro->spin_type[i]) {
+    case SIGMA_X:
+      xmask |= bit;
+      break;
+    case SIGMA_Y:
+      xmask |= bit;
+      zmask |= bit;
+      ynum++;
+      break;
+    case SIGMA_Z:
+      zmask |= bit;
+      break;
+    default:
+      ERR_RETURN(ERROR_INVALID_ARGUMENT,false);
+    }
+  }
+
+  *xmask_out = xmask;
+  *zmask_out = zmask;
+  *ynum_out = ynum;
+
+  SUC_RETURN(true);
+}
+
 void spro_free(SPro* spro)
 {
   if (spro != NULL) free(spro);
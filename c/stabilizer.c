@@ -39,8 +39,6 @@ bool stabilizer_init(int gene_num, int qubit_num, int seed, void** stab_out)
   Stabilizer*	stab	    = NULL;
   int		matrix_size = gene_num * qubit_num * 2;
 
-  init_qlazy(seed);
-
   if ((qubit_num < 1) || (gene_num < 1))
     ERR_RETURN(ERROR_OUT_OF_BOUND,false);
 
@@ -58,6 +56,8 @@ bool stabilizer_init(int gene_num, int qubit_num, int seed, void** stab_out)
     ERR_RETURN(ERROR_CANT_ALLOC_MEMORY,false);
   for (int i=0; i<matrix_size; i++) stab->check_matrix[i] = 0;
 
+  randstate_init(&(stab->rand), (uint64_t)seed);
+
   *stab_out = stab;
 
   SUC_RETURN(true);
@@ -86,6 +86,8 @@ bool stabilizer_copy(Stabilizer* stab_in, void** stab_out)
     ERR_RETURN(ERROR_CANT_ALLOC_MEMORY,false);
   memcpy(stab->check_matrix, stab_in->check_matrix, sizeof(int)*matrix_size);
 
+  randstate_split(&(stab_in->rand), &(stab->rand));
+
   *stab_out = stab;
 
   SUC_RETURN(true);
@@ -716,7 +718,7 @@ bool stabilizer_measure(Stabilizer* stab, int q, double prob_out[2], int* mval_o
       stab->check_matrix[not_commute_id*col+i] = measured_op[i];
     }
     
-    if (rand()%2 == 0) {
+    if ((randstate_next(&(stab->rand)) >> 63) == 0) {
       stab->pauli_factor[not_commute_id] = REAL_PLUS; /* Z(q) */
       *mval_out = 0;
     }
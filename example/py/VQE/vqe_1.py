@@ -0,0 +1,68 @@
+import numpy as np
+import scipy.optimize
+from qlazypy import QState,Observable,QComp
+
+#------------------------------------
+#  functions
+#------------------------------------
+
+def set_hamiltonian_str():
+
+    s = "{}".format(-3.8503/2)
+    s += "-{}*x_1".format(0.2288/2)
+    s += "-{}*z_1".format(1.0466/2)
+    s += "-{}*x_0".format(0.2288/2)
+    s += "+{}*x_0*x_1".format(0.2613/2)
+    s += "+{}*x_0*z_1".format(0.2288/2)
+    s += "-{}*z_0".format(1.0466/2)
+    s += "+{}*z_0*x_1".format(0.2288/2)
+    s += "+{}*z_0*z_1".format(0.2356/2)
+
+    return s
+
+def circuit(phi):
+
+    qc = QComp(2)
+
+    qc.rx(0,phase=phi[0])
+    qc.rz(0,phase=phi[1])
+    qc.rx(1,phase=phi[2])
+    qc.rz(1,phase=phi[3])
+    qc.cx(1,0)
+    qc.rz(1,phase=phi[4])
+    qc.rx(1,phase=phi[5])
+
+    return qc
+
+def cost_and_grad(phi):
+
+    qc = circuit(phi)
+    qs = QState(2)
+
+    exp, grad = qs.expect_gradient(observable=M, qcirc=qc)
+
+    qs.free()
+    qc.free()
+
+    return exp, np.array(grad)
+    
+def callback(phi):
+
+    print("energy = ", cost_and_grad(phi)[0])
+
+#------------------------------------
+#  main
+#------------------------------------
+
+# set Hamiltonian
+
+M_str = set_hamiltonian_str()
+M = Observable(M_str)
+
+# VQE (gradient by adjoint method)
+
+init = np.random.rand(6)
+callback(init)
+res = scipy.optimize.minimize(cost_and_grad, init, jac=True,
+                              method='BFGS', callback=callback)
+M.free()
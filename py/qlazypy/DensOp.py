@@ -6,7 +6,6 @@ import numpy as np
 from qlazypy.config import *
 from qlazypy.error import *
 from qlazypy.QState import *
-from qlazypy.lib.densop_mcx import *
 
 class DensOp(ctypes.Structure):
     """ Density Operator
@@ -559,6 +558,33 @@ class DensOp(ctypes.Structure):
         densop_apply_matrix(self, matrix=matrix, qid=qid, dire=dire)
         return self
 
+    def apply_batch(self, qgates=None):
+        """
+        operate a sequence of quantum gates in one call.
+
+        Parameters
+        ----------
+        qgates : numpy.ndarray (dtype=qlazypy.util.QGATE_DTYPE), QComp, or list of dict
+            sequence of quantum gates. if QComp or its 'qcirc' list is
+            set, it must not include measurements and classically
+            controlled gates.
+
+        Returns
+        -------
+        self : instance of DensOp
+
+        Notes
+        -----
+        The whole sequence is operated by the C library at once (see
+        QState.apply_batch). The density operator is not changed if
+        any gate is invalid.
+
+        """
+        if hasattr(qgates, 'qcirc'):
+            qgates = qgates.qcirc
+        densop_operate_qgate_batch(self, qgates=qgates)
+        return self
+
     def probability(self, kraus=[], povm=[], qid=[]):
         """
         get the probabilities for measuring operators. 
@@ -1793,7 +1819,7 @@ class DensOp(ctypes.Structure):
         self : instance of DensOp
 
         """
-        self.cxr(q1,q2).cx(q0,q1).cxr_dg(q1,q2).cx(q0,q1).cxr(q0,q2)
+        densop_mcx(self, [q0,q1,q2])
         return self
 
     def csw(self, q0, q1, q2):
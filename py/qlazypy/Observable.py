@@ -31,12 +31,61 @@ class Observable(ctypes.Structure):
         >>> ob = Observable("-2.0+z_0*z_1+x_0+x_1")
 
         """
-        cls.spin_num = 0
-        cls.array_num = 0
-        cls.spro_array = None
         ob = observable_init(string)
         return ob
 
+    def __init__(self, string=None):
+        """ fields are set by observable_init (see __new__) """
+        pass
+
+    def ground_state(self, qubit_num=None, tol=DEF_KRYLOV_TOL, seed=None):
+        """
+        get the ground state and its energy.
+
+        Parameters
+        ----------
+        qubit_num : int, default - spin number of the observable
+            qubit number of the quantum state.
+        tol : float, default DEF_KRYLOV_TOL
+            tolerance of the residual norm |H psi - E psi|.
+        seed : int, default - set randomly
+            seed for random generation of the initial vector.
+
+        Returns
+        -------
+        energy : float
+            lowest eigenvalue of the observable.
+        qs : instance of QState
+            eigenstate for the energy.
+
+        Notes
+        -----
+        The ground state is calculated by the restarted Lanczos method,
+        where the observable is applied to the state matrix-free.
+
+        Examples
+        --------
+        >>> hm = Observable("z_0*z_1+x_0+x_1")
+        >>> energy, qs = hm.ground_state()
+
+        """
+        from qlazypy.QState import QState
+        from qlazypy.lib.qstate_c import qstate_ground_state
+
+        if qubit_num is None:
+            qubit_num = self.spin_num
+        if qubit_num < self.spin_num:
+            raise Observable_Error_GroundState()
+
+        qs = QState(qubit_num=qubit_num, seed=seed)
+        try:
+            energy = qstate_ground_state(qs, observable=self, tol=tol)
+        except Observable_Error_GroundState:
+            qs.free()
+            raise
+
+        return energy, qs
+
     def free(ob):
 
         observable_free(ob)
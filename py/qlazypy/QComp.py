@@ -28,7 +28,7 @@ class QComp:
 
     """
 
-    def __init__(self, qubit_num, cmem_num=0, backend=None):
+    def __init__(self, qubit_num, cmem_num=0, backend=None, seed=None):
 
         self.qubit_num = qubit_num
         self.cmem_num = cmem_num
@@ -42,13 +42,13 @@ class QComp:
             
         # qlazy qstate simulator
         if self.backend.name == 'qlazy_qstate_simulator':
-            self.qstate = QState(qubit_num=qubit_num)
+            self.qstate = QState(qubit_num=qubit_num, seed=seed)
         else:
             self.qstate = None
 
         # qlazy stabilizer simulator
         if self.backend.name == 'qlazy_stabilizer_simulator':
-            self.stab = Stabilizer(qubit_num=qubit_num)
+            self.stab = Stabilizer(qubit_num=qubit_num, seed=seed)
             self.stab.set_all('Z')
         else:
             self.stab = None
@@ -77,7 +77,8 @@ class QComp:
         elif self.stab != None:
             self.stab.free()
 
-    def run(self, shots=DEF_SHOTS, reset_qubits=True, reset_cmem=True, reset_qcirc=True):
+    def run(self, shots=DEF_SHOTS, reset_qubits=True, reset_cmem=True, reset_qcirc=True,
+            workers=1):
         """
         run the quantum circuit.
 
@@ -85,6 +86,11 @@ class QComp:
         ----------
         shots : int, default 1
             number of measurements.
+        workers : int, default 1
+            number of workers running the shots in parallel
+            (qlazy_qstate_simulator only, and only for the circuits
+            re-simulated for every shot).
+            the result is reproducible for the same seed and workers.
 
         Returns
         -------
@@ -100,7 +106,8 @@ class QComp:
 
         """
         if self.backend.name == 'qlazy_qstate_simulator':
-            result = run_qlazy_qstate_simulator(self.qstate, self.qcirc, self.cmem, shots=shots)
+            result = run_qlazy_qstate_simulator(self.qstate, self.qcirc, self.cmem, shots=shots,
+                                                workers=workers)
             self.reset(reset_qubits, reset_cmem, reset_qcirc)
         elif self.backend.name == 'qlazy_stabilizer_simulator':
             result = run_qlazy_stabilizer_simulator(self.stab, self.qcirc, self.cmem, shots=shots)
@@ -7,7 +7,6 @@ from qlazypy.config import *
 from qlazypy.error import *
 from qlazypy.MData import *
 from qlazypy.Observable import *
-from qlazypy.lib.qstate_mcx import *
 
 MDATA_TABLE = {}
 
@@ -30,9 +29,19 @@ class QState(ctypes.Structure):
         ('state_num', ctypes.c_int),
         ('camp', ctypes.c_void_p),
         ('gbank', ctypes.c_void_p),
+        ('rand', ctypes.c_uint64*4),
     ]
 
-    def __new__(cls, qubit_num=None, vector=None, seed=None):
+    # gates queued in lazy mode (None: not lazy mode)
+    _lazy_qgates = None
+
+    # weak reference to the buffer shared by the views of the state vector
+    _amp_buf = None
+
+    # iteration number used by the last 'evolve' (trotter method)
+    evolve_iter = None
+
+    def __new__(cls, qubit_num=None, vector=None, seed=None, lazy=False):
         """
         Parameters
         ----------
@@ -41,12 +50,23 @@ class QState(ctypes.Structure):
         vector : list
             elements of the quantum state vector.
         seed : int, default - set randomly
-            seed for random generation for meaurement.
+            seed for random generation for meaurement
+            (each quantum state has its own random number generator).
+        lazy : bool, default - False
+            lazy mode (gate operations are deferred until the state is used).
 
         Notes
         -----
         You must specify either 'qubit_num' or 'vector', not both.
 
+        In lazy mode, gates are queued and operated at once when the
+        state is needed (get_amp, m, expect, inpro, show, etc. or
+        flush method). Consecutive gates acting within the same one or
+        two qubits are fused into one 2x2 or 4x4 matrix. The quantum
+        states derived from a lazy one (clone, partial, etc.) are not
+        lazy. 'amp_view' is not available in lazy mode (use 'get_amp'
+        or a state without lazy mode).
+
         """
         if seed is None:
             seed = random.randint(0,1000000)
@@ -56,10 +76,19 @@ class QState(ctypes.Structure):
                 print("qubit number must be {0:d} or less.".format(MAX_QUBIT_NUM))
                 raise QState_Error_Initialize()
 
-            return qstate_init(qubit_num, seed)
+            qs = qstate_init(qubit_num, seed)
 
         else:
-            return qstate_init_with_vector(vector, seed)
+            qs = qstate_init_with_vector(vector, seed)
+
+        if lazy == True:
+            qs._lazy_qgates = []
+
+        return qs
+
+    def __init__(self, qubit_num=None, vector=None, seed=None, lazy=False):
+        """ fields are set by qstate_init (see __new__) """
+        pass
             
     def __str__(self):
 
@@ -215,6 +244,32 @@ class QState(ctypes.Structure):
             else:
                 raise QState_Error_FreeAll()
 
+    @property
+    def lazy(self):
+        """ lazy mode or not. """
+        return self._lazy_qgates is not None
+
+    def flush(self):
+        """
+        operate the gates queued in lazy mode.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        self : instance of QState
+
+        Notes
+        -----
+        Usually you don't need to call this method, because the queued
+        gates are operated automatically when the state is used.
+
+        """
+        qstate_flush(self)
+        return self
+
     @property
     def amp(self, qid=None):
         """ elements of quantum state vector. """
@@ -246,6 +301,35 @@ class QState(ctypes.Structure):
         ret =  qstate_get_camp(self, qid)
         return ret
 
+    def amp_view(self, readonly=False):
+        """
+        get the elements of quantum state vector without copy.
+
+        Parameters
+        ----------
+        readonly : bool, default False
+            if True, the returned array is not writeable.
+
+        Returns
+        -------
+        view : numpy.ndarray (dtype=complex128)
+            array sharing the memory with the quantum state vector.
+
+        Notes
+        -----
+        The array reflects subsequent gate operations, and writing to
+        it changes the quantum state (normalization is not checked).
+        If 'free' is called while the array (or an array derived from
+        it) is alive, the memory is detached from the instance and
+        released when the last such array is garbage collected, so the
+        array stays valid but no longer reflects the instance.
+        The view of a quantum state in lazy mode is not available
+        (QState_Error_GetCmp is raised), because the queued gates are
+        not reflected in the array.
+
+        """
+        return qstate_amp_view(self, readonly=readonly)
+
     def partial(self, qid=None):
         """
         get the partial quantum state.
@@ -456,7 +540,8 @@ class QState(ctypes.Structure):
                 qs_tmp.free()
             return qs
         
-    def evolve(self, observable=None, time=0.0, iter=0):
+    def evolve(self, observable=None, time=0.0, iter=0, order=1, tol=None,
+               method='trotter'):
         """
         evolve the quantum state.
 
@@ -468,6 +553,19 @@ class QState(ctypes.Structure):
             period of time.
         iter : int
             number of iteration.
+        order : int, default 1
+            order of Trotter-Suzuki decomposition
+            (1: Lie-Trotter, 2: symmetric, 4: Suzuki 4th order).
+        tol : float, default None
+            error tolerance. if set, number of iteration is chosen
+            automatically (doubled from 'iter') so that the estimated
+            error of the state is less than 'tol'. the chosen number
+            is stored in 'evolve_iter'.
+        method : str, default 'trotter'
+            'trotter' : Trotter-Suzuki decomposition.
+            'krylov' : Krylov subspace (Lanczos) method, without
+            Trotter error. 'iter' and 'order' are ignored, and 'tol'
+            (default DEF_KRYLOV_TOL) is the error tolerance of the state.
 
         Returns
         -------
@@ -477,13 +575,32 @@ class QState(ctypes.Structure):
         -----
         The 'iter' value should be sufficiently larger than the
         'time' value. This method change the original state.
+        Higher 'order' gives the same accuracy with much smaller
+        'iter' (each iteration of order 2 and 4 costs about 2 and 10
+        times of order 1).
+        The 'krylov' method applies the Hamiltonian only tens of times
+        and is suitable for small-to-medium systems (it keeps up to
+        MAX_KRYLOV_DIM vectors of the state size).
+        After the 'trotter' method, the number of iteration actually
+        used is stored in 'evolve_iter' attribute (None after the
+        'krylov' method), so the step count that met 'tol' can be
+        reused with 'iter' for the same Hamiltonian and time.
 
         See Also
         --------
         Obserbable class (Observable.py)
 
         """
-        qstate_evolve(self, observable=observable, time=time, iter=iter)
+        if method == 'trotter':
+            self.evolve_iter = qstate_evolve(self, observable=observable, time=time,
+                                             iter=iter, order=order, tol=tol)
+        elif method == 'krylov':
+            if tol is None:
+                tol = DEF_KRYLOV_TOL
+            qstate_evolve_krylov(self, observable=observable, time=time, tol=tol)
+            self.evolve_iter = None
+        else:
+            raise QState_Error_Evolve()
         return self
     
     def expect(self, observable=None):
@@ -507,6 +624,51 @@ class QState(ctypes.Structure):
         """
         expect = qstate_expect_value(self, observable=observable)
         return expect
+
+    def expect_gradient(self, observable=None, qcirc=None):
+        """
+        run the quantum circuit and get the expectation value for
+        observable and its gradient with respect to the gate parameters.
+
+        Parameters
+        ----------
+        observable : instance of Observable
+            obserbable of the system.
+        qcirc : instance of QComp, or list of dict
+            quantum circuit (or its 'qcirc' list), which must not
+            include measurements and classically controlled gates.
+
+        Returns
+        -------
+        expect : float
+            expect value.
+        grad : list of float
+            derivatives of the expect value with respect to the
+            parameters of the gates, in order of the gates ('phase',
+            'phase1','phase2' for each parametric gate, unit of angle is
+            PI radian).
+
+        Notes
+        -----
+        The gradient is calculated by the adjoint method, whose cost is
+        about 3 times of one circuit simulation. This method change the
+        original state to the output state of the circuit.
+
+        Examples
+        --------
+        >>> qc = QComp(2).rx(0, phase=0.1).cx(0,1).ry(1, phase=0.2)
+        >>> hm = Observable("z_0*z_1+x_0")
+        >>> qs = QState(2)
+        >>> energy, grad = qs.expect_gradient(observable=hm, qcirc=qc)
+
+        See Also
+        --------
+        Obserbable class (Observable.py), QComp class (QComp.py)
+
+        """
+        if hasattr(qcirc, 'qcirc'):
+            qcirc = qcirc.qcirc
+        return qstate_expect_gradient(self, observable=observable, qcirc=qcirc)
     
     def apply(self, matrix=None, qid=None):
         """
@@ -532,6 +694,82 @@ class QState(ctypes.Structure):
         qstate_apply_matrix(self, matrix=matrix, qid=qid)
         return self
 
+    def apply_permutation(self, table=None, qid_in=None, qid_out=None):
+        """
+        apply classical reversible function to the basis states.
+
+        Parameters
+        ----------
+        table : numpy.ndarray, list of int or function
+            function f of the basis integers of 'qid_in' register, as
+            a lookup table (table[x] = f(x)) or a function that takes
+            numpy array of the integers (vectorized).
+        qid_in : list of int, default None
+            qubit id list of the input register (qid_in[0] is the most
+            significant bit). if None, all qubits are selected.
+        qid_out : list of int, default None
+            qubit id list of the output register.
+
+        Returns
+        -------
+        self : instance of QState
+
+        Notes
+        -----
+        If 'qid_out' isn't set, |x> -> |f(x)> is applied on 'qid_in'
+        register, so f must be a permutation of 0,...,2**len(qid_in)-1.
+        If 'qid_out' is set, |x>|y> -> |x>|y XOR f(x)> is applied,
+        where x is on 'qid_in' and y is on 'qid_out', so any f into
+        0,...,2**len(qid_out)-1 is allowed. Amplitudes are moved in
+        one pass over the state, without any gate decomposition.
+
+        Examples
+        --------
+        >>> qs = QState(6).h(0).h(1).h(2)
+        >>> qs.apply_permutation(lambda x: (7 * x) % 8, qid_in=[0,1,2])
+        >>> qs.apply_permutation([pow(7, x, 8) for x in range(8)],
+        ...                      qid_in=[0,1,2], qid_out=[3,4,5])
+
+        """
+        qstate_apply_permutation(self, table=table, qid_in=qid_in, qid_out=qid_out)
+        return self
+
+    def apply_batch(self, qgates=None):
+        """
+        operate a sequence of quantum gates in one call.
+
+        Parameters
+        ----------
+        qgates : numpy.ndarray (dtype=qlazypy.util.QGATE_DTYPE), QComp, or list of dict
+            sequence of quantum gates. if QComp or its 'qcirc' list is
+            set, it must not include measurements and classically
+            controlled gates.
+
+        Returns
+        -------
+        self : instance of QState
+
+        Notes
+        -----
+        The whole sequence is operated by the C library at once, so
+        there is no overhead of python for each gate. Packing the
+        gates into numpy array (qlazypy.util.pack_qgates) once and
+        reusing it is the fastest way to operate the same sequence
+        many times. The state is not changed if any gate is invalid.
+
+        Examples
+        --------
+        >>> qc = QComp(2).h(0).cx(0,1)
+        >>> qs = QState(2).apply_batch(qc)
+        >>> qgates = pack_qgates(qc.qcirc)
+        >>> qs.apply_batch(qgates)
+
+        """
+        if hasattr(qgates, 'qcirc'):
+            qgates = qgates.qcirc
+        qstate_operate_qgate_batch(self, qgates=qgates)
+        return self
+
     def __schmidt_decomp(self, qid_0=[], qid_1=[]):
 
         vec = self.get_amp(qid=qid_0+qid_1)
@@ -1317,7 +1555,7 @@ class QState(ctypes.Structure):
         self : instance of QState
 
         """
-        self.cxr(q1,q2).cx(q0,q1).cxr_dg(q1,q2).cx(q0,q1).cxr(q0,q2)
+        qstate_mcx(self, [q0,q1,q2])
         return self
 
     def csw(self, q0, q1, q2):
@@ -1360,6 +1598,93 @@ class QState(ctypes.Structure):
         qstate_mcx(self, qid)
         return self
     
+    def qft(self, qid=None, inverse=False):
+        """
+        quantum fourier transform on the register.
+
+        Parameters
+        ----------
+        qid : list of int, default None
+            qubit id list of the register (qid[0] is the most
+            significant bit). if None, all qubits are selected.
+        inverse : bool, default False
+            operate inverse quantum fourier transform if True.
+
+        Returns
+        -------
+        self : instance of QState
+
+        Notes
+        -----
+        |x> -> 1/sqrt(N) sum_y exp(2*pi*i*x*y/N) |y> (N = 2**len(qid)),
+        including the final swaps of the qubits. The transform is
+        computed as FFT along the register, so the cost is proportional
+        to len(qid) passes over the state, instead of len(qid)**2 passes
+        of the H and CP gate sequence.
+
+        """
+        qstate_qft(self, qid=qid, inverse=inverse)
+        return self
+
+    def phase_oracle(self, mask=None, qid=None):
+        """
+        phase oracle (flip the sign of the marked basis states).
+
+        Parameters
+        ----------
+        mask : numpy.ndarray, list of bool or function
+            marked basis integers of the register, as a mask
+            (mask[x] = True if x is marked) or a function that takes
+            numpy array of the integers and returns the mask
+            (vectorized predicate).
+        qid : list of int, default None
+            qubit id list of the register (qid[0] is the most
+            significant bit). if None, all qubits are selected.
+
+        Returns
+        -------
+        self : instance of QState
+
+        Notes
+        -----
+        |x> -> -|x> for the marked x, in one pass over the state
+        regardless of the number of the marked states.
+
+        Examples
+        --------
+        >>> qs = QState(4).h(0).h(1).h(2).h(3)
+        >>> qs.phase_oracle(lambda x: x == 5).diffuse()
+
+        """
+        qstate_phase_oracle(self, mask=mask, qid=qid)
+        return self
+
+    def diffuse(self, qid=None):
+        """
+        grover diffusion (inversion about the mean).
+
+        Parameters
+        ----------
+        qid : list of int, default None
+            qubit id list of the register. if None, all qubits are
+            selected.
+
+        Returns
+        -------
+        self : instance of QState
+
+        Notes
+        -----
+        2|s><s| - I (|s> is the uniform superposition of the register)
+        is applied, that is, each amplitude a_x of the register is
+        replaced with 2 * mean - a_x. This is equal to the H, X and
+        multi-controlled Z gate sequence of the diffusion operator
+        (up to global phase), and costs two passes over the state.
+
+        """
+        qstate_diffuse(self, qid=qid)
+        return self
+
     # measurement
     
     def m(self, qid=None, shots=DEF_SHOTS, angle=0.0, phase=0.0, tag=None):
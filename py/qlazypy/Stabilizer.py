@@ -45,6 +45,7 @@ class Stabilizer(ctypes.Structure):
         ('qubit_num', ctypes.c_int),
         ('pauli_factor', ctypes.c_void_p),
         ('check_matrix', ctypes.c_void_p),
+        ('rand', ctypes.c_uint64*4),
     ]
 
     def __new__(cls, qubit_num=None, gene_num=None, seed=None):
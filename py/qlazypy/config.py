@@ -19,6 +19,9 @@ DEF_TAG = 'DEFAULT'
 DEF_PHASE  = 0.0
 DEF_ANGLE  = 0.0
 
+MAX_KRYLOV_DIM = 30
+DEF_KRYLOV_TOL = 1.0e-8
+
 BELL_PHI_PLUS  = 0
 BELL_PHI_MINUS = 3
 BELL_PSI_PLUS  = 1
@@ -98,3 +101,60 @@ REAL_PLUS  = 0
 IMAG_PLUS  = 1
 REAL_MINUS = 2
 IMAG_MINUS = 3
+
+# Parallel execution
+
+def set_num_threads(num):
+    """
+    set number of threads for the parallel state vector kernels.
+
+    Parameters
+    ----------
+    num : int
+        number of threads (>= 1).
+
+    Returns
+    -------
+    None
+
+    Notes
+    -----
+    This setting is effective only if the library 'libqlz' is built
+    with OpenMP (cmake -DUSE_OPENMP=ON). If not called, environment
+    variable 'QLAZY_NUM_THREADS' is used (default: all cores).
+    Qstates less than 14 qubits are always processed serially.
+
+    """
+    import ctypes
+    from qlazypy.error import Config_Error_SetNumThreads
+    from qlazypy.util import get_lib_ext
+
+    lib = ctypes.CDLL('libqlz.'+get_lib_ext(),mode=ctypes.RTLD_GLOBAL)
+    lib.qlazy_set_num_threads.restype = ctypes.c_bool
+    lib.qlazy_set_num_threads.argtypes = [ctypes.c_int]
+    ret = lib.qlazy_set_num_threads(ctypes.c_int(num))
+
+    if ret == FALSE:
+        raise Config_Error_SetNumThreads()
+
+def get_num_threads():
+    """
+    get number of threads for the parallel state vector kernels.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    num : int
+        number of threads.
+
+    """
+    import ctypes
+    from qlazypy.util import get_lib_ext
+
+    lib = ctypes.CDLL('libqlz.'+get_lib_ext(),mode=ctypes.RTLD_GLOBAL)
+    lib.qlazy_get_num_threads.restype = ctypes.c_int
+    lib.qlazy_get_num_threads.argtypes = []
+    return lib.qlazy_get_num_threads()
@@ -58,6 +58,10 @@ class QState_Error_Expect(Exception):
     def __str__(self):
         return "QState: fail to expect"
 
+class QState_Error_ExpectGradient(Exception):
+    def __str__(self):
+        return "QState: fail to get gradient of expectation value"
+
 class QState_Error_Apply(Exception):
     def __str__(self):
         return "QState: fail to apply"
@@ -98,6 +102,10 @@ class Observable_Error_Initialize(Exception):
     def __str__(self):
         return "Observable: fail to initialize"
 
+class Observable_Error_GroundState(Exception):
+    def __str__(self):
+        return "Observable: fail to get ground state"
+
 # DensOp
 
 class DensOp_Error_Initialize(Exception):
@@ -253,3 +261,9 @@ class QComp_Error_NumberOfClassicalReg(Exception):
 class Backend_Error_NameNotSupported(Exception):
     def __str__(self):
         return "Backend: name is not supported"
+
+# Config
+
+class Config_Error_SetNumThreads(Exception):
+    def __str__(self):
+        return "Config: fail to set number of threads"
@@ -13,8 +13,19 @@ from qlazypy.DensOp import DensOp
 lib = ctypes.CDLL('libqlz.'+get_lib_ext(),mode=ctypes.RTLD_GLOBAL)
 libc = ctypes.CDLL(find_library("c"),mode=ctypes.RTLD_GLOBAL)
 
+# prototypes of the functions called for every gate are set once here
+QubitIdArray = ctypes.c_int * MAX_QUBIT_NUM
+
+lib.densop_operate_qgate.restype = ctypes.c_int
+lib.densop_operate_qgate.argtypes = [ctypes.POINTER(DensOp), ctypes.c_int,
+                                     ctypes.c_double, ctypes.c_double,
+                                     ctypes.c_double, QubitIdArray]
+
 def densop_init(qstate=[], prob=[]):
         
+    for qs in qstate:
+        qs.flush()
+
     num = len(qstate)
 
     densop = None
@@ -46,26 +57,15 @@ def densop_init_with_matrix(matrix=None):
     densop = None
     c_densop = ctypes.c_void_p(densop)
 
-    row = len(matrix)
+    mat = get_complex_array(matrix)
+    row = len(mat)
     col = row
-    size = row * col
-
-    mat_complex = list(matrix.flatten())
-    mat_real = [0.0 for _ in range(size)]
-    mat_imag = [0.0 for _ in range(size)]
-    for i in range(size):
-        mat_real[i] = mat_complex[i].real
-        mat_imag[i] = mat_complex[i].imag
-                
-    DoubleArray = ctypes.c_double * size
-    c_mat_real = DoubleArray(*mat_real)
-    c_mat_imag = DoubleArray(*mat_imag)
             
     lib.densop_init_with_matrix.restype = ctypes.c_int
-    lib.densop_init_with_matrix.argtypes = [DoubleArray, DoubleArray,
+    lib.densop_init_with_matrix.argtypes = [ctypes.c_void_p,
                                             ctypes.c_int, ctypes.c_int,
                                             ctypes.POINTER(ctypes.c_void_p)]
-    ret = lib.densop_init_with_matrix(c_mat_real, c_mat_imag,
+    ret = lib.densop_init_with_matrix(mat.ctypes.data,
                                       ctypes.c_int(row), ctypes.c_int(col),
                                       c_densop)
         
@@ -80,28 +80,14 @@ def densop_init_with_matrix(matrix=None):
 def densop_get_elm(de):
 
     try:
-        elm = None
-        c_elm = ctypes.c_void_p(elm)
-
-        lib.densop_get_elm.restype = ctypes.c_int
-        lib.densop_get_elm.argtypes = [ctypes.POINTER(DensOp),
-                                           ctypes.POINTER(ctypes.c_void_p)]
-        ret = lib.densop_get_elm(ctypes.byref(de), c_elm)
-
-        if ret == FALSE:
+        if de.elm is None:
             raise DensOp_Error_GetElm()
-            
-        o = ctypes.cast(c_elm.value, ctypes.POINTER(ctypes.c_double))
 
         size = de.row * de.col
-        out = [0] * size
-        for i in range(size):
-            out[i] = complex(round(o[2*i],8),round(o[2*i+1],8))
+        o = ctypes.cast(de.elm, ctypes.POINTER(ctypes.c_double))
+        elm = np.ctypeslib.as_array(o, shape=(2*size,)).view(np.complex128)
 
-        libc.free.argtypes = [ctypes.POINTER(ctypes.c_double)]
-        libc.free(o)
-
-        return np.array(out).reshape([de.row, de.col])
+        return np.round(elm, 8).reshape([de.row, de.col])
 
     except Exception:
         raise DensOp_Error_GetElm()
@@ -334,31 +320,18 @@ def densop_apply_matrix(de, matrix=None, qid=[], dire='both'):
         IntArray = ctypes.c_int * MAX_QUBIT_NUM
         qid_array = IntArray(*qubit_id)
 
-        row = len(matrix) # dimension of the unitary matrix
+        mat = get_complex_array(matrix)
+        row = len(mat) # dimension of the unitary matrix
         col = row
-        size = row * col
-
-        # set array of matrix
-        mat_complex = list(matrix.flatten())
-        mat_real = [0.0 for _ in range(size)]
-        mat_imag = [0.0 for _ in range(size)]
-        for i in range(size):
-            mat_real[i] = mat_complex[i].real
-            mat_imag[i] = mat_complex[i].imag
-                
-        DoubleArray = ctypes.c_double * size
-        c_mat_real = DoubleArray(*mat_real)
-        c_mat_imag = DoubleArray(*mat_imag)
-            
+
         lib.densop_apply_matrix.restype = ctypes.c_int
         lib.densop_apply_matrix.argtypes = [ctypes.POINTER(DensOp),
                                             ctypes.c_int, IntArray,
-                                            ctypes.c_int,
-                                            DoubleArray, DoubleArray,
+                                            ctypes.c_int, ctypes.c_void_p,
                                             ctypes.c_int, ctypes.c_int]
         ret = lib.densop_apply_matrix(ctypes.byref(de),
                                       ctypes.c_int(qubit_num), qid_array,
-                                      ctypes.c_int(adire), c_mat_real, c_mat_imag,
+                                      ctypes.c_int(adire), mat.ctypes.data,
                                       ctypes.c_int(row), ctypes.c_int(col))
 
         if ret == FALSE:
@@ -393,34 +366,22 @@ def densop_probability(de, matrix=None, qid=[], matrix_type=None):
         IntArray = ctypes.c_int * MAX_QUBIT_NUM
         qid_array = IntArray(*qubit_id)
 
-        row = len(matrix) # dimension of the unitary matrix
+        mat = get_complex_array(matrix)
+        row = len(mat) # dimension of the unitary matrix
         col = row
-        size = row * col
-
-        # set array of matrix
-        mat_complex = list(matrix.flatten())
-        mat_real = [0.0 for _ in range(size)]
-        mat_imag = [0.0 for _ in range(size)]
-        for i in range(size):
-            mat_real[i] = mat_complex[i].real
-            mat_imag[i] = mat_complex[i].imag
-                
-        DoubleArray = ctypes.c_double * size
-        c_mat_real = DoubleArray(*mat_real)
-        c_mat_imag = DoubleArray(*mat_imag)
-            
+
         prob = 0.0
         c_prob = ctypes.c_double(prob)
 
         lib.densop_probability.restype = ctypes.c_int
         lib.densop_probability.argtypes = [ctypes.POINTER(DensOp),
                                            ctypes.c_int, IntArray,
-                                           ctypes.c_int, DoubleArray, DoubleArray,
+                                           ctypes.c_int, ctypes.c_void_p,
                                            ctypes.c_int, ctypes.c_int,
                                            ctypes.POINTER(ctypes.c_double)]
         ret = lib.densop_probability(ctypes.byref(de),
                                      ctypes.c_int(qubit_num), qid_array,
-                                     ctypes.c_int(mtype), c_mat_real, c_mat_imag,
+                                     ctypes.c_int(mtype), mat.ctypes.data,
                                      ctypes.c_int(row), ctypes.c_int(col),
                                      ctypes.byref(c_prob))
 
@@ -441,23 +402,65 @@ def densop_operate_qgate(de, kind=None, qid=None,
     densop_check_args(de, kind=kind, qid=qid, shots=None, angle=None,
                       phase=phase, phase1=phase1, phase2=phase2)
 
-    qubit_id = [0 for _ in range(MAX_QUBIT_NUM)]
-    for i in range(len(qid)):
-        qubit_id[i] = qid[i]
-    IntArray = ctypes.c_int * MAX_QUBIT_NUM
-    qid_array = IntArray(*qubit_id)
+    ret = lib.densop_operate_qgate(ctypes.byref(de), kind, phase, phase1, phase2,
+                                   QubitIdArray(*qid))
 
-    lib.densop_operate_qgate.restype = ctypes.c_int
-    lib.densop_operate_qgate.argtypes = [ctypes.POINTER(DensOp), ctypes.c_int,
-                                         ctypes.c_double, ctypes.c_double,
-                                         ctypes.c_double, IntArray]
-    ret = lib.densop_operate_qgate(ctypes.byref(de), ctypes.c_int(kind),
-                                   ctypes.c_double(phase), ctypes.c_double(phase1),
-                                   ctypes.c_double(phase2), qid_array)
+    if ret == FALSE:
+        raise DensOp_Error_OperateQGate()
+
+def densop_operate_mcu(de, qid=None, matrix=None):
+
+    # multi-controlled 2x2 gate (qid = [control, ... , control, target])
+    qubit_num = int(math.log2(de.row))
+    if qid is None or len(qid) < 1 or len(qid) > qubit_num:
+        raise DensOp_Error_OperateQGate()
+
+    mat = get_complex_array(matrix)
+    if mat.shape != (2,2):
+        raise DensOp_Error_OperateQGate()
+
+    lib.densop_operate_mcu.restype = ctypes.c_int
+    lib.densop_operate_mcu.argtypes = [ctypes.POINTER(DensOp), ctypes.c_int,
+                                       QubitIdArray, ctypes.c_void_p]
+    ret = lib.densop_operate_mcu(ctypes.byref(de), ctypes.c_int(len(qid)),
+                                 QubitIdArray(*qid), mat.ctypes.data)
 
     if ret == FALSE:
         raise DensOp_Error_OperateQGate()
 
+def densop_mcx(de, qid=[]):
+
+    # multi-controlled X gate (native kernel, no decomposition)
+    densop_operate_mcu(de, qid=qid, matrix=[[0.0, 1.0], [1.0, 0.0]])
+
+def densop_operate_qgate_batch(de, qgates=None):
+
+    if qgates is None:
+        raise DensOp_Error_OperateQGate()
+
+    # list of gate dicts -> packed array
+    if not isinstance(qgates, np.ndarray):
+        for c in qgates:
+            if c.get('ctrl') is not None:
+                raise DensOp_Error_OperateQGate()
+        qgates = pack_qgates(qgates)
+
+    try:
+        qgates = np.ascontiguousarray(qgates, dtype=QGATE_DTYPE)
+        gate_num = len(qgates)
+
+        lib.densop_operate_qgate_batch.restype = ctypes.c_int
+        lib.densop_operate_qgate_batch.argtypes = [ctypes.POINTER(DensOp), ctypes.c_int,
+                                                 ctypes.c_void_p]
+        ret = lib.densop_operate_qgate_batch(ctypes.byref(de), ctypes.c_int(gate_num),
+                                           qgates.ctypes.data)
+
+        if ret == FALSE:
+            raise DensOp_Error_OperateQGate()
+
+    except Exception:
+        raise DensOp_Error_OperateQGate()
+
 def densop_free(de):
 
     lib.densop_free.argtypes = [ctypes.POINTER(DensOp)]
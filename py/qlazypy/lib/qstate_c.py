@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import ctypes
 from ctypes.util import find_library
+import weakref
 import numpy as np
 
 from qlazypy.config import *
@@ -14,10 +15,16 @@ from qlazypy.lib.mdata_c import *
 lib = ctypes.CDLL('libqlz.'+get_lib_ext(),mode=ctypes.RTLD_GLOBAL)
 libc = ctypes.CDLL(find_library("c"),mode=ctypes.RTLD_GLOBAL)
 
+# prototypes of the functions called for every gate are set once here
+QubitIdArray = ctypes.c_int * MAX_QUBIT_NUM
+
+lib.qstate_operate_qgate.restype = ctypes.c_int
+lib.qstate_operate_qgate.argtypes = [ctypes.POINTER(QState), ctypes.c_int,
+                                     ctypes.c_double, ctypes.c_double,
+                                     ctypes.c_double, QubitIdArray]
+
 def qstate_init(qubit_num=None, seed=None):
 
-    lib.init_qlazy(ctypes.c_int(seed))
-        
     qstate = None
     c_qstate = ctypes.c_void_p(qstate)
 
@@ -29,43 +36,49 @@ def qstate_init(qubit_num=None, seed=None):
         raise QState_Error_Initialize()
 
     out = ctypes.cast(c_qstate.value, ctypes.POINTER(QState))
+    qstate_set_seed(out.contents, seed)
         
     return out.contents
 
 
 def qstate_init_with_vector(vector=None, seed=None):
         
-    lib.init_qlazy(ctypes.c_int(seed))
-        
     qstate = None
     c_qstate = ctypes.c_void_p(qstate)
     
-    dim = len(vector)
-    vec_real = [0.0 for _ in range(dim)]
-    vec_imag = [0.0 for _ in range(dim)]
-    for i in range(dim):
-        vec_real[i] = vector[i].real
-        vec_imag[i] = vector[i].imag
-    
-    DoubleArray = ctypes.c_double * dim
-    c_vec_real = DoubleArray(*vec_real)
-    c_vec_imag = DoubleArray(*vec_imag)
+    vec = get_complex_array(vector).reshape(-1)
+    dim = len(vec)
     
     lib.qstate_init_with_vector.restype = ctypes.c_int
-    lib.qstate_init_with_vector.argtypes = [DoubleArray, DoubleArray, ctypes.c_int,
+    lib.qstate_init_with_vector.argtypes = [ctypes.c_void_p, ctypes.c_int,
                                             ctypes.POINTER(ctypes.c_void_p)]
-    ret = lib.qstate_init_with_vector(c_vec_real, c_vec_imag, ctypes.c_int(dim),
-                                      c_qstate)
+    ret = lib.qstate_init_with_vector(vec.ctypes.data, ctypes.c_int(dim), c_qstate)
     
     if ret == FALSE:
         raise QState_Error_Initialize()
     
     out = ctypes.cast(c_qstate.value, ctypes.POINTER(QState))
+    qstate_set_seed(out.contents, seed)
         
     return out.contents
 
+def qstate_set_seed(qs, seed=None):
+
+    # seed of the random number generator owned by the quantum state
+    if seed is None:
+        return
+
+    lib.qstate_set_seed.restype = ctypes.c_int
+    lib.qstate_set_seed.argtypes = [ctypes.POINTER(QState), ctypes.c_uint]
+    ret = lib.qstate_set_seed(ctypes.byref(qs), ctypes.c_uint(seed))
+
+    if ret == FALSE:
+        raise QState_Error_Initialize()
+
 
 def qstate_reset(qs, qid=None):
+
+    qstate_flush(qs)
     
     if qid is None or qid == []:
         qid = [i for i in range(qs.qubit_num)]
@@ -94,6 +107,8 @@ def qstate_reset(qs, qid=None):
     
 def qstate_print(qs, qid=None):
 
+    qstate_flush(qs)
+
     if qid is None or qid == []:
         qid = [i for i in range(qs.qubit_num)]
 
@@ -121,6 +136,8 @@ def qstate_print(qs, qid=None):
 
 def qstate_copy(qs):
 
+    qstate_flush(qs)
+
     try:
         qstate = None
         c_qstate = ctypes.c_void_p(qstate)
@@ -143,6 +160,8 @@ def qstate_copy(qs):
 
 def qstate_bloch(qs, q=0):
 
+    qstate_flush(qs)
+
     # error check
     qstate_check_args(qs, kind=BLOCH, shots=None, angle=None, qid=[q])
 
@@ -173,6 +192,9 @@ def qstate_bloch(qs, q=0):
 
 def qstate_inner_product(qs_0, qs_1):
 
+    qstate_flush(qs_0)
+    qstate_flush(qs_1)
+
     try:
             
         real = 0.0
@@ -202,6 +224,8 @@ def qstate_inner_product(qs_0, qs_1):
     
 def qstate_get_camp(qs, qid=None):
 
+    qstate_flush(qs)
+
     if qid is None or qid == []:
         qid = [i for i in range(qs.qubit_num)]
 
@@ -214,6 +238,17 @@ def qstate_get_camp(qs, qid=None):
         if qid[i] < 0:
             raise QState_OutOfBound()
 
+    # all qubits in order: one vectorized copy of the amplitudes
+    if qid == [i for i in range(qs.qubit_num)]:
+        o = ctypes.cast(qs.camp, ctypes.POINTER(ctypes.c_double))
+        out = np.ctypeslib.as_array(o, shape=(2*qs.state_num,)).view(np.complex128).copy()
+        norm = np.linalg.norm(out)
+        if norm == 0.0:
+            out[0] = 1.0
+        else:
+            out /= norm
+        return out
+
     try:
         qubit_num = len(qid)
         qubit_id = [0 for _ in range(MAX_QUBIT_NUM)]
@@ -236,9 +271,7 @@ def qstate_get_camp(qs, qid=None):
         o = ctypes.cast(c_camp.value, ctypes.POINTER(ctypes.c_double))
             
         state_num = (1 << len(qid))
-        out = [0] * state_num
-        for i in range(state_num):
-            out[i] = complex(o[2*i],o[2*i+1])
+        out = np.ctypeslib.as_array(o, shape=(2*state_num,)).view(np.complex128).copy()
 
         libc.free.argtypes = [ctypes.POINTER(ctypes.c_double)]
         libc.free(o)
@@ -246,11 +279,45 @@ def qstate_get_camp(qs, qid=None):
     except Exception:
         raise QState_Error_GetCmp()
 
-    return np.array(out)
+    return out
+
+
+def _free_camp(camp):
+
+    # free the state vector detached from a freed qstate
+    libc.free.argtypes = [ctypes.c_void_p]
+    libc.free(ctypes.c_void_p(camp))
+
+def qstate_amp_view(qs, readonly=False):
+
+    # a view of a lazy qstate would miss the queued gates (and writes to it would
+    # be applied before them), so it is not allowed
+    if qs._lazy_qgates is not None:
+        raise QState_Error_GetCmp()
+
+    if qs.camp is None:
+        raise QState_Error_GetCmp()
+
+    # all views of the qstate share one buffer object, which is tracked by a
+    # weak reference (qstate_free hands the memory over to the buffer if alive)
+    buf = qs._amp_buf() if qs._amp_buf is not None else None
+    if buf is None:
+        DoubleArray = ctypes.c_double * (2 * qs.state_num)
+        buf = DoubleArray.from_address(qs.camp)
+        qs._amp_buf = weakref.ref(buf)
+
+    view = np.frombuffer(buf, dtype=np.complex128)
+    if readonly == True:
+        view.flags.writeable = False
+
+    return view
 
 
 def qstate_tensor_product(qs, qstate):
 
+    qstate_flush(qs)
+    qstate_flush(qstate)
+
     try:
         qstate_out = None
         c_qstate_out = ctypes.c_void_p(qstate_out)
@@ -273,30 +340,114 @@ def qstate_tensor_product(qs, qstate):
         raise QState_Error_TensorProduct()
 
 
-def qstate_evolve(qs, observable=None, time=0.0, iter=0):
+def qstate_evolve(qs, observable=None, time=0.0, iter=0, order=1, tol=None):
+
+    qstate_flush(qs)
 
-    if iter < 1:
-        raise QState_Error_Evolve()
-        
     if observable is None:
         raise QState_Error_Evolve()
-        
+
+    if order not in (1, 2, 4):
+        raise QState_Error_Evolve()
+
+    if tol is None:
+
+        if iter < 1:
+            raise QState_Error_Evolve()
+
+        try:
+            lib.qstate_evolve.restype = ctypes.c_bool
+            lib.qstate_evolve.argtypes = [ctypes.POINTER(QState),ctypes.POINTER(Observable),
+                                          ctypes.c_double, ctypes.c_int, ctypes.c_int]
+            ret = lib.qstate_evolve(ctypes.byref(qs), ctypes.byref(observable),
+                                    ctypes.c_double(time), ctypes.c_int(iter),
+                                    ctypes.c_int(order))
+
+            if ret == FALSE:
+                raise QState_Error_Evolve()
+
+        except Exception:
+            raise QState_Error_Evolve()
+
+    else:
+
+        if tol <= 0.0:
+            raise QState_Error_Evolve()
+
+        try:
+            iter_inout = ctypes.c_int(iter)
+            lib.qstate_evolve_tolerance.restype = ctypes.c_bool
+            lib.qstate_evolve_tolerance.argtypes = [ctypes.POINTER(QState),
+                                                    ctypes.POINTER(Observable),
+                                                    ctypes.c_double, ctypes.c_int,
+                                                    ctypes.c_double,
+                                                    ctypes.POINTER(ctypes.c_int)]
+            ret = lib.qstate_evolve_tolerance(ctypes.byref(qs), ctypes.byref(observable),
+                                              ctypes.c_double(time), ctypes.c_int(order),
+                                              ctypes.c_double(tol), ctypes.byref(iter_inout))
+
+            if ret == FALSE:
+                raise QState_Error_Evolve()
+
+        except Exception:
+            raise QState_Error_Evolve()
+
+        iter = iter_inout.value
+
+    return iter
+
+def qstate_evolve_krylov(qs, observable=None, time=0.0, tol=DEF_KRYLOV_TOL):
+
+    qstate_flush(qs)
+
+    if observable is None or tol <= 0.0:
+        raise QState_Error_Evolve()
+
     try:
-        lib.qstate_evolve.restype = ctypes.c_int
-        lib.qstate_evolve.argtypes = [ctypes.POINTER(QState),ctypes.POINTER(Observable),
-                                      ctypes.c_double, ctypes.c_int]
-        ret = lib.qstate_evolve(ctypes.byref(qs), ctypes.byref(observable),
-                                ctypes.c_double(time), ctypes.c_int(iter))
+        lib.qstate_evolve_krylov.restype = ctypes.c_bool
+        lib.qstate_evolve_krylov.argtypes = [ctypes.POINTER(QState),
+                                             ctypes.POINTER(Observable),
+                                             ctypes.c_double, ctypes.c_double]
+        ret = lib.qstate_evolve_krylov(ctypes.byref(qs), ctypes.byref(observable),
+                                       ctypes.c_double(time), ctypes.c_double(tol))
 
         if ret == FALSE:
             raise QState_Error_Evolve()
-            
+
     except Exception:
         raise QState_Error_Evolve()
 
 
+def qstate_ground_state(qs, observable=None, tol=DEF_KRYLOV_TOL):
+
+    qstate_flush(qs)
+
+    if observable is None or tol <= 0.0:
+        raise Observable_Error_GroundState()
+
+    try:
+        energy = 0.0
+        c_energy = ctypes.c_double(energy)
+        lib.qstate_ground_state.restype = ctypes.c_bool
+        lib.qstate_ground_state.argtypes = [ctypes.POINTER(QState),
+                                            ctypes.POINTER(Observable),
+                                            ctypes.c_double,
+                                            ctypes.POINTER(ctypes.c_double)]
+        ret = lib.qstate_ground_state(ctypes.byref(qs), ctypes.byref(observable),
+                                      ctypes.c_double(tol), ctypes.byref(c_energy))
+
+        if ret == FALSE:
+            raise Observable_Error_GroundState()
+
+    except Exception:
+        raise Observable_Error_GroundState()
+
+    return c_energy.value
+
 def qstate_expect_value(qs, observable=None):
 
+    qstate_flush(qs)
+
     if observable is None:
         raise QState_Error_Expect()
         
@@ -324,8 +475,49 @@ def qstate_expect_value(qs, observable=None):
     return out
 
 
+def qstate_expect_gradient(qs, observable=None, qcirc=None):
+
+    qstate_flush(qs)
+
+    if observable is None or qcirc is None:
+        raise QState_Error_ExpectGradient()
+
+    gate_num = len(qcirc)
+    for c in qcirc:
+        if is_measurement_gate(c['kind']) or c.get('ctrl') is not None:
+            raise QState_Error_ExpectGradient()
+        qstate_check_args(qs, kind=c['kind'], qid=c['qid'])
+    qgates = pack_qgates(qcirc)
+
+    try:
+        c_val = ctypes.c_double(0.0)
+        DoubleArray = ctypes.c_double * (3 * max(gate_num, 1))
+        c_grad = DoubleArray()
+        c_grad_num = ctypes.c_int(0)
+        lib.qstate_expect_gradient.restype = ctypes.c_bool
+        lib.qstate_expect_gradient.argtypes = [ctypes.POINTER(QState),
+                                               ctypes.POINTER(Observable),
+                                               ctypes.c_int, ctypes.c_void_p,
+                                               ctypes.POINTER(ctypes.c_double),
+                                               DoubleArray, ctypes.POINTER(ctypes.c_int)]
+        ret = lib.qstate_expect_gradient(ctypes.byref(qs), ctypes.byref(observable),
+                                         ctypes.c_int(gate_num), qgates.ctypes.data,
+                                         ctypes.byref(c_val), c_grad,
+                                         ctypes.byref(c_grad_num))
+
+        if ret == FALSE:
+            raise QState_Error_ExpectGradient()
+
+    except Exception:
+        raise QState_Error_ExpectGradient()
+
+    return c_val.value, c_grad[:c_grad_num.value]
+
+
 def qstate_apply_matrix(qs, matrix=None, qid=None):
 
+    qstate_flush(qs)
+
     if matrix is None:
         raise QState_Error_Apply()
     if (matrix.shape[0] > qs.state_num or matrix.shape[0] > qs.state_num):
@@ -342,30 +534,17 @@ def qstate_apply_matrix(qs, matrix=None, qid=None):
         IntArray = ctypes.c_int * MAX_QUBIT_NUM
         qid_array = IntArray(*qubit_id)
 
-        row = len(matrix) # dimension of the unitary matrix
+        mat = get_complex_array(matrix)
+        row = len(mat) # dimension of the unitary matrix
         col = row
-        size = row * col
-
-        # set array of matrix
-        mat_complex = list(matrix.flatten())
-        mat_real = [0.0 for _ in range(size)]
-        mat_imag = [0.0 for _ in range(size)]
-        for i in range(size):
-            mat_real[i] = mat_complex[i].real
-            mat_imag[i] = mat_complex[i].imag
-                
-        DoubleArray = ctypes.c_double * size
-        c_mat_real = DoubleArray(*mat_real)
-        c_mat_imag = DoubleArray(*mat_imag)
-            
+
         lib.qstate_apply_matrix.restype = ctypes.c_int
         lib.qstate_apply_matrix.argtypes = [ctypes.POINTER(QState),
-                                            ctypes.c_int, IntArray,
-                                            DoubleArray, DoubleArray,
+                                            ctypes.c_int, IntArray, ctypes.c_void_p,
                                             ctypes.c_int, ctypes.c_int]
         ret = lib.qstate_apply_matrix(ctypes.byref(qs),
                                       ctypes.c_int(qubit_num), qid_array,
-                                      c_mat_real, c_mat_imag,
+                                      mat.ctypes.data,
                                       ctypes.c_int(row), ctypes.c_int(col))
 
         if ret == FALSE:
@@ -382,27 +561,106 @@ def qstate_operate_qgate(qs, kind=None, qid=None,
     qstate_check_args(qs, kind=kind, qid=qid, shots=None, angle=None,
                       phase=phase, phase1=phase1, phase2=phase2)
 
-    qubit_id = [0 for _ in range(MAX_QUBIT_NUM)]
-    for i in range(len(qid)):
-        qubit_id[i] = qid[i]
-    IntArray = ctypes.c_int * MAX_QUBIT_NUM
-    qid_array = IntArray(*qubit_id)
+    # lazy mode: queue the gate (operated by qstate_flush)
+    if qs._lazy_qgates is not None:
+        qs._lazy_qgates.append({'kind': kind, 'qid': list(qid), 'phase': phase,
+                                'phase1': phase1, 'phase2': phase2})
+        return
 
-    lib.qstate_operate_qgate.restype = ctypes.c_int
-    lib.qstate_operate_qgate.argtypes = [ctypes.POINTER(QState), ctypes.c_int,
-                                         ctypes.c_double, ctypes.c_double,
-                                         ctypes.c_double, IntArray]
-    ret = lib.qstate_operate_qgate(ctypes.byref(qs), ctypes.c_int(kind),
-                                   ctypes.c_double(phase), ctypes.c_double(phase1),
-                                   ctypes.c_double(phase2), qid_array)
+    ret = lib.qstate_operate_qgate(ctypes.byref(qs), kind, phase, phase1, phase2,
+                                   QubitIdArray(*qid))
 
     if ret == FALSE:
         raise QState_Error_OperateQgate()
 
+def qstate_operate_qgate_batch(qs, qgates=None):
+
+    qstate_flush(qs)
+
+    if qgates is None:
+        raise QState_Error_OperateQgate()
+
+    # list of gate dicts -> packed array
+    if not isinstance(qgates, np.ndarray):
+        for c in qgates:
+            if c.get('ctrl') is not None:
+                raise QState_Error_OperateQgate()
+        qgates = pack_qgates(qgates)
+
+    try:
+        qgates = np.ascontiguousarray(qgates, dtype=QGATE_DTYPE)
+        gate_num = len(qgates)
+
+        lib.qstate_operate_qgate_batch.restype = ctypes.c_int
+        lib.qstate_operate_qgate_batch.argtypes = [ctypes.POINTER(QState), ctypes.c_int,
+                                                 ctypes.c_void_p]
+        ret = lib.qstate_operate_qgate_batch(ctypes.byref(qs), ctypes.c_int(gate_num),
+                                           qgates.ctypes.data)
+
+        if ret == FALSE:
+            raise QState_Error_OperateQgate()
+
+    except Exception:
+        raise QState_Error_OperateQgate()
+
+
+
+def qstate_operate_qcirc(qs, qcirc, cmem, shots=DEF_SHOTS, workers=1):
+
+    # run the circuit 'shots' times in C, return measured values of the last measurement
+    qstate_flush(qs)
+
+    qgates = pack_qgates(qcirc)
+    cmem_array = np.array(cmem, dtype=np.int32)
+    mval = np.zeros(shots, dtype=np.int32)
+
+    try:
+        lib.qstate_operate_qcirc.restype = ctypes.c_int
+        lib.qstate_operate_qcirc.argtypes = [ctypes.POINTER(QState), ctypes.c_int,
+                                             ctypes.c_void_p, ctypes.c_int, ctypes.c_void_p,
+                                             ctypes.c_int, ctypes.c_int, ctypes.c_void_p]
+        ret = lib.qstate_operate_qcirc(ctypes.byref(qs), ctypes.c_int(len(qgates)),
+                                       qgates.ctypes.data, ctypes.c_int(len(cmem_array)),
+                                       cmem_array.ctypes.data, ctypes.c_int(shots),
+                                       ctypes.c_int(workers), mval.ctypes.data)
+
+        if ret == FALSE:
+            raise QState_Error_OperateQgate()
+
+    except Exception:
+        raise QState_Error_OperateQgate()
+
+    cmem[:] = cmem_array.tolist()
+
+    return mval
         
+def qstate_flush(qs):
+
+    # operate the gates queued in lazy mode (with gate fusion)
+    if not qs._lazy_qgates:
+        return
+
+    qgates = pack_qgates(qs._lazy_qgates)
+    qs._lazy_qgates = []
+
+    try:
+        lib.qstate_operate_qgate_fused.restype = ctypes.c_int
+        lib.qstate_operate_qgate_fused.argtypes = [ctypes.POINTER(QState), ctypes.c_int,
+                                                   ctypes.c_void_p]
+        ret = lib.qstate_operate_qgate_fused(ctypes.byref(qs), ctypes.c_int(len(qgates)),
+                                             qgates.ctypes.data)
+
+        if ret == FALSE:
+            raise QState_Error_OperateQgate()
+
+    except Exception:
+        raise QState_Error_OperateQgate()
+
 def qstate_measure(qs, MDATA_TABLE, qid=None, shots=DEF_SHOTS, angle=0.0, phase=0.0,
                    tag=None):
 
+    qstate_flush(qs)
+
     # global MDATA_TABLE
 
     if qid is None or qid == []:
@@ -455,6 +713,8 @@ def qstate_measure(qs, MDATA_TABLE, qid=None, shots=DEF_SHOTS, angle=0.0, phase=
 
 def qstate_measure_bell(qs, MDATA_TABLE, qid=None, shots=DEF_SHOTS, tag=None):
 
+    qstate_flush(qs)
+
     # global MDATA_TABLE
         
     if qid is None or qid == []:
@@ -505,41 +765,142 @@ def qstate_measure_bell(qs, MDATA_TABLE, qid=None, shots=DEF_SHOTS, tag=None):
 
 def qstate_free(qs):
 
+    # gates queued in lazy mode are discarded
+    if qs._lazy_qgates is not None:
+        qs._lazy_qgates = []
+
+    # if any view of the state vector is alive, the memory is detached from the
+    # qstate and freed when the last view is garbage collected
+    buf = qs._amp_buf() if qs._amp_buf is not None else None
+    if buf is not None and qs.camp is not None:
+        weakref.finalize(buf, _free_camp, qs.camp)
+        qs.camp = None
+    qs._amp_buf = None
+
     lib.qstate_free.argtypes = [ctypes.POINTER(QState)]
     lib.qstate_free(ctypes.byref(qs))
 
 
+def qstate_operate_mcu(qs, qid=None, matrix=None):
+
+    # multi-controlled 2x2 gate (qid = [control, ... , control, target])
+    qstate_flush(qs)
 
-def __gray_code(qs, n):
+    if qid is None or len(qid) < 1 or len(qid) > qs.qubit_num:
+        raise QState_Error_OperateQgate()
 
-    for k in range(2**n):
-        yield k^(k>>1)
+    mat = get_complex_array(matrix)
+    if mat.shape != (2,2):
+        raise QState_Error_OperateQgate()
 
-def qstate_mcx(qs,qid=[]):
+    lib.qstate_operate_mcu.restype = ctypes.c_int
+    lib.qstate_operate_mcu.argtypes = [ctypes.POINTER(QState), ctypes.c_int,
+                                       QubitIdArray, ctypes.c_void_p]
+    ret = lib.qstate_operate_mcu(ctypes.byref(qs), ctypes.c_int(len(qid)),
+                                 QubitIdArray(*qid), mat.ctypes.data)
 
-    # controled and target register
-    qid_ctr = qid[:-1]
-    qid_tar = qid[-1]
-        
-    # hadamard
-    qs.h(qid_tar)
-
-    # controlled-RZ(psi), psi=pi/(2**(bitnum-1))
-    bitnum = len(qid_ctr)
-    psi = 1.0/(2**(bitnum-1)) # unit=pi(radian)
-    gray_pre = 0
-    for gray in __gray_code(qs,bitnum):
-        if gray == 0:
-            continue
-        msb = len(str(bin(gray)))-3
-        chb = len(str(bin(gray^gray_pre)))-3
-        if gray != 1:
-            if chb == msb:
-                chb -= 1
-            qs.cx(qid_ctr[chb],qid_ctr[msb])
-        qs.cp(qid_ctr[msb],qid_tar,phase=psi)
-        psi = -psi
-        gray_pre = gray
-    
-    # hadamard
-    qs.h(qid_tar)
+    if ret == FALSE:
+        raise QState_Error_OperateQgate()
+
+def qstate_mcx(qs, qid=[]):
+
+    # multi-controlled X gate (native kernel, no decomposition)
+    qstate_operate_mcu(qs, qid=qid, matrix=[[0.0, 1.0], [1.0, 0.0]])
+
+def qstate_qft(qs, qid=None, inverse=False):
+
+    # quantum fourier transform on the register qid (qid[0] = MSB)
+    qstate_flush(qs)
+
+    if qid is None:
+        qid = list(range(qs.qubit_num))
+    if len(qid) < 1 or len(qid) > qs.qubit_num:
+        raise QState_Error_OperateQgate()
+
+    lib.qstate_qft.restype = ctypes.c_int
+    lib.qstate_qft.argtypes = [ctypes.POINTER(QState), ctypes.c_int,
+                               QubitIdArray, ctypes.c_bool]
+    ret = lib.qstate_qft(ctypes.byref(qs), ctypes.c_int(len(qid)),
+                         QubitIdArray(*qid), ctypes.c_bool(inverse))
+
+    if ret == FALSE:
+        raise QState_Error_OperateQgate()
+
+def qstate_apply_permutation(qs, table=None, qid_in=None, qid_out=None):
+
+    # classical reversible function (permutation of the basis states)
+    qstate_flush(qs)
+
+    if qid_in is None:
+        qid_in = list(range(qs.qubit_num))
+    if qid_out is None:
+        qid_out = []
+    if len(qid_in) < 1 or len(qid_in) + len(qid_out) > qs.qubit_num:
+        raise QState_Error_Apply()
+
+    dim = 2**len(qid_in)
+    if callable(table):
+        table = table(np.arange(dim))
+    tab = np.asarray(table)
+    if tab.shape != (dim,) or tab.dtype.kind not in 'biu':
+        raise QState_Error_Apply()
+    if tab.min() < 0 or tab.max() >= 2**len(qid_out or qid_in):
+        raise QState_Error_Apply()
+    tab = np.ascontiguousarray(tab, dtype=np.int32)
+
+    lib.qstate_apply_permutation.restype = ctypes.c_int
+    lib.qstate_apply_permutation.argtypes = [ctypes.POINTER(QState),
+                                             ctypes.c_int, QubitIdArray,
+                                             ctypes.c_int, QubitIdArray,
+                                             ctypes.c_void_p]
+    ret = lib.qstate_apply_permutation(ctypes.byref(qs),
+                                       ctypes.c_int(len(qid_in)), QubitIdArray(*qid_in),
+                                       ctypes.c_int(len(qid_out)), QubitIdArray(*qid_out),
+                                       tab.ctypes.data)
+
+    if ret == FALSE:
+        raise QState_Error_Apply()
+
+def qstate_phase_oracle(qs, mask=None, qid=None):
+
+    # phase oracle (sign flip of the marked basis states of the register)
+    qstate_flush(qs)
+
+    if qid is None:
+        qid = list(range(qs.qubit_num))
+    if len(qid) < 1 or len(qid) > qs.qubit_num:
+        raise QState_Error_OperateQgate()
+
+    dim = 2**len(qid)
+    if callable(mask):
+        mask = mask(np.arange(dim))
+    msk = np.asarray(mask)
+    if msk.shape != (dim,) or msk.dtype.kind not in 'biu':
+        raise QState_Error_OperateQgate()
+    msk = np.ascontiguousarray(msk != 0, dtype=np.int32)
+
+    lib.qstate_phase_oracle.restype = ctypes.c_int
+    lib.qstate_phase_oracle.argtypes = [ctypes.POINTER(QState), ctypes.c_int,
+                                        QubitIdArray, ctypes.c_void_p]
+    ret = lib.qstate_phase_oracle(ctypes.byref(qs), ctypes.c_int(len(qid)),
+                                  QubitIdArray(*qid), msk.ctypes.data)
+
+    if ret == FALSE:
+        raise QState_Error_OperateQgate()
+
+def qstate_diffuse(qs, qid=None):
+
+    # grover diffusion (inversion about the mean) on the register
+    qstate_flush(qs)
+
+    if qid is None:
+        qid = list(range(qs.qubit_num))
+    if len(qid) < 1 or len(qid) > qs.qubit_num:
+        raise QState_Error_OperateQgate()
+
+    lib.qstate_diffuse.restype = ctypes.c_int
+    lib.qstate_diffuse.argtypes = [ctypes.POINTER(QState), ctypes.c_int, QubitIdArray]
+    ret = lib.qstate_diffuse(ctypes.byref(qs), ctypes.c_int(len(qid)), QubitIdArray(*qid))
+
+    if ret == FALSE:
+        raise QState_Error_OperateQgate()
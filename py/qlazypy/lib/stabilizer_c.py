@@ -10,10 +10,13 @@ from qlazypy.util import *
 lib = ctypes.CDLL('libqlz.'+get_lib_ext(),mode=ctypes.RTLD_GLOBAL)
 libc = ctypes.CDLL(find_library("c"),mode=ctypes.RTLD_GLOBAL)
 
+# prototypes of the functions called for every gate are set once here
+lib.stabilizer_operate_qgate.restype = ctypes.c_int
+lib.stabilizer_operate_qgate.argtypes = [ctypes.POINTER(Stabilizer), ctypes.c_int,
+                                         ctypes.c_int, ctypes.c_int]
+
 def stabilizer_init(gene_num=None, qubit_num=None, seed=None):
 
-    lib.init_qlazy(ctypes.c_int(seed))
-    
     stab = None
     c_stab = ctypes.c_void_p(stab)
         
@@ -115,11 +118,7 @@ def stabilizer_get_pauli_op(sb, gene_id=None, qubit_id=None):
 
 def stabilizer_operate_qgate(sb, kind=None, q0=None, q1=None):
 
-    lib.stabilizer_operate_qgate.restype = ctypes.c_int
-    lib.stabilizer_operate_qgate.argtypes = [ctypes.POINTER(Stabilizer), ctypes.c_int,
-                                             ctypes.c_int, ctypes.c_int]
-    ret = lib.stabilizer_operate_qgate(ctypes.byref(sb), ctypes.c_int(kind),
-                                       ctypes.c_int(q0), ctypes.c_int(q1))
+    ret = lib.stabilizer_operate_qgate(ctypes.byref(sb), kind, q0, q1)
     
     if ret == FALSE:
         raise Stabilizer_Error_OperateQgate()
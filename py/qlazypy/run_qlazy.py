@@ -1,12 +1,14 @@
 # -*- coding: utf-8 -*-
 from collections import Counter
 
+import numpy as np
+
 from qlazypy.error import *
 from qlazypy.config import *
 from qlazypy.lib.qstate_c import *
 from qlazypy.lib.stabilizer_c import *
 
-def run_qlazy_qstate_simulator(qstate, qcirc, cmem, shots=DEF_SHOTS):
+def run_qlazy_qstate_simulator(qstate, qcirc, cmem, shots=DEF_SHOTS, workers=1):
 
     # number of measurement (measurement_cnt)
     # and its position of last measurement (end_of_measurements)
@@ -17,42 +19,42 @@ def run_qlazy_qstate_simulator(qstate, qcirc, cmem, shots=DEF_SHOTS):
             measurement_cnt += 1
             end_of_measurements = j
 
-    # qcirc have only one measurement at the end, or not
-    if measurement_cnt == 1 and end_of_measurements == len(qcirc) - 1:
-        only_one_measurement_end = True
-    else:
-        only_one_measurement_end = False
+    # all measurements are at the end and no gate is classically controlled, or not
+    first_of_measurements = len(qcirc) - measurement_cnt
+    terminal_measurements = (all(c['kind'] == MEASURE for c in qcirc[first_of_measurements:])
+                             and all(c['ctrl'] == None for c in qcirc))
 
     # run the quantum circuit
     freq = Counter()
-    for cnt in range(shots):
-        for i, c in enumerate(qcirc):
-            if c['kind'] == MEASURE:
-                md = qstate_measure(qstate, {}, qid=c['qid'], shots=1, angle=0.0, phase=0.0, tag=None)
-
+    if terminal_measurements == False:
+        # the whole shots loop runs in C
+        mval = qstate_operate_qcirc(qstate, qcirc, cmem, shots=shots, workers=workers)
+        if end_of_measurements >= 0:
+            digits = len(qcirc[end_of_measurements]['qid'])
+            values, counts = np.unique(mval, return_counts=True)
+            for v, n in zip(values, counts):
+                freq['{:0{digits}b}'.format(v, digits=digits)] = int(n)
+    else:
+        # operate the gates once, and sample all measured qubits jointly 'shots' times
+        qstate_operate_qgate_batch(qstate, qcirc[:first_of_measurements])
+        if measurement_cnt > 0:
+            mes_qid = []
+            for c in qcirc[first_of_measurements:]:
+                mes_qid += [q for q in c['qid'] if q not in mes_qid]
+            pos = {q: k for k, q in enumerate(mes_qid)}
+            md = qstate_measure(qstate, {}, qid=mes_qid, shots=shots, angle=0.0, phase=0.0,
+                                tag=None)
+
+            # frequency of the last measurement (marginal of the joint frequency)
+            last_qid = qcirc[end_of_measurements]['qid']
+            for mes, n in md.frequency.items():
+                freq[''.join(mes[pos[q]] for q in last_qid)] += n
+
+            # classical memory (measured values of the last shot)
+            for c in qcirc[first_of_measurements:]:
                 if c['cid'] != None:
-                    for k,mval in enumerate(list(md.last)):
-                        cmem[c['cid'][k]] = int(mval)
-                        
-                if end_of_measurements == i:
-                    freq += md.frequency
-            else:
-                if c['ctrl'] == None or cmem[c['ctrl']] == 1:
-                    qstate_operate_qgate(qstate, kind=c['kind'], qid=c['qid'],
-                                         phase=c['phase'], phase1=c['phase1'], phase2=c['phase2'])
-
-            # qcirc have only one measurement
-            if only_one_measurement_end == True and i == len(qcirc) - 2:
-                md = qstate_measure(qstate, {}, qid=c['qid'], shots=shots, angle=0.0, phase=0.0, tag=None)
-                freq = md.frequency
-                break
-        if only_one_measurement_end == True:
-            break
-        
-        # reset classical memory and qubits, if not end of the shots
-        if cnt < shots-1:
-            cmem = [0] * len(cmem)
-            qstate.reset()
+                    for k, q in enumerate(c['qid']):
+                        cmem[c['cid'][k]] = int(md.last[pos[q]])
 
     if end_of_measurements > 0:
         measured_qid = qcirc[end_of_measurements]['qid']
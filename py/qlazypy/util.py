@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 import math
+import numpy as np
 from qlazypy.error import *
 from qlazypy.config import *
 
@@ -11,6 +12,39 @@ def get_lib_ext():
     else:
         return 'so'
 
+def get_complex_array(array):
+
+    # contiguous complex128 array whose buffer can be handed to C as COMPLEX*
+    # (no copy if the array is already contiguous complex128)
+    return np.ascontiguousarray(array, dtype=np.complex128)
+
+# packed gate record (same memory layout as 'QGate' in c/qlazy.h)
+QGATE_DTYPE = np.dtype([('kind', np.int32),
+                        ('phase', np.float64), ('phase1', np.float64), ('phase2', np.float64),
+                        ('qubit_num', np.int32), ('qid', np.int32, (MAX_QUBIT_NUM,)),
+                        ('ctrl', np.int32), ('cid', np.int32, (MAX_QUBIT_NUM,))],
+                       align=True)
+
+def pack_qgates(qcirc):
+
+    # list of gate dicts ('kind','qid','phase','phase1','phase2','ctrl','cid') -> packed array
+    qgates = np.zeros(len(qcirc), dtype=QGATE_DTYPE)
+    qgates['ctrl'] = [-1 if c.get('ctrl') is None else c['ctrl'] for c in qcirc]
+    qgates['cid'] = -1
+    qgates['kind'] = [c['kind'] for c in qcirc]
+    qgates['phase'] = [c.get('phase', DEF_PHASE) for c in qcirc]
+    qgates['phase1'] = [c.get('phase1', DEF_PHASE) for c in qcirc]
+    qgates['phase2'] = [c.get('phase2', DEF_PHASE) for c in qcirc]
+    qgates['qubit_num'] = [len(c['qid']) for c in qcirc]
+    for qnum in set(qgates['qubit_num']):
+        idx = np.flatnonzero(qgates['qubit_num'] == qnum)
+        qgates['qid'][idx, :qnum] = [qcirc[i]['qid'] for i in idx]
+    for i, c in enumerate(qcirc):
+        if c.get('cid') is not None:
+            qgates['cid'][i, :len(c['cid'])] = c['cid']
+
+    return qgates
+
 def qstate_check_args(qs, kind=None, qid=None, shots=None, angle=None,
                       phase=None, phase1=None, phase2=None):
     
@@ -135,26 +169,24 @@ def densop_check_args(de, kind=None, qid=None, shots=None, angle=None,
         else:
             return True
 
+# number of qubits for each gate kind (0 if any number)
+QGATE_QUBIT_NUM = {}
+QGATE_QUBIT_NUM.update((k, 0) for k in (SHOW, MEASURE, MEASURE_X, MEASURE_Y, MEASURE_Z))
+QGATE_QUBIT_NUM.update((k, 1) for k in (
+    BLOCH, PAULI_X, PAULI_Y, PAULI_Z, ROOT_PAULI_X, ROOT_PAULI_X_, HADAMARD,
+    PHASE_SHIFT_S, PHASE_SHIFT_S_, PHASE_SHIFT_T, PHASE_SHIFT_T_, PHASE_SHIFT,
+    ROTATION_X, ROTATION_Y, ROTATION_Z, ROTATION_U1, ROTATION_U2, ROTATION_U3))
+QGATE_QUBIT_NUM.update((k, 2) for k in (
+    CONTROLLED_X, CONTROLLED_Y, CONTROLLED_Z, CONTROLLED_XR, CONTROLLED_XR_,
+    CONTROLLED_H, CONTROLLED_S, CONTROLLED_S_, CONTROLLED_T, CONTROLLED_T_,
+    SWAP, CONTROLLED_P, CONTROLLED_RX, CONTROLLED_RY, CONTROLLED_RZ,
+    CONTROLLED_U1, CONTROLLED_U2, CONTROLLED_U3, MEASURE_BELL))
+
 def get_qgate_qubit_num(kind=None):
 
-    if (kind==SHOW or kind==MEASURE or
-        kind==MEASURE_X or kind==MEASURE_Y or kind==MEASURE_Z):  # 0 if any number
-        return 0
-    elif (kind==BLOCH or kind==PAULI_X or kind==PAULI_Y or kind==PAULI_Z or
-          kind==ROOT_PAULI_X or kind==ROOT_PAULI_X_ or kind==HADAMARD or
-          kind==PHASE_SHIFT_S or kind==PHASE_SHIFT_S_ or
-          kind==PHASE_SHIFT_T or kind==PHASE_SHIFT_T_ or kind==PHASE_SHIFT or
-          kind==ROTATION_X or kind==ROTATION_Y or kind==ROTATION_Z or
-          kind==ROTATION_U1 or kind==ROTATION_U2 or kind==ROTATION_U3):
-        return 1
-    elif (kind==CONTROLLED_X or kind==CONTROLLED_Y or kind==CONTROLLED_Z or
-          kind==CONTROLLED_XR or kind==CONTROLLED_XR_ or kind==CONTROLLED_H or
-          kind==CONTROLLED_S or kind==CONTROLLED_S_ or kind==CONTROLLED_T or
-          kind==CONTROLLED_T_ or kind==SWAP or kind==CONTROLLED_P or
-          kind==CONTROLLED_RX or kind==CONTROLLED_RY or kind==CONTROLLED_RZ or
-          kind==CONTROLLED_U1 or kind==CONTROLLED_U2 or kind==CONTROLLED_U3 or
-          kind==MEASURE_BELL):
-        return 2
+    # table lookup (called for every gate operation)
+    if kind in QGATE_QUBIT_NUM:
+        return QGATE_QUBIT_NUM[kind]
     else:
         raise QState_UnknownQgateKind()
 
@@ -2,7 +2,7 @@
 import unittest
 import math
 import numpy as np
-from qlazypy import QState, DensOp
+from qlazypy import QState, DensOp, QComp
 
 EPS = 1.0e-6
 
@@ -398,6 +398,14 @@ def make_apply_matrix(op, mat):
     matrix = np.dot(op, matrix)
     return matrix
 
+def make_permutation_matrix(qubit_num, func):
+
+    dim = 2**qubit_num
+    matrix = np.zeros((dim, dim))
+    for i in range(dim):
+        matrix[func(i)][i] = 1.0
+    return matrix
+
 def add_matrices(mat_0, mat_1):
 
     return mat_0 + mat_1
@@ -477,6 +485,17 @@ class TestDensOp_init(unittest.TestCase):
         de.free()
         self.assertEqual(ans,True)
 
+    def test_init_with_matrix_transposed(self):
+        """test '__new__' (matrix: non-contiguous array)
+        """
+        mat = make_densop_matrix(VECTORS_4, PROBS_4)
+        de = DensOp(matrix=mat.T)
+        actual = de.element
+        expect = mat.T
+        ans = equal_matrices(actual, expect)
+        de.free()
+        self.assertEqual(ans,True)
+
 class TestDensOp_free_all(unittest.TestCase):
     """ test 'DensOp' : free_all'
     """
@@ -730,6 +749,21 @@ class TestDensOp_apply(unittest.TestCase):
         de.free()
         self.assertEqual(ans,True)
 
+class TestDensOp_apply_batch(unittest.TestCase):
+    """ test 'DensOp' : 'apply_batch'
+    """
+
+    def test_apply_batch(self):
+        """test 'apply_batch'
+        """
+        qc = QComp(2).h(0).cx(0,1).ry(1, phase=0.3).cz(1,0)
+        de_0 = DensOp(qubit_num=2).apply_batch(qc)
+        de_1 = DensOp(qubit_num=2).h(0).cx(0,1).ry(1, phase=0.3).cz(1,0)
+        ans = equal_matrices(de_0.element, de_1.element)
+        de_0.free()
+        de_1.free()
+        self.assertEqual(ans,True)
+
 class TestDensOp_measurement(unittest.TestCase):
     """ test 'DensOp' : 'probability','instrument'
     """
@@ -1692,5 +1726,44 @@ class TestQState_n_qubit(unittest.TestCase):
         expect.free()
         self.assertEqual(ans,True)
 
+    def test_mcx_unordered(self):
+        """test 'mcx' gate (unordered qubit id, compare with P*rho*P^dagger)
+        """
+        bit = lambda i, q: (i >> (3 - q)) & 1
+        mat = make_densop_matrix(VECTORS_16, PROBS_16)
+        actual = DensOp(matrix=mat).mcx([3,0,2])
+        op = make_permutation_matrix(4, lambda i: i ^ (bit(i,3) & bit(i,0)) << 1)
+        expect = make_apply_matrix(op, mat)
+        ans = equal_matrices(actual.element, expect)
+        actual.free()
+        self.assertEqual(ans,True)
+
+    def test_mcx_1(self):
+        """test 'mcx' gate (no control qubit, compare with P*rho*P^dagger)
+        """
+        mat = make_densop_matrix(VECTORS_16, PROBS_16)
+        actual = DensOp(matrix=mat).mcx([1])
+        op = make_permutation_matrix(4, lambda i: i ^ 4)
+        expect = make_apply_matrix(op, mat)
+        ans = equal_matrices(actual.element, expect)
+        actual.free()
+        self.assertEqual(ans,True)
+
+    def test_csw_unordered(self):
+        """test 'csw' gate (unordered qubit id, compare with P*rho*P^dagger)
+        """
+        bit = lambda i, q: (i >> (3 - q)) & 1
+        def fredkin(i):
+            if bit(i,2) == 1 and bit(i,3) != bit(i,0):
+                return i ^ 0b1001
+            return i
+        mat = make_densop_matrix(VECTORS_16, PROBS_16)
+        actual = DensOp(matrix=mat).csw(2,3,0)
+        op = make_permutation_matrix(4, fredkin)
+        expect = make_apply_matrix(op, mat)
+        ans = equal_matrices(actual.element, expect)
+        actual.free()
+        self.assertEqual(ans,True)
+
 if __name__ == '__main__':
     unittest.main()
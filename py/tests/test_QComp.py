@@ -840,6 +840,42 @@ class TestQComp_measure_qstate_simulator(unittest.TestCase):
         self.assertEqual(res['measured_qid'], [0,1])
         self.assertEqual(res['frequency']['00'], 10)
 
+    def test_measure_terminal(self):
+        """test 'm' (several measurements at the end)
+        """
+        bk = Backend('qlazy_qstate_simulator')
+        qc = QComp(qubit_num=3, cmem_num=3, backend=bk)
+        qc.h(0).cx(0,1).cx(0,2).measure([2],[2]).measure([0],[0]).measure([1,0],[1,0])
+        res = qc.run(shots=100, reset_cmem=False)
+        self.assertEqual(res['measured_qid'], [1,0])
+        self.assertEqual(res['frequency']['00']+res['frequency']['11'], 100)
+        self.assertEqual(qc.cmem==[0,0,0] or qc.cmem==[1,1,1], True)
+        qc.free()
+
+    def test_measure_teleportation(self):
+        """test 'm' (mid-circuit measurements and feed-forward)
+        """
+        bk = Backend('qlazy_qstate_simulator')
+        qc = QComp(qubit_num=3, cmem_num=2, backend=bk)
+        qc.x(0).h(1).cx(1,2).cx(0,1).h(0).measure([0,1],[0,1])
+        res = qc.x(2, ctrl=1).z(2, ctrl=0).measure([2]).run(shots=100)
+        qc.free()
+        self.assertEqual(res['measured_qid'], [2])
+        self.assertEqual(res['frequency']['1'], 100)
+
+    def test_measure_workers(self):
+        """test 'm' (shots run by several workers)
+        """
+        bk = Backend('qlazy_qstate_simulator')
+        res = []
+        for _ in range(2):
+            qc = QComp(qubit_num=2, cmem_num=2, backend=bk, seed=123)
+            qc.h(0).measure([0],[0]).x(1, ctrl=0).h(0).measure([0,1])
+            res.append(qc.run(shots=100, workers=3))
+            qc.free()
+        self.assertEqual(res[0]['frequency'], res[1]['frequency'])
+        self.assertEqual(sum(res[0]['frequency'].values()), 100)
+
 #
 # inheritance
 #
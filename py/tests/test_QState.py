@@ -2,7 +2,9 @@
 import unittest
 import math
 import numpy as np
-from qlazypy import QState,Observable
+from qlazypy import QState,Observable,QComp,config
+from qlazypy.util import pack_qgates
+from qlazypy.error import QState_Error_GetCmp
 
 EPS = 1.0e-6
 
@@ -70,6 +72,17 @@ class TestQState_init(unittest.TestCase):
         qs.free()
         self.assertEqual(ans,True)
 
+    def test_init_with_vector_noncontiguous(self):
+        """test '__new__' (vector: real, non-contiguous array)
+        """
+        vec = np.array([[1.0, 9.0], [0.0, 9.0], [0.0, 9.0], [1.0, 9.0]])[:,0]
+        qs = QState(vector=vec)
+        actual = qs.amp
+        expect = np.array([1.0, 0.0, 0.0, 1.0]) / np.sqrt(2.0)
+        ans = equal_vectors(actual, expect)
+        qs.free()
+        self.assertEqual(ans,True)
+
 class TestQState_free_all(unittest.TestCase):
     """ test 'QState' : 'free_all'
     """
@@ -803,6 +816,155 @@ class TestQState_n_qubit(unittest.TestCase):
         qs.free()
         self.assertEqual(ans,True)
 
+    def test_mcx_unordered(self):
+        """test 'mcx' gate (for superposition, unordered qubit id)
+        """
+        matrix = np.eye(8, dtype=complex)
+        matrix[6:8,6:8] = [[0,1],[1,0]]
+        qs = QState(qubit_num=4).h(0).h(1).t(1).h(2).s(2).h(3)
+        actual = qs.clone().mcx([3,0,2]).amp
+        expect = qs.clone().apply(matrix=matrix, qid=[3,0,2]).amp
+        ans = equal_vectors(actual, expect)
+        qs.free()
+        self.assertEqual(ans,True)
+
+    def test_mcx_1(self):
+        """test 'mcx' gate (no control qubit = X gate)
+        """
+        qs = QState(qubit_num=3).h(0).t(0).h(1).s(1).h(2)
+        actual = qs.clone().mcx([1]).amp
+        expect = qs.clone().x(1).amp
+        ans = equal_vectors(actual, expect)
+        qs.free()
+        self.assertEqual(ans,True)
+
+    def test_qft(self):
+        """test 'qft' (for superposition, unordered qubit id, inverse)
+        """
+        N = 8
+        matrix = np.array([[np.exp(2.0j*np.pi*x*y/N) for x in range(N)]
+                           for y in range(N)]) / np.sqrt(N)
+        qs = QState(qubit_num=4).h(0).h(1).t(1).h(2).s(2).h(3)
+        actual = qs.clone().qft([3,0,2]).amp
+        expect = qs.clone().apply(matrix=matrix, qid=[3,0,2]).amp
+        ans_qft = equal_vectors(actual, expect)
+        actual = qs.clone().qft([3,0,2]).qft([3,0,2], inverse=True).amp
+        expect = qs.amp
+        ans_iqft = equal_vectors(actual, expect)
+        qs.free()
+        self.assertEqual(ans_qft,True)
+        self.assertEqual(ans_iqft,True)
+
+    def test_qft_all(self):
+        """test 'qft' (qid=None, all qubits, compare with numpy fft)
+        """
+        qs = QState(qubit_num=3).h(0).t(0).h(1).s(1).h(2).cx(2,0)
+        actual = qs.clone().qft().amp
+        expect = np.fft.ifft(qs.amp) * np.sqrt(8)
+        ans = equal_vectors(actual, expect)
+        qs.free()
+        self.assertEqual(ans,True)
+
+    def test_qft_1(self):
+        """test 'qft' (1-qubit register = H gate)
+        """
+        qs = QState(qubit_num=3).h(0).t(0).h(1).s(1).h(2).cx(2,0)
+        actual = qs.clone().qft([1]).amp
+        expect = qs.clone().h(1).amp
+        ans_qft = equal_vectors(actual, expect)
+        actual = qs.clone().qft([1], inverse=True).amp
+        ans_iqft = equal_vectors(actual, expect)
+        qs.free()
+        self.assertEqual(ans_qft,True)
+        self.assertEqual(ans_iqft,True)
+
+    def test_grover(self):
+        """test 'phase_oracle' and 'diffuse' (for superposition, unordered qubit id)
+        """
+        mask = np.array([False,True,False,False,False,False,True,False])
+        oracle = np.diag(np.where(mask, -1.0, 1.0))
+        diffusion = 2.0 * np.ones((8,8)) / 8 - np.eye(8)
+        qs = QState(qubit_num=4).h(0).h(1).t(1).h(2).s(2).h(3)
+        qs_0 = qs.clone().phase_oracle(lambda x: (x == 1) | (x == 6), qid=[3,0,2])
+        qs_1 = qs.clone().apply(matrix=oracle, qid=[3,0,2])
+        actual = qs_0.diffuse(qid=[3,0,2]).amp
+        expect = qs_1.apply(matrix=diffusion, qid=[3,0,2]).amp
+        ans = equal_vectors(actual, expect)
+        qs.free()
+        qs_0.free()
+        qs_1.free()
+        self.assertEqual(ans,True)
+
+    def test_grover_all(self):
+        """test 'phase_oracle' and 'diffuse' (qid=None, grover search on all qubits)
+        """
+        qs = QState(qubit_num=3).h(0).h(1).h(2)
+        qs.phase_oracle(lambda x: x == 5).diffuse()
+        qs.phase_oracle(lambda x: x == 5).diffuse()
+        actual = qs.amp
+        expect = np.full(8, -1.0 / (8.0 * np.sqrt(2.0)))
+        expect[5] = 11.0 / (8.0 * np.sqrt(2.0))
+        ans = equal_vectors(actual, expect)
+        qs.free()
+        self.assertEqual(ans,True)
+
+    def test_grover_1(self):
+        """test 'phase_oracle' and 'diffuse' (1-qubit register = Z and X gate)
+        """
+        qs = QState(qubit_num=3).h(0).t(0).h(1).s(1).h(2).cx(2,0)
+        actual = qs.clone().phase_oracle([False, True], qid=[1]).amp
+        expect = qs.clone().z(1).amp
+        ans_oracle = equal_vectors(actual, expect)
+        actual = qs.clone().diffuse(qid=[1]).amp
+        expect = qs.clone().x(1).amp
+        ans_diffuse = equal_vectors(actual, expect)
+        qs.free()
+        self.assertEqual(ans_oracle,True)
+        self.assertEqual(ans_diffuse,True)
+
+class TestQState_amp_view(unittest.TestCase):
+    """ test 'QState' : 'amp_view'
+    """
+
+    def test_amp_view(self):
+        """test 'amp_view' (shares memory with the quantum state)
+        """
+        qs = QState(qubit_num=2).h(0)
+        view = qs.amp_view()
+        qs.cx(0,1)
+        actual = view.copy()
+        expect = np.array([1.0/SQRT_2, 0.0, 0.0, 1.0/SQRT_2])
+        ans = equal_vectors(actual, expect)
+        view[:] = np.array([0.0, 1.0, 0.0, 0.0])
+        actual = qs.get_amp()
+        expect = np.array([0.0, 1.0, 0.0, 0.0])
+        ans = ans and equal_vectors(actual, expect)
+        qs.free()
+        self.assertEqual(ans,True)
+
+    def test_amp_view_readonly(self):
+        """test 'amp_view' (read-only)
+        """
+        qs = QState(qubit_num=2).h(0)
+        view = qs.amp_view(readonly=True)
+        with self.assertRaises(ValueError):
+            view[0] = 0.0
+        qs.free()
+
+    def test_amp_view_free(self):
+        """test 'amp_view' (the memory stays valid after 'free')
+        """
+        qs = QState(qubit_num=2).h(0).cx(0,1)
+        view = qs.amp_view()
+        view_part = view[2:]
+        qs.free()
+        view_part[:] = np.array([0.5, 0.5])
+        actual = view.copy()
+        expect = np.array([1.0/SQRT_2, 0.0, 0.5, 0.5])
+        ans = equal_vectors(actual, expect)
+        del view, view_part
+        self.assertEqual(ans,True)
+
 class TestQState_partial(unittest.TestCase):
     """ test 'QState' : 'partial'
     """
@@ -959,6 +1121,106 @@ class TestQState_evolve(unittest.TestCase):
         hm.free()
         self.assertEqual(ans,True)
 
+    def test_evolve_coef(self):
+        """test 'evolve' (pauli product with coefficient)
+        """
+        hm_0 = Observable("2.0*y_0*x_1")
+        hm_1 = Observable("y_0*x_1")
+        qs_0 = QState(qubit_num=2).h(0).t(1)
+        qs_1 = qs_0.clone()
+        qs_0.evolve(observable=hm_0, time=0.1, iter=1)
+        qs_1.evolve(observable=hm_1, time=0.2, iter=1)
+        ans = equal_qstates(qs_0, qs_1)
+        qs_0.free()
+        qs_1.free()
+        hm_0.free()
+        hm_1.free()
+        self.assertEqual(ans,True)
+
+    def test_evolve_order(self):
+        """test 'evolve' (2nd and 4th order trotter-suzuki)
+        """
+        hm = Observable("z_0*z_1+0.7*x_0+0.7*x_1+0.3*y_0*y_1")
+        qs_ref = QState(qubit_num=2).h(0).t(1)
+        qs_2 = qs_ref.clone()
+        qs_4 = qs_ref.clone()
+        qs_ref.evolve(observable=hm, time=0.5, iter=10000, order=2)
+        qs_2.evolve(observable=hm, time=0.5, iter=100, order=2)
+        qs_4.evolve(observable=hm, time=0.5, iter=10, order=4)
+        ans_2 = equal_qstates(qs_ref, qs_2)
+        ans_4 = equal_qstates(qs_ref, qs_4)
+        qs_ref.free()
+        qs_2.free()
+        qs_4.free()
+        hm.free()
+        self.assertEqual(ans_2,True)
+        self.assertEqual(ans_4,True)
+
+    def test_evolve_tol(self):
+        """test 'evolve' (iteration number chosen by tolerance)
+        """
+        hm = Observable("z_0*z_1+0.7*x_0+0.7*x_1")
+        qs_ref = QState(qubit_num=2).h(0).t(1)
+        qs = qs_ref.clone()
+        qs_iter = qs_ref.clone()
+        qs_ref.evolve(observable=hm, time=0.5, iter=100, order=4)
+        qs.evolve(observable=hm, time=0.5, order=2, tol=1e-6)
+        ans = equal_qstates(qs_ref, qs)
+        qs_iter.evolve(observable=hm, time=0.5, iter=qs.evolve_iter, order=2)
+        ans_iter = equal_qstates(qs_iter, qs)
+        qs_ref.free()
+        qs.free()
+        qs_iter.free()
+        hm.free()
+        self.assertEqual(ans,True)
+        self.assertEqual(ans_iter,True)
+        self.assertEqual(qs.evolve_iter > 1,True)
+
+    def test_evolve_krylov(self):
+        """test 'evolve' (krylov subspace method)
+        """
+        hm = Observable("z_0*z_1+0.7*x_0+0.7*x_1+0.3*y_0*y_1-0.5*z_2*x_1")
+        qs_ref = QState(qubit_num=3).h(0).t(1).cx(1,2)
+        qs = qs_ref.clone()
+        qs_ref.evolve(observable=hm, time=1.3, iter=1000, order=4)
+        qs.evolve(observable=hm, time=1.3, method='krylov')
+        ans = equal_qstates(qs_ref, qs)
+        qs_ref.free()
+        qs.free()
+        hm.free()
+        self.assertEqual(ans,True)
+
+class TestObservable_ground_state(unittest.TestCase):
+    """ test 'Observable' : 'ground_state'
+    """
+
+    def test_ground_state(self):
+        """test 'ground_state'
+        """
+        hm = Observable("-2.0+z_0*z_1+x_0+x_1")
+        energy, qs = hm.ground_state(seed=123)
+        actual = qs.expect(observable=hm)
+        expect = -2.0 - math.sqrt(5.0)
+        ans_0 = equal_values(energy, expect)
+        ans_1 = equal_values(actual, expect)
+        qs.free()
+        hm.free()
+        self.assertEqual(ans_0,True)
+        self.assertEqual(ans_1,True)
+
+    def test_ground_state_qubit_num(self):
+        """test 'ground_state' (qubit number larger than spin number)
+        """
+        hm = Observable("z_0*z_1+0.5*x_0")
+        energy, qs = hm.ground_state(qubit_num=3, seed=123)
+        actual = qs.qubit_num
+        expect = -math.sqrt(1.25)
+        ans_0 = equal_values(energy, expect)
+        qs.free()
+        hm.free()
+        self.assertEqual(ans_0,True)
+        self.assertEqual(actual,3)
+
 class TestQState_expect(unittest.TestCase):
     """ test 'QState' : 'expect'
     """
@@ -993,6 +1255,95 @@ class TestQState_expect(unittest.TestCase):
         ob.free()
         self.assertEqual(ans,True)
 
+    def test_expect_pauli_product(self):
+        """test 'expect' (pauli product including Y)
+        """
+        qs = QState(qubit_num=3).h(0).s(0).h(1).cx(1,2)
+        ob = Observable("1.5*y_0*x_1*x_2-0.5*z_1*z_2+2.0*x_0")
+        actual = qs.expect(observable=ob)
+        expect = 1.5 - 0.5
+        ans = equal_values(actual, expect)
+        ob.free()
+        qs.free()
+        self.assertEqual(ans,True)
+
+class TestQState_expect_gradient(unittest.TestCase):
+    """ test 'QState' : 'expect_gradient'
+    """
+
+    def test_expect_gradient(self):
+        """test 'expect_gradient' (compare with finite difference)
+        """
+        hm = Observable("z_0*z_1+0.7*x_0-0.4*y_1")
+        para = [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7]
+        def circuit(p):
+            qc = QComp(2)
+            qc.h(0).rx(0, phase=p[0]).ry(1, phase=p[1]).cx(0,1).rz(1, phase=p[2])
+            qc.u3(0, alpha=p[3], beta=p[4], gamma=p[5]).crx(1, 0, phase=p[6])
+            return qc
+        def energy(p):
+            qs = QState(2)
+            qs.h(0).rx(0, phase=p[0]).ry(1, phase=p[1]).cx(0,1).rz(1, phase=p[2])
+            qs.u3(0, alpha=p[3], beta=p[4], gamma=p[5]).crx(1, 0, phase=p[6])
+            val = qs.expect(observable=hm).real
+            qs.free()
+            return val
+        qc = circuit(para)
+        qs = QState(2)
+        actual, grad = qs.expect_gradient(observable=hm, qcirc=qc)
+        expect = energy(para)
+        ans = equal_values(actual, expect)
+        for i in range(len(para)):
+            para_p = para[:i] + [para[i] + 1.0e-6] + para[i+1:]
+            para_m = para[:i] + [para[i] - 1.0e-6] + para[i+1:]
+            diff = (energy(para_p) - energy(para_m)) / 2.0e-6
+            ans = ans and abs(grad[i] - diff) < 1.0e-5
+        qs.free()
+        qc.free()
+        hm.free()
+        self.assertEqual(len(grad),7)
+        self.assertEqual(ans,True)
+
+    def test_expect_gradient_kind(self):
+        """test 'expect_gradient' (all parametric gates, compare with finite difference)
+        """
+        hm = Observable("z_0*z_1+0.7*x_0-0.4*y_1+0.3*x_0*y_1")
+        gates = [('rx', [0], ['phase']), ('ry', [1], ['phase']), ('rz', [0], ['phase']),
+                 ('p', [1], ['phase']), ('u1', [0], ['alpha']),
+                 ('u2', [1], ['alpha', 'beta']), ('u3', [0], ['alpha', 'beta', 'gamma']),
+                 ('crx', [1,0], ['phase']), ('cry', [0,1], ['phase']),
+                 ('crz', [1,0], ['phase']), ('cp', [0,1], ['phase']),
+                 ('cu1', [1,0], ['alpha']), ('cu2', [0,1], ['alpha', 'beta']),
+                 ('cu3', [1,0], ['alpha', 'beta', 'gamma'])]
+        para = [0.1 * (i + 1) for i in range(sum([len(g[2]) for g in gates]))]
+        def operate(qx, p):
+            qx.h(0).h(1).t(1)
+            i = 0
+            for name, qid, keys in gates:
+                kwargs = dict(zip(keys, p[i:i+len(keys)]))
+                getattr(qx, name)(*qid, **kwargs)
+                i += len(keys)
+            return qx
+        def energy(p):
+            qs = operate(QState(2), p)
+            val = qs.expect(observable=hm).real
+            qs.free()
+            return val
+        qc = operate(QComp(2), para)
+        qs = QState(2)
+        actual, grad = qs.expect_gradient(observable=hm, qcirc=qc)
+        ans = equal_values(actual, energy(para))
+        for i in range(len(para)):
+            para_p = para[:i] + [para[i] + 1.0e-6] + para[i+1:]
+            para_m = para[:i] + [para[i] - 1.0e-6] + para[i+1:]
+            diff = (energy(para_p) - energy(para_m)) / 2.0e-6
+            ans = ans and abs(grad[i] - diff) < 1.0e-5
+        qs.free()
+        qc.free()
+        hm.free()
+        self.assertEqual(len(grad),len(para))
+        self.assertEqual(ans,True)
+
 class TestQState_apply(unittest.TestCase):
     """ test 'QState' : 'apply'
     """
@@ -1008,6 +1359,109 @@ class TestQState_apply(unittest.TestCase):
         qs_1.free()
         self.assertEqual(ans,True)
 
+    def test_apply_qid(self):
+        """test 'apply' (partial qubits, unordered qubit id)
+        """
+        cx = np.array([[1,0,0,0],[0,1,0,0],[0,0,0,1],[0,0,1,0]])
+        h = np.array([[1,1],[1,-1]]) / np.sqrt(2)
+        mat = np.kron(cx, h)
+        qs_0 = QState(qubit_num=4).h(0).t(0).h(2).apply(matrix=mat, qid=[2,0,3])
+        qs_1 = QState(qubit_num=4).h(0).t(0).h(2).cx(2,0).h(3)
+        ans = equal_qstates(qs_0, qs_1)
+        qs_0.free()
+        qs_1.free()
+        self.assertEqual(ans,True)
+
+    def test_apply_permutation(self):
+        """test 'apply_permutation' (permutation and XOR into target)
+        """
+        table = [1,2,3,0]
+        mat = np.zeros((4,4))
+        for x in range(4):
+            mat[table[x]][x] = 1.0
+        qs = QState(qubit_num=4).h(0).t(0).h(1).s(1).h(2).h(3).t(3)
+        qs_0 = qs.clone().apply_permutation(table, qid_in=[2,0])
+        qs_1 = qs.clone().apply(matrix=mat, qid=[2,0])
+        ans_perm = equal_qstates(qs_0, qs_1)
+        qs_0.free()
+        qs_1.free()
+        qs_0 = qs.clone().apply_permutation(lambda x: x == 3, qid_in=[3,0], qid_out=[1])
+        qs_1 = qs.clone().ccx(3,0,1)
+        ans_xor = equal_qstates(qs_0, qs_1)
+        qs_0.free()
+        qs_1.free()
+        qs.free()
+        self.assertEqual(ans_perm,True)
+        self.assertEqual(ans_xor,True)
+
+class TestQState_apply_batch(unittest.TestCase):
+    """ test 'QState' : 'apply_batch'
+    """
+
+    def test_apply_batch(self):
+        """test 'apply_batch' (QComp and packed array)
+        """
+        qc = QComp(3).h(0).cx(0,1).rx(2, phase=0.3).u3(1, alpha=0.1, beta=0.2, gamma=0.3)
+        qc.cp(2, 0, phase=0.7).sw(0,2)
+        qs_0 = QState(qubit_num=3).apply_batch(qc).apply_batch(pack_qgates(qc.qcirc))
+        qs_1 = QState(qubit_num=3)
+        for _ in range(2):
+            qs_1.h(0).cx(0,1).rx(2, phase=0.3).u3(1, alpha=0.1, beta=0.2, gamma=0.3)
+            qs_1.cp(2, 0, phase=0.7).sw(0,2)
+        ans = equal_qstates(qs_0, qs_1)
+        qs_0.free()
+        qs_1.free()
+        self.assertEqual(ans,True)
+
+    def test_apply_batch_invalid(self):
+        """test 'apply_batch' (invalid gate, state unchanged)
+        """
+        qc = QComp(3).h(0).cx(1,1)
+        qs = QState(qubit_num=3)
+        with self.assertRaises(Exception):
+            qs.apply_batch(qc)
+        ans = equal_vectors(qs.get_amp(), np.array([1,0,0,0,0,0,0,0]))
+        qs.free()
+        self.assertEqual(ans,True)
+
+class TestQState_lazy(unittest.TestCase):
+    """ test 'QState' : lazy mode
+    """
+
+    def test_lazy(self):
+        """test lazy mode (compare with eager mode)
+        """
+        def circuit(qs):
+            qs.h(0).t(1).cx(0,1).rx(0, phase=0.3).crx(1, 0, phase=0.2).sw(2,1)
+            qs.ry(2, phase=0.4).cz(1,2).u3(1, alpha=0.1, beta=0.2, gamma=0.3).h(3)
+            return qs
+        qs_0 = circuit(QState(vector=VECTOR_16))
+        qs_1 = circuit(QState(vector=VECTOR_16, lazy=True))
+        ans = (qs_1.lazy == True and equal_qstates(qs_0, qs_1))
+        qs_0.free()
+        qs_1.free()
+        self.assertEqual(ans,True)
+
+    def test_lazy_measure(self):
+        """test lazy mode (measurement and gates after it)
+        """
+        qs = QState(qubit_num=2, lazy=True).x(0).cx(0,1)
+        md = qs.m(qid=[0,1], shots=10)
+        qs.x(1)
+        actual = qs.get_amp()
+        expect = np.array([0, 0, 1, 0])
+        ans = (md.frq[3] == 10 and equal_vectors(actual, expect))
+        qs.free()
+        self.assertEqual(ans,True)
+
+    def test_lazy_amp_view(self):
+        """test lazy mode ('amp_view' is not allowed)
+        """
+        qs = QState(qubit_num=2, lazy=True).h(0)
+        with self.assertRaises(QState_Error_GetCmp):
+            qs.amp_view()
+        qs.free()
+
 class TestQState_measure(unittest.TestCase):
     """ test 'QState' : various kind of measurements
     """
@@ -1022,6 +1476,43 @@ class TestQState_measure(unittest.TestCase):
         self.assertEqual(md.frq[1], 0)
         self.assertEqual(md.frq[2], 0)
 
+    def test_m_permuted(self):
+        """test 'm' (permuted qubit order on 14-qubit state, parallel marginal)
+        """
+        num_threads = config.get_num_threads()
+        config.set_num_threads(4)
+        qs = QState(qubit_num=14).x(0).x(3).x(7).h(13).cx(13,12)
+        qid_all = [13,0,12,1,11,2,10,3,9,4,8,5,7,6]
+        md_all = qs.m(qid=qid_all, shots=100)
+        qid_part = qid_all[:-1]
+        md_part = qs.m(qid=qid_part, shots=100)
+        md_two = qs.m(qid=[7,12], shots=100)
+        config.set_num_threads(num_threads)
+        expect = lambda qid, b: ''.join(['1' if q in (0,3,7) or (b and q in (12,13))
+                                         else '0' for q in qid])
+        keys_all = set([expect(qid_all, False), expect(qid_all, True)])
+        keys_part = set([expect(qid_part, False), expect(qid_part, True)])
+        self.assertEqual(set(md_all.frequency) <= keys_all, True)
+        self.assertEqual(set(md_part.frequency) <= keys_part, True)
+        self.assertEqual(set(md_two.frequency) <= set(['10', '11']), True)
+        self.assertEqual(sum(md_all.frequency.values()), 100)
+        qs.free()
+
+    def test_m_seed(self):
+        """test 'm' (random number generator of each quantum state)
+        """
+        qs_0 = QState(qubit_num=3, seed=123).h(0).h(1).h(2)
+        md_0 = qs_0.m(shots=100)
+        qs_1 = QState(qubit_num=3, seed=123).h(0).h(1).h(2)
+        qs_2 = QState(qubit_num=3, seed=456).h(0).h(1).h(2)
+        md_2 = qs_2.m(shots=100)
+        md_1 = qs_1.m(shots=100)
+        self.assertEqual(md_0.frequency, md_1.frequency)
+        self.assertNotEqual(md_0.frequency, md_2.frequency)
+        qs_0.free()
+        qs_1.free()
+        qs_2.free()
+
     def test_mx(self):
         """test 'mx' (for bell state)
         """
@@ -1115,6 +1606,21 @@ class TestQState_measure(unittest.TestCase):
         self.assertEqual(actual, 100)
         qs.free()
 
+    def test_m_many_shots(self):
+        """test 'm' (many shots for some qubits)
+        """
+        qs = QState(qubit_num=3).h(0).cx(0,1).ry(2, phase=0.5)
+        md = qs.m(qid=[2,0], shots=100000)
+        freq = md.frequency
+        actual = [freq[s]/100000 for s in ['00','01','10','11']]
+        expect = [0.25, 0.25, 0.25, 0.25]
+        ans = all([abs(a-e) < 0.01 for a,e in zip(actual,expect)])
+        self.assertEqual(ans, True)
+        self.assertEqual(equal_values(np.linalg.norm(qs.get_amp()), 1.0), True)
+        md_again = qs.m(qid=[2,0], shots=10)
+        self.assertEqual(md_again.frequency[md.last], 10)
+        qs.free()
+
 class TestQState_schmidt_decocmp(unittest.TestCase):
     """ test 'QState' : 'schmidt_decomp'
     """
@@ -1145,5 +1651,26 @@ class TestQState_schmidt_decocmp(unittest.TestCase):
         ans = equal_vectors(actual, expect)
         self.assertEqual(ans, True)
 
+class TestQState_num_threads(unittest.TestCase):
+    """ test 'QState' : number of threads (config.set_num_threads)
+    """
+
+    def test_set_num_threads(self):
+        """test 'set_num_threads'
+        """
+        num_threads = config.get_num_threads()
+        config.set_num_threads(2)
+        qs = QState(qubit_num=14)
+        for q in range(14):
+            qs.h(q)
+        qs.cx(0,13).rz(5, phase=0.25).t(7)
+        actual = qs.inpro(qs)
+        expect = 1.0
+        ans = equal_values(actual, expect)
+        self.assertEqual(config.get_num_threads(), 2)
+        config.set_num_threads(num_threads)
+        qs.free()
+        self.assertEqual(ans,True)
+
 if __name__ == '__main__':
     unittest.main()
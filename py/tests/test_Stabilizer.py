@@ -1111,6 +1111,19 @@ class TestStabilizer_m(unittest.TestCase):
         sb.free()
         self.assertEqual(ans, True)
 
+    def test_m_seed(self):
+        """test 'm' (random number generator of each stabilizer)
+        """
+        frq = []
+        for seed in [123, 456, 123]:
+            sb = Stabilizer(gene_num=4, qubit_num=4, seed=seed)
+            sb.set_all('Z')
+            sb.h(0).h(1).h(2).h(3)
+            frq.append(sb.m(qid=[0,1,2,3], shots=100).frequency)
+            sb.free()
+        self.assertEqual(frq[0], frq[2])
+        self.assertNotEqual(frq[0], frq[1])
+
 class TestStabilizer_mz(unittest.TestCase):
     """ test 'Stabilizer' : 'mz'
     """